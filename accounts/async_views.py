@@ -0,0 +1,61 @@
+"""
+Асинхронные представления чтения личного кабинета.
+
+Пагинация и сериализаторы берутся из ConsultationsAccount и BookedAccountView.
+Заявки на консультации и консультации броней загружаются одним запросом на страницу.
+"""
+from rest_framework import status
+
+from consultation_planning_service.async_utils import async_read_view, api_response, drf_request, paginate
+from consultations.models import Consultation, Booked
+from .views import ConsultationsAccount, BookedAccountView
+
+
+def _view(view_class, request, user):
+    return view_class(request=drf_request(request, user), args=(), kwargs={}, format_kwarg=None)
+
+
+async def _page(view, queryset, extra_context=None):
+    objects = await paginate(view.paginator, view.request, queryset)
+    page = objects is not None
+    if not page:
+        objects = [obj async for obj in queryset]
+
+    context = view.get_serializer_context()
+    if extra_context:
+        context.update(await extra_context(objects))
+    data = view.get_serializer(objects, many=True, context=context).data
+
+    if page:
+        data = view.paginator.get_paginated_response(data).data
+    return api_response(data=data)
+
+
+async def _applications(consultations):
+    applications = {consultation.id: [] for consultation in consultations}
+    bookeds = Booked.objects.filter(consultation__in=list(applications)).order_by('id') \
+        .values('id', 'status', 'user', 'description', 'consultation_id')
+    async for booked in bookeds:
+        applications[booked.pop('consultation_id')].append(booked)
+    return {'applications': applications}
+
+
+async def read_consultations_account(request, user):
+    if not await user.groups.filter(name='specialist').aexists():
+        return api_response(errors={'specialist': "Вы не являетесь специалистом."},
+                            http_status=status.HTTP_403_FORBIDDEN,
+                            status='error')
+
+    view = _view(ConsultationsAccount, request, user)
+    consultations = Consultation.objects.filter(archive=False).order_by('datetime')
+    return await _page(view, consultations, _applications)
+
+
+async def read_booked_account(request, user):
+    view = _view(BookedAccountView, request, user)
+    booked = Booked.objects.filter(archive=False).select_related('consultation').order_by('consultation__datetime')
+    return await _page(view, booked)
+
+
+consultations_account = async_read_view(read_consultations_account, ConsultationsAccount.as_view())
+booked_account = async_read_view(read_booked_account, BookedAccountView.as_view())
@@ -69,6 +69,10 @@ class ConsultationAccountSerializer(serializers.ModelSerializer):
         }
 
     def get_application(self, obj):
+        # Асинхронное представление передает заявки всех консультаций страницы, загруженные одним запросом
+        applications = self.context.get('applications')
+        if applications is not None:
+            return applications.get(obj.id, [])
         return Booked.objects.filter(consultation=obj).values('id', 'status', 'user', 'description')
 
 
@@ -81,14 +85,14 @@ class BookedAccountSerializer(serializers.ModelSerializer):
 
     def get_consultation(self, obj):
         local_tz = timezone.get_current_timezone()
-        consultation = Consultation.objects.get(pk=obj.consultation.id)
+        consultation = obj.consultation
         datetime = {
             "start": consultation.datetime.lower.astimezone(local_tz).strftime('%Y-%m-%d %H:%M'),
             "end": consultation.datetime.upper.astimezone(local_tz).strftime('%Y-%m-%d %H:%M')
         }
         return {
             'id': consultation.id,
-            'user': consultation.user.id,
+            'user': consultation.user_id,
             'description': consultation.description,
             'price': consultation.price,
             'datetime': datetime,
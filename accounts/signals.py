@@ -2,7 +2,9 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 from .models import User
-from .tasks import task_send_email_verify_email_user
+from events import outbox
+from notifications import payloads
+from .tasks import task_send_email_verify_email_user, verify_email_url
 
 
 @receiver(post_save, sender=User)
@@ -10,4 +12,5 @@ def signal_send_email_verify_email_user(instance, created, **kwargs):
     if not created:
         return
 
-    task_send_email_verify_email_user.delay(instance.id)
+    payload = payloads.build_payload(instance, absurl=verify_email_url(instance))
+    outbox.enqueue(task_send_email_verify_email_user, instance.id, payload)
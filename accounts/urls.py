@@ -1,8 +1,8 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from accounts.views import ProfileViewSet, ConsultationsAccount, BookedAccountView, SignUp, VerifyEmail, \
-    CustomTokenObtainPairView, CustomTokenRefreshView
+from accounts.async_views import consultations_account, booked_account
+from accounts.views import ProfileViewSet, SignUp, VerifyEmail, CustomTokenObtainPairView, CustomTokenRefreshView
 
 router = routers.DefaultRouter()
 router.register('profile', ProfileViewSet, basename='specialist')
@@ -10,8 +10,8 @@ router.register('profile', ProfileViewSet, basename='specialist')
 urlpatterns = [
     path('', include(router.urls)),
 
-    path('consultations/', ConsultationsAccount.as_view(), name='consultations'),
-    path('bookeds/', BookedAccountView.as_view(), name='bookeds'),
+    path('consultations/', consultations_account, name='consultations'),
+    path('bookeds/', booked_account, name='bookeds'),
 
     path('register/', SignUp.as_view(), name='signup'),
     path('email-verify/', VerifyEmail.as_view(), name="email_verify"),
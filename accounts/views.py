@@ -14,6 +14,8 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from consultation_planning_service.utils import StandardResponseMixin, api_response, CacheResponseMixin
 from consultations.models import Consultation, Booked
+from events import outbox
+from notifications import payloads
 from specialist.permissions import IsAdmin
 from .models import User
 from .serializers import (
@@ -89,7 +91,7 @@ class ProfileViewSet(StandardResponseMixin, ViewSet):
         user = get_object_or_404(User, id=request.data.get('id'))
         if user.is_active:
             user.block()
-            task_send_email_user_block.delay(user.id)
+            outbox.enqueue(task_send_email_user_block, user.id, payloads.build_payload(user))
 
             consultations = Consultation.objects.filter(user=user, archive=False)
             for consultation in consultations:
@@ -114,7 +116,7 @@ class ProfileViewSet(StandardResponseMixin, ViewSet):
         user = get_object_or_404(User, id=request.data.get('id'))
         if not user.is_active:
             user.unblock()
-            task_send_email_user_unblock.delay(user.id)
+            outbox.enqueue(task_send_email_user_unblock, user.id, payloads.build_payload(user))
 
         return api_response(data={'user': 'Пользователь успешно разблокирован.'})
 
@@ -160,7 +162,7 @@ class BookedAccountView(CacheResponseMixin, StandardResponseMixin, GenericAPIVie
         operation_description="Получить данные о своих бронированиях.",
     )
     def get(self, request, *args, **kwargs):
-        booked = Booked.objects.filter(archive=False).order_by('consultation__datetime')
+        booked = Booked.objects.filter(archive=False).select_related('consultation').order_by('consultation__datetime')
 
         self.check_object_permissions(request, request.user)
 
@@ -213,7 +215,7 @@ class VerifyEmail(StandardResponseMixin, GenericAPIView):
             user = User.objects.get(id=payload['user_id'])
             if not user.is_verified:
                 user.confirm_email()
-                task_send_email_verify_email_user_success.delay(user.id)
+                outbox.enqueue(task_send_email_verify_email_user_success, user.id, payloads.build_payload(user))
             return api_response(data={'email': 'Успешно активирован'})
         except jwt.ExpiredSignatureError:
             return api_response(errors={'token': 'Срок действия активации истек'},
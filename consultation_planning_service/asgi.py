@@ -3,6 +3,9 @@ ASGI config for consultation_planning_service project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Поток событий /events/stream/ держит соединение открытым и обслуживается
+только под ASGI-сервером (uvicorn), а не под WSGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -0,0 +1,156 @@
+"""
+Инструменты для асинхронных представлений чтения под ASGI.
+
+Асинхронные представления переиспользуют настройки синхронных DRF-представлений
+(фильтры, сортировку, поиск, сериализаторы и пагинацию), но обращаются к БД
+через асинхронный ORM, а к кэшу - через асинхронный клиент Redis с теми же
+ключами и форматом значений, что и django_redis. Поэтому кэш, записанный
+синхронным представлением, читается асинхронным и наоборот.
+"""
+import asyncio
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Page
+from django.db import transaction
+from django.views.decorators.csrf import csrf_exempt
+from redis import asyncio as aioredis
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from .utils import custom_exception_handler, get_raw_token
+
+# Клиенты Redis по циклам событий: соединения asyncio нельзя использовать в другом цикле
+_clients = weakref.WeakKeyDictionary()
+
+
+def async_redis():
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = aioredis.from_url(settings.CACHES['default']['LOCATION'])
+    return _clients[loop]
+
+
+class AsyncCache:
+    """
+    Асинхронный доступ к кэшу django_redis: ключи строятся через make_key,
+    значения кодируются клиентом django_redis.
+    """
+
+    async def get(self, key):
+        value = await async_redis().get(cache.make_key(key))
+        return None if value is None else cache.client.decode(value)
+
+    async def set(self, key, value, timeout=None):
+        await async_redis().set(cache.make_key(key), cache.client.encode(value), ex=timeout)
+
+
+async_cache = AsyncCache()
+
+
+async def authenticate(request):
+    """
+    Пользователь по access-токену из заголовка Authorization или параметра ?token=.
+
+    :return: пользователь или None
+    """
+    # Подзапрос пакета: пользователь уже аутентифицирован пакетным запросом
+    user = getattr(request, '_force_auth_user', None)
+    if user is not None:
+        return user
+
+    raw_token = get_raw_token(request)
+    if not raw_token:
+        return None
+
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+
+    return await User.objects.filter(**{api_settings.USER_ID_FIELD: token[api_settings.USER_ID_CLAIM]},
+                                     is_active=True).afirst()
+
+
+def render(response):
+    """
+    Подготовить DRF Response к отрисовке без согласования формата.
+    """
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = JSONRenderer.media_type
+    response.renderer_context = {}
+    return response
+
+
+def api_response(status='success', data=None, errors=None, http_status=200):
+    return render(Response({
+        'status': status,
+        'data': data if data is not None else {},
+        'errors': errors if errors is not None else {},
+    }, status=http_status))
+
+
+def drf_request(request, user):
+    request = Request(request)
+    request.user = user
+    return request
+
+
+async def paginate(pagination, request, queryset):
+    """
+    Асинхронный аналог pagination.paginate_queryset для PageNumberPagination.
+
+    :return: объекты страницы или None, если пагинация отключена
+    """
+    page_size = pagination.get_page_size(request)
+    if not page_size:
+        return None
+
+    paginator = pagination.django_paginator_class(queryset, page_size)
+    paginator.count = await queryset.acount()
+    page_number = pagination.get_page_number(request, paginator)
+    try:
+        number = paginator.validate_number(page_number)
+    except InvalidPage as exc:
+        raise NotFound(pagination.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+    bottom = (number - 1) * page_size
+    objects = [obj async for obj in queryset[bottom:bottom + page_size]]
+
+    pagination.page = Page(objects, number, paginator)
+    pagination.request = request
+    return objects
+
+
+def async_read_view(read, sync_view):
+    """
+    Представление, в котором GET обрабатывает асинхронная функция read(request, user, **kwargs),
+    а остальные методы - синхронное представление в отдельной транзакции, как при ATOMIC_REQUESTS.
+    """
+    atomic_view = sync_to_async(transaction.atomic(sync_view))
+
+    @csrf_exempt
+    @transaction.non_atomic_requests
+    async def view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await atomic_view(request, *args, **kwargs)
+
+        try:
+            user = await authenticate(request)
+            if user is None:
+                raise AuthenticationFailed() if get_raw_token(request) else NotAuthenticated()
+            return await read(request, user, *args, **kwargs)
+        except APIException as exc:
+            if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+                exc.auth_header = f'{api_settings.AUTH_HEADER_TYPES[0]} realm="api"'
+            return render(custom_exception_handler(exc, {}))
+
+    return view
@@ -0,0 +1,160 @@
+"""
+Пакетное выполнение GET-запросов к API.
+
+Пакет аутентифицируется один раз, а подзапросы вызывают представления
+напрямую по resolve(), минуя middleware, с уже известным пользователем.
+Ответы DRF берутся из response.data без рендеринга в JSON и обратного разбора.
+Независимые чтения можно выполнить параллельно в пуле потоков; каждый поток
+по окончании подзапроса закрывает свои соединения с БД.
+"""
+import contextvars
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Имя маршрута пакетного представления: пакеты не вкладываются друг в друга
+URL_NAME = 'batch'
+
+
+class BatchValidationError(Exception):
+    """
+    Пакет не прошел проверку.
+
+    :param errors: ошибки по номерам подзапросов (с нуля) или по ключу 'requests'
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def parse(items):
+    """
+    Пути подзапросов: строки или объекты {'method': 'GET', 'path': ...}.
+
+    :raises BatchValidationError: пакет пуст, больше BATCH_MAX_REQUESTS или есть не GET-подзапросы
+    """
+    if not isinstance(items, list) or not items:
+        raise BatchValidationError({'requests': ['Ожидается непустой список запросов.']})
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        raise BatchValidationError({'requests': [f'Не больше {settings.BATCH_MAX_REQUESTS} запросов за раз.']})
+
+    paths, errors = [], {}
+    for number, item in enumerate(items):
+        method, path = 'GET', item
+        if isinstance(item, dict):
+            method, path = str(item.get('method') or 'GET').upper(), item.get('path')
+
+        if method != 'GET':
+            errors[number] = ['Поддерживаются только GET-запросы.']
+        elif not isinstance(path, str) or not path.startswith('/'):
+            errors[number] = ['Путь должен начинаться с /.']
+        paths.append(path)
+
+    if errors:
+        raise BatchValidationError(errors)
+    return paths
+
+
+def subrequest(request, path, user, auth=None):
+    """
+    GET-запрос к path с заголовками пакетного запроса и уже аутентифицированным пользователем.
+    """
+    url = urlsplit(path)
+    sub = HttpRequest()
+    sub.method = 'GET'
+    sub.path = sub.path_info = url.path
+    sub.META = {key: value for key, value in request.META.items() if key not in ('CONTENT_LENGTH', 'CONTENT_TYPE')}
+    sub.META.update(REQUEST_METHOD='GET', PATH_INFO=url.path, QUERY_STRING=url.query)
+    sub.GET = QueryDict(url.query)
+    sub.COOKIES = request.COOKIES
+    sub.user = user
+    # DRF и асинхронные представления чтения берут пользователя отсюда, не разбирая токен повторно
+    sub._force_auth_user = user
+    sub._force_auth_token = auth
+    return sub
+
+
+def _error(status, detail):
+    return {'status': status, 'body': {'status': 'error', 'data': {}, 'errors': {'detail': [detail]}}}
+
+
+def _body(response):
+    if isinstance(response, Response):
+        return response.data
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content)
+    return None
+
+
+def execute(request):
+    """
+    Выполнить подзапрос.
+
+    Ошибка представления не прерывает пакет: подзапрос получает ответ 500.
+
+    :return: код ответа и тело: данные ответа DRF или разобранный JSON
+    """
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return _error(404, 'Страница не найдена.')
+    if match.url_name == URL_NAME:
+        return _error(400, 'Пакеты нельзя вкладывать.')
+
+    request.resolver_match = match
+    view = match.func
+    try:
+        if iscoroutinefunction(view):
+            response = async_to_sync(view)(request, *match.args, **match.kwargs)
+        else:
+            response = view(request, *match.args, **match.kwargs)
+    except Http404:
+        return _error(404, 'Страница не найдена.')
+    except PermissionDenied:
+        return _error(403, 'Доступ запрещен.')
+    except Exception:
+        logger.exception('Ошибка подзапроса пакета %s', request.get_full_path())
+        return _error(500, 'Внутренняя ошибка сервера.')
+
+    if response.streaming:
+        response.close()
+        return _error(400, 'Потоковые ответы не поддерживаются в пакете.')
+    return {'status': response.status_code, 'body': _body(response)}
+
+
+def _execute_in_thread(request):
+    try:
+        return execute(request)
+    finally:
+        connections.close_all()
+
+
+def run(request, paths, user, auth=None, parallel=False):
+    """
+    Выполнить подзапросы пакета и вернуть их ответы в порядке путей.
+
+    :param parallel: выполнить подзапросы в пуле из BATCH_MAX_WORKERS потоков
+    """
+    subrequests = [subrequest(request, path, user, auth) for path in paths]
+    if parallel and len(subrequests) > 1:
+        with ThreadPoolExecutor(max_workers=min(settings.BATCH_MAX_WORKERS, len(subrequests))) as executor:
+            # Свой контекст на поток: в нем, например, выбор реплики для чтения
+            futures = [executor.submit(contextvars.copy_context().run, _execute_in_thread, sub)
+                       for sub in subrequests]
+            results = [future.result() for future in futures]
+    else:
+        results = [execute(sub) for sub in subrequests]
+
+    return [{'path': path, **result} for path, result in zip(paths, results)]
@@ -0,0 +1,137 @@
+"""
+Маршрутизация чтения на реплики PostgreSQL.
+
+ReplicaMiddleware помечает запросы безопасными методами (GET, HEAD, OPTIONS),
+и в них ReplicaRouter отправляет чтение на случайную реплику из
+DATABASE_REPLICAS. Запись всегда идет на основную базу. Чтобы пользователь
+видел свои изменения, несмотря на задержку репликации, после изменяющего
+запроса он на REPLICA_PIN_SECONDS закрепляется за основной базой, а после
+записи внутри запроса чтение до его конца идет с основной базы. Представления,
+помеченные read_only, читают с реплик и не закрепляют пользователя при любом методе.
+
+Вне HTTP-запросов (Celery, команды) все запросы идут на основную базу.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .utils import get_raw_token
+
+PRIMARY = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Разрешено ли читать с реплики в текущем запросе
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def pin_key(user_id):
+    return f'ReplicaRouter_pin_{user_id}'
+
+
+def token_user_id(request):
+    """
+    id пользователя из access-токена без обращения к БД.
+    """
+    raw_token = get_raw_token(request)
+    if not raw_token:
+        return None
+    try:
+        return AccessToken(raw_token)[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+
+
+def read_only(view):
+    """
+    Пометить представление, которое только читает данные при любом методе
+    (например, пакет GET-подзапросов в теле POST): чтение в нем идет с реплик,
+    а ответ не закрепляет пользователя за основной базой.
+    """
+    view.replica_read_only = True
+    return view
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # После записи запрос до конца читает с основной базы
+        _use_replica.set(False)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaMiddleware:
+    """
+    Разрешает чтение с реплик для безопасных запросов незакрепленных пользователей
+    и закрепляет пользователя за основной базой после изменяющего запроса.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        user_id = token_user_id(request)
+        use_replica = request.method in SAFE_METHODS and not (user_id and cache.get(pin_key(user_id)))
+        token = _use_replica.set(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+        if self._should_pin(request, response, user_id):
+            cache.set(pin_key(user_id), True, timeout=settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        user_id = token_user_id(request)
+        use_replica = request.method in SAFE_METHODS and not (user_id and await cache.aget(pin_key(user_id)))
+        token = _use_replica.set(use_replica)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+        if self._should_pin(request, response, user_id):
+            await cache.aset(pin_key(user_id), True, timeout=settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(view_func, 'replica_read_only', False):
+            return None
+
+        request.replica_read_only = True
+        if settings.DATABASE_REPLICAS and not _use_replica.get():
+            user_id = token_user_id(request)
+            _use_replica.set(not (user_id and cache.get(pin_key(user_id))))
+        return None
+
+    def _should_pin(self, request, response, user_id):
+        return (user_id and request.method not in SAFE_METHODS and response.status_code < 400
+                and not getattr(request, 'replica_read_only', False))
@@ -0,0 +1,165 @@
+"""
+Потоковая выгрузка списков в NDJSON и CSV.
+
+Строки читаются серверным курсором через queryset.iterator(chunk_size) и сразу
+отдаются клиенту через StreamingHttpResponse, поэтому память не зависит от
+размера выгрузки, а COUNT для пагинации не выполняется. По параметру
+?compress=gzip ответ сжимается на лету.
+
+Под ASGI Django забирает синхронный генератор ответа целиком одним
+sync_to_async(list), поэтому StreamingExportResponse отдает куски по одному:
+каждый следующий кусок читается из курсора в потоке запроса.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.decorators import action
+
+from .utils import api_response
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Сколько байт накапливается перед отправкой очередного куска ответа
+BUFFER_SIZE = 64 * 1024
+
+
+class _Echo:
+    """
+    Файловый объект для csv.writer, возвращающий записанную строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        # Как и в API, время выгружается в часовом поясе TIME_ZONE
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M')
+    return value
+
+
+def ndjson_lines(rows, columns):
+    for row in rows:
+        yield json.dumps({column: _value(row[column]) for column in columns},
+                         ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+
+
+def csv_lines(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_value(row[column]) for column in columns])
+
+
+def buffered(lines):
+    """
+    Склеить строки в куски по BUFFER_SIZE байт.
+    """
+    buffer, size = [], 0
+    for line in lines:
+        chunk = line.encode()
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class StreamingExportResponse(StreamingHttpResponse):
+    """
+    Потоковый ответ, который и под WSGI, и под ASGI читает синхронный генератор по одному куску.
+    """
+
+    async def __aiter__(self):
+        chunks = iter(self.streaming_content)
+        # Курсор БД живет в потоке запроса, поэтому куски читаются в нем же
+        next_chunk = sync_to_async(next, thread_sensitive=True)
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+
+
+def export_response(queryset, columns, export_format='ndjson', filename='export', compress=False):
+    """
+    Потоковый ответ с выгрузкой queryset.values() по колонкам columns.
+
+    :param columns: имя колонки - выражение для values() или None для поля модели с тем же именем
+    """
+    fields = [column for column, expression in columns.items() if expression is None]
+    expressions = {column: expression for column, expression in columns.items() if expression is not None}
+    rows = queryset.values(*fields, **expressions).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+    columns = list(columns)
+    lines = csv_lines(rows, columns) if export_format == 'csv' else ndjson_lines(rows, columns)
+
+    chunks = buffered(lines)
+    filename = f'{filename}.{export_format}'
+    if compress:
+        chunks = gzipped(chunks)
+        filename += '.gz'
+
+    response = StreamingExportResponse(chunks, content_type='application/gzip' if compress else FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class StreamingExportMixin:
+    """
+    Действие export для ViewSet: выгрузка списка с фильтрами, сортировкой и поиском list.
+
+    В export_columns задаются колонки выгрузки: имя колонки - выражение или None для поля модели.
+    """
+    export_columns = {}
+    export_filename = 'export'
+
+    def get_export_queryset(self):
+        """
+        Записи, доступные пользователю для выгрузки. По умолчанию - те же, что в списке.
+        """
+        return self.get_queryset()
+
+    @swagger_auto_schema(
+        operation_description="Потоковая выгрузка списка в NDJSON или CSV с фильтрами списка.",
+        manual_parameters=[
+            openapi.Parameter('export_format', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              enum=list(FORMATS), description="Формат выгрузки, по умолчанию ndjson"),
+            openapi.Parameter('compress', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['gzip'],
+                              description="Сжать ответ"),
+        ]
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in FORMATS:
+            return api_response(errors={'export_format': [f'Доступные форматы: {", ".join(FORMATS)}.']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        queryset = self.filter_queryset(self.get_export_queryset())
+        return export_response(queryset, self.export_columns, export_format, self.export_filename,
+                               compress=request.query_params.get('compress') == 'gzip')
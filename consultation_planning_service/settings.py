@@ -16,6 +16,7 @@ from pathlib import Path
 import os
 
 from django.conf import settings
+from kombu import Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,7 +48,10 @@ INSTALLED_APPS = [
 
     "consultations",
     "accounts",
-    "specialist"
+    "specialist",
+    "notifications",
+    "events",
+    "monitoring",
 ]
 
 MIDDLEWARE = [
@@ -56,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'consultation_planning_service.db_router.ReplicaMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -99,6 +104,210 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Результаты задач никто не читает, поэтому по умолчанию они не сохраняются в Redis
+CELERY_TASK_IGNORE_RESULT = True
+
+# Очереди: жизненный цикл консультаций, уведомления и массовая обработка
+# обслуживаются отдельными воркерами и не задерживают друг друга
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = (
+    Queue('lifecycle'),
+    Queue('notifications'),
+    Queue('bulk'),
+    Queue('default'),
+)
+CELERY_TASK_DEFAULT_PRIORITY = 6
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    # Для Redis 0 - наивысший приоритет
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+
+# Маршрутизация задач: очередь и приоритет внутри очереди
+CELERY_TASK_ROUTES = {
+    # Жизненный цикл консультаций
+    'consultations.tasks.task_dispatch_scheduled_events': {'queue': 'lifecycle', 'priority': 0},
+    'consultations.tasks.archive_consultation': {'queue': 'lifecycle', 'priority': 3},
+    'consultations.tasks.archive_consultations': {'queue': 'lifecycle', 'priority': 3},
+    'consultations.tasks.expire_bookings': {'queue': 'lifecycle', 'priority': 3},
+    'consultations.tasks.schedule_consultations': {'queue': 'lifecycle', 'priority': 3},
+
+    # Уведомления
+    'notifications.tasks.task_flush_notifications': {'queue': 'notifications', 'priority': 3},
+    'consultations.tasks.task_send_email_booked_create': {'queue': 'notifications', 'priority': 6},
+    'consultations.tasks.task_send_email_booked_accept': {'queue': 'notifications', 'priority': 6},
+    'consultations.tasks.task_send_email_booked_cancellation': {'queue': 'notifications', 'priority': 6},
+    'accounts.tasks.task_send_email_verify_email_user': {'queue': 'notifications', 'priority': 3},
+    'accounts.tasks.task_send_email_verify_email_user_success': {'queue': 'notifications', 'priority': 6},
+    'accounts.tasks.task_send_email_user_block': {'queue': 'notifications', 'priority': 6},
+    'accounts.tasks.task_send_email_user_unblock': {'queue': 'notifications', 'priority': 6},
+    'specialist.tasks.task_send_email_candidates_accept': {'queue': 'notifications', 'priority': 6},
+    'specialist.tasks.task_send_email_candidates_cancel': {'queue': 'notifications', 'priority': 6},
+    'specialist.tasks.task_send_email_specialist_block': {'queue': 'notifications', 'priority': 6},
+    'specialist.tasks.task_send_email_specialist_unblock': {'queue': 'notifications', 'priority': 6},
+
+    # Массовая обработка
+    'consultations.tasks.task_send_reminders': {'queue': 'bulk', 'priority': 6},
+    'consultations.tasks.task_create_partitions': {'queue': 'bulk', 'priority': 3},
+    'consultations.tasks.task_move_to_history': {'queue': 'bulk', 'priority': 9},
+    'consultations.tasks.task_build_utilization': {'queue': 'bulk', 'priority': 6},
+    'consultations.tasks.task_rebuild_occupancy': {'queue': 'bulk', 'priority': 6},
+}
+
+# Ограничения частоты на воркер
+CELERY_TASK_ANNOTATIONS = {
+    'notifications.tasks.task_flush_notifications': {'rate_limit': '60/m'},
+    'consultations.tasks.task_send_reminders': {'rate_limit': '6/m'},
+}
+
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-scheduled-events': {
+        'task': 'consultations.tasks.task_dispatch_scheduled_events',
+        'schedule': 10.0,
+    },
+    'send-consultation-reminders': {
+        'task': 'consultations.tasks.task_send_reminders',
+        'schedule': timedelta(minutes=5),
+    },
+    'flush-notifications': {
+        'task': 'notifications.tasks.task_flush_notifications',
+        'schedule': 5.0,
+    },
+    'create-consultation-partitions': {
+        'task': 'consultations.tasks.task_create_partitions',
+        'schedule': timedelta(days=1),
+    },
+    'move-consultations-to-history': {
+        'task': 'consultations.tasks.task_move_to_history',
+        'schedule': timedelta(hours=1),
+    },
+    'rebuild-occupancy': {
+        'task': 'consultations.tasks.task_rebuild_occupancy',
+        'schedule': timedelta(hours=1),
+    },
+}
+
+# Пакетная отправка писем
+
+# Сколько писем отправляется через одно SMTP-соединение
+NOTIFICATIONS_BATCH_SIZE = 100
+# Сколько секунд письмо может ждать в буфере до отправки
+NOTIFICATIONS_FLUSH_INTERVAL = 5
+# После стольких неудачных попыток письмо переносится в список notifications:dead
+NOTIFICATIONS_MAX_ATTEMPTS = 5
+
+# Transactional outbox
+
+# Сколько событий ретранслятор публикует в брокер за одну транзакцию
+OUTBOX_BATCH_SIZE = 500
+
+# Шина событий
+
+# Примерная максимальная длина потока событий
+EVENTS_STREAM_MAXLEN = 100000
+# Сколько событий потребитель читает за раз
+EVENTS_CONSUMER_BATCH_SIZE = 100
+# Сколько миллисекунд потребитель ждет новых событий
+EVENTS_CONSUMER_BLOCK = 5000
+# После скольких доставок необработанное событие переносится в events:dead
+EVENTS_CONSUMER_MAX_DELIVERIES = 5
+
+# Вебхуки
+
+# Сколько запросов к подписчикам выполняется одновременно
+WEBHOOKS_MAX_CONNECTIONS = 20
+# Сколько событий отправляется одним запросом
+WEBHOOKS_BATCH_SIZE = 100
+WEBHOOKS_MAX_ATTEMPTS = 5
+# Начальная и максимальная задержка между попытками в секундах
+WEBHOOKS_BACKOFF = 1.0
+WEBHOOKS_BACKOFF_MAX = 60.0
+WEBHOOKS_TIMEOUT = 10.0
+
+# Server-Sent Events
+
+# Через сколько секунд без событий отправляется heartbeat
+EVENTS_SSE_HEARTBEAT = 15
+# Через сколько миллисекунд браузер переподключается после обрыва
+EVENTS_SSE_RETRY = 3000
+
+# Планировщик событий консультаций (Redis ZSET)
+
+SCHEDULER_BATCH_SIZE = 500
+# Через сколько секунд неподтвержденные события планировщика возвращаются в расписание
+SCHEDULER_INFLIGHT_TIMEOUT = 300
+# За сколько до начала консультации отменять нерассмотренные заявки
+CONSULTATION_BOOKING_EXPIRE = timedelta(hours=1)
+
+# Напоминания о консультациях
+
+# За сколько часов до начала отправлять напоминание
+CONSULTATION_REMINDER_LEAD = timedelta(hours=int(os.environ.get('CONSULTATION_REMINDER_LEAD_HOURS', 24)))
+# Размер временной корзины, по которой сканируются предстоящие консультации
+CONSULTATION_REMINDER_BUCKET = timedelta(minutes=15)
+
+# Секционирование консультаций и броней по месяцам
+
+# На сколько месяцев вперед создаются секции
+CONSULTATION_PARTITIONS_AHEAD = 3
+
+# Повторяющиеся консультации
+
+# На сколько вперед проверяются пересечения нового шаблона с консультациями
+CONSULTATION_RECURRENCE_HORIZON = timedelta(days=365)
+# Максимальное окно развертки вхождений за один запрос
+CONSULTATION_OCCURRENCES_MAX_WINDOW = timedelta(days=62)
+
+# Поиск свободного времени
+
+# Сколько секунд хранятся свободные интервалы специалиста за день
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60
+# Максимальное окно поиска
+AVAILABILITY_MAX_WINDOW = timedelta(days=14)
+
+# Массовые действия с бронями
+
+# Сколько броней можно обработать одним запросом
+BOOKED_BULK_MAX_ITEMS = 500
+
+# Календарь консультаций
+
+# Сколько секунд хранятся счетчики месяца (сбрасываются событиями консультаций)
+CONSULTATION_CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Отчет о загрузке специалистов
+
+# Сколько секунд хранится отчет за период
+UTILIZATION_CACHE_TIMEOUT = 60 * 60
+# Периоды длиннее стольких дней считаются в Celery
+UTILIZATION_SYNC_MAX_DAYS = 31
+UTILIZATION_MAX_DAYS = 366
+
+# Массовый импорт консультаций
+
+# Сколько консультаций можно загрузить одной пачкой
+CONSULTATION_IMPORT_MAX_ROWS = 10000
+
+# История консультаций
+
+# Через сколько после начала архивная консультация переносится в историю
+CONSULTATION_HISTORY_AFTER = timedelta(days=int(os.environ.get('CONSULTATION_HISTORY_AFTER_DAYS', 30)))
+# Сколько консультаций переносится в одной транзакции
+CONSULTATION_HISTORY_BATCH_SIZE = 1000
+
+# Потоковая выгрузка
+
+# Сколько строк читается из серверного курсора за раз
+EXPORT_CHUNK_SIZE = 2000
+
+# Пакетные запросы /batch/
+
+# Сколько подзапросов можно выполнить одним пакетом
+BATCH_MAX_REQUESTS = 10
+# Сколько потоков выполняют подзапросы параллельного пакета
+BATCH_MAX_WORKERS = 4
+
 # REST
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -180,9 +389,46 @@ DATABASES = {
         'PASSWORD': 'postgres',
         'HOST': 'db',
         'PORT': '5432',
+        # Запрос выполняется в одной транзакции с записями outbox
+        'ATOMIC_REQUESTS': True,
+        # С пулом Django передает ConnectionPool check=check_connection: соединение
+        # проверяется при выдаче из пула, разорванное заменяется новым
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Пул соединений psycopg: процессы веб-сервера и воркеры Celery
+            # берут соединения из пула, а не открывают новое на каждый запрос и задачу
+            'pool': {
+                'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+                # Сколько секунд ждать свободного соединения
+                'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+            },
+        },
     },
 }
 
+# Реплики для чтения: хосты через запятую в DATABASE_REPLICA_HOSTS
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.getenv('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'ATOMIC_REQUESTS': False,
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        # В тестах реплика - это та же база, что и основная
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['consultation_planning_service.db_router.ReplicaRouter']
+
+# Сколько секунд после изменяющего запроса пользователь читает с основной базы
+REPLICA_PIN_SECONDS = 5
+
+# Как часто процесс записывает метрики пула соединений в Redis, в секундах
+DB_POOL_STATS_INTERVAL = 10
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
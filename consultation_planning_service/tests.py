@@ -0,0 +1,178 @@
+import gzip
+from datetime import datetime as dt, timezone as dt_timezone
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import ResolverMatch
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from consultations.models import Consultation
+from . import batch, export
+from .db_router import ReplicaMiddleware, ReplicaRouter, pin_key, read_only
+from .views import BatchView
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], CACHES=LOCMEM_CACHES, REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.token = f'Bearer {AccessToken.for_user(User(id=1))}'
+        cache.clear()
+
+    def request(self, method, view=None, status=200):
+        """
+        Выполнить запрос через middleware и вернуть базу, выбранную для чтения внутри представления.
+        """
+        used = []
+
+        def get_response(request):
+            if view:
+                view()
+            used.append(self.router.db_for_read(Consultation))
+            return HttpResponse(status=status)
+
+        request = getattr(self.factory, method)('/consultation/', HTTP_AUTHORIZATION=self.token)
+        ReplicaMiddleware(get_response)(request)
+        return used[0]
+
+    def test_safe_methods_read_from_replica(self):
+        self.assertEqual(self.request('get'), 'replica_1')
+        self.assertEqual(self.request('post'), 'default')
+        # Вне запроса чтение идет с основной базы
+        self.assertEqual(self.router.db_for_read(Consultation), 'default')
+
+    def test_read_after_write_in_request(self):
+        self.assertEqual(self.request('get', view=lambda: self.router.db_for_write(Consultation)), 'default')
+
+    def test_pin_after_write(self):
+        self.request('post', status=400)
+        self.assertIsNone(cache.get(pin_key(1)))
+        self.assertEqual(self.request('get'), 'replica_1')
+
+        self.request('patch')
+        self.assertTrue(cache.get(pin_key(1)))
+        self.assertEqual(self.request('get'), 'default')
+
+    def test_read_only_view(self):
+        # process_view вызывается внутри get_response, после выбора базы по методу
+        middleware = ReplicaMiddleware(lambda request: HttpResponse())
+        request = self.factory.post('/batch/', HTTP_AUTHORIZATION=self.token)
+        used = []
+
+        def get_response(request):
+            middleware.process_view(request, read_only(lambda request: None), (), {})
+            used.append(self.router.db_for_read(Consultation))
+            return HttpResponse()
+
+        middleware.get_response = get_response
+        middleware(request)
+        self.assertEqual(used, ['replica_1'])
+        self.assertIsNone(cache.get(pin_key(1)))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.request('get'), 'default')
+
+
+class ExportTestCase(SimpleTestCase):
+    rows = [{'id': 1, 'start': dt(2026, 1, 5, 7, tzinfo=dt_timezone.utc), 'description': 'a, "b"'},
+            {'id': 2, 'start': dt(2026, 1, 6, 9, tzinfo=dt_timezone.utc), 'description': 'в'}]
+    columns = ['id', 'start', 'description']
+
+    def test_ndjson(self):
+        lines = list(export.ndjson_lines(self.rows, self.columns))
+        self.assertEqual(lines[0], '{"id": 1, "start": "2026-01-05 10:00", "description": "a, \\"b\\""}\n')
+        self.assertEqual(len(lines), 2)
+
+    def test_csv(self):
+        lines = list(export.csv_lines(self.rows, self.columns))
+        self.assertEqual(lines, ['id,start,description\r\n', '1,2026-01-05 10:00,"a, ""b"""\r\n',
+                                 '2,2026-01-06 12:00,в\r\n'])
+
+    def test_gzip_roundtrip(self):
+        lines = [f'{number}\n' for number in range(50000)]
+        chunks = list(export.gzipped(export.buffered(lines)))
+        self.assertEqual(gzip.decompress(b''.join(chunks)).decode(), ''.join(lines))
+
+    def test_asgi_streams_chunk_by_chunk(self):
+        pulled, sent = [], []
+
+        def chunks():
+            for number in range(5):
+                pulled.append(number)
+                yield f'{number}'.encode() * 10
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and message.get('body'):
+                # Следующий кусок еще не прочитан, когда отправляется текущий
+                sent.append((message['body'], len(pulled)))
+
+        response = export.StreamingExportResponse(chunks(), content_type='application/x-ndjson')
+        async_to_sync(ASGIHandler().send_response)(response, send)
+        self.assertEqual(sent, [(f'{number}'.encode() * 10, number + 1) for number in range(5)])
+
+
+class WhoAmI(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({'user': request.user.id, 'page': request.query_params.get('page')})
+
+
+class BatchTestCase(SimpleTestCase):
+    def setUp(self):
+        self.request = RequestFactory().post('/batch/', HTTP_AUTHORIZATION='Bearer token')
+        self.user = User(id=7)
+
+    def test_parse(self):
+        self.assertEqual(batch.parse(['/a/', {'path': '/b/?page=2'}]), ['/a/', '/b/?page=2'])
+        for items in (None, [], ['a/'], [{'method': 'POST', 'path': '/a/'}]):
+            with self.assertRaises(batch.BatchValidationError):
+                batch.parse(items)
+        with override_settings(BATCH_MAX_REQUESTS=1), self.assertRaises(batch.BatchValidationError):
+            batch.parse(['/a/', '/b/'])
+
+    @patch('consultation_planning_service.batch.resolve')
+    def test_run_with_batch_user(self, resolve):
+        resolve.return_value = ResolverMatch(WhoAmI.as_view(), (), {}, url_name='whoami')
+        for parallel in (False, True):
+            responses = batch.run(self.request, ['/me/?page=2', '/me/'], self.user, parallel=parallel)
+            self.assertEqual(responses, [
+                {'path': '/me/?page=2', 'status': 200, 'body': {'user': 7, 'page': '2'}},
+                {'path': '/me/', 'status': 200, 'body': {'user': 7, 'page': None}},
+            ])
+
+    @patch('consultation_planning_service.batch.resolve')
+    def test_nested_batch(self, resolve):
+        resolve.return_value = ResolverMatch(WhoAmI.as_view(), (), {}, url_name=batch.URL_NAME)
+        self.assertEqual(batch.run(self.request, ['/batch/'], self.user)[0]['status'], 400)
+
+    @patch('consultation_planning_service.batch.resolve')
+    def test_failed_subrequest(self, resolve):
+        def broken(request):
+            raise RuntimeError('broken view')
+
+        resolve.side_effect = [ResolverMatch(broken, (), {}, url_name='broken'),
+                               ResolverMatch(WhoAmI.as_view(), (), {}, url_name='whoami')]
+        with self.assertLogs('consultation_planning_service.batch', 'ERROR'):
+            responses = batch.run(self.request, ['/broken/', '/me/'], self.user)
+        self.assertEqual([response['status'] for response in responses], [500, 200])
+
+    def test_view_rejects_list_body(self):
+        request = APIRequestFactory().post('/batch/', ['/me/'], format='json')
+        force_authenticate(request, user=self.user)
+        response = BatchView.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['status'], 'error')
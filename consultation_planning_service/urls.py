@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.conf import settings
+from django.db import transaction
 
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
@@ -25,6 +26,10 @@ from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from . import batch
+from .db_router import read_only
+from .views import BatchView
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Email-Verify API",
@@ -45,6 +50,9 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('', include('consultations.urls')),
     path('', include('specialist.urls')),
+    path('events/', include('events.urls')),
+    # Подзапросы только читают: без транзакции запроса и с чтением с реплик
+    path('batch/', transaction.non_atomic_requests(read_only(BatchView.as_view())), name=batch.URL_NAME),
 ]
 
 if settings.DEBUG:
@@ -2,6 +2,7 @@ from rest_framework.views import exception_handler
 from rest_framework.response import Response
 
 from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
 import hashlib
 
@@ -48,12 +49,28 @@ def api_response(status="success", data=None, errors=None, http_status=200):
     return Response(response, status=http_status)
 
 
+def get_raw_token(request):
+    """
+    Access-токен из заголовка Authorization или параметра ?token=.
+    """
+    header = request.headers.get('Authorization', '')
+    prefix, _, token = header.partition(' ')
+    if prefix in jwt_settings.AUTH_HEADER_TYPES and token:
+        return token
+    # EventSource в браузере не умеет передавать заголовки
+    return request.GET.get('token')
+
+
 class StandardResponseMixin:
     """
     Миксин для стандартизации всех ответов ViewSet
     """
 
     def finalize_response(self, request, response, *args, **kwargs):
+        # Потоковые и прочие ответы без data отдаются как есть
+        if not isinstance(response, Response):
+            return super().finalize_response(request, response, *args, **kwargs)
+
         # Если уже есть форматированный ответ, пропускаем обработку
         if isinstance(response.data, dict) and {"status", "data", "errors"}.issubset(response.data.keys()):
             return super().finalize_response(request, response, *args, **kwargs)
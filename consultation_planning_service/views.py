@@ -0,0 +1,45 @@
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from . import batch
+from .utils import api_response
+
+
+class BatchView(APIView):
+    """
+    Несколько GET-запросов к API за один запрос.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Выполнить до BATCH_MAX_REQUESTS GET-запросов к API и вернуть их ответы в одном "
+                              "ответе. Авторизация проверяется один раз для всего пакета.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['requests'],
+            properties={
+                'requests': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING),
+                                           description='Пути с параметрами, например: /accounts/consultations/?page=2'),
+                'parallel': openapi.Schema(type=openapi.TYPE_BOOLEAN,
+                                           description='Выполнить независимые запросы параллельно'),
+            }
+        ),
+    )
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            return api_response(errors={'detail': ['Ожидается объект с ключом requests.']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+        try:
+            paths = batch.parse(request.data.get('requests'))
+        except batch.BatchValidationError as exc:
+            return api_response(errors=exc.errors,
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        responses = batch.run(request._request, paths, request.user, request.auth,
+                              parallel=bool(request.data.get('parallel')))
+        return api_response(data={'responses': responses})
@@ -1,6 +1,9 @@
 from django.contrib import admin
-from .models import Consultation, Booked
+from .models import Consultation, Booked, ConsultationHistory, BookedHistory, ConsultationRecurrence
 
 # Register your models here.
 admin.site.register(Consultation)
 admin.site.register(Booked)
+admin.site.register(ConsultationHistory)
+admin.site.register(BookedHistory)
+admin.site.register(ConsultationRecurrence)
@@ -0,0 +1,74 @@
+"""
+Асинхронные представления чтения консультаций и бронирований.
+
+Фильтры, сортировка, поиск, сериализаторы, права и ключи кэша берутся
+из ConsultationList и BookedList, поэтому ответы совпадают с синхронными.
+"""
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+
+from consultation_planning_service.async_utils import async_cache, async_read_view, api_response, drf_request, \
+    paginate
+from .views import ConsultationList, BookedList
+
+
+def _view(view_class, request, user, action, **kwargs):
+    view = view_class(request=drf_request(request, user), args=(), kwargs=kwargs, format_kwarg=None, action=action)
+    view.check_permissions(view.request)
+    return view
+
+
+def list_reader(view_class):
+    async def read(request, user):
+        view = _view(view_class, request, user, 'list')
+        cache_key = view._get_cache_key(f'{view.name_prefix_cache}_list_cache', request)
+
+        data = await async_cache.get(cache_key)
+        if not data:
+            queryset = view.filter_queryset(view.get_queryset())
+            objects = await paginate(view.paginator, view.request, queryset)
+            if objects is None:
+                data = view.get_serializer([obj async for obj in queryset], many=True).data
+            else:
+                data = view.paginator.get_paginated_response(view.get_serializer(objects, many=True).data).data
+            await async_cache.set(cache_key, data, timeout=view.cache_timeout)
+
+        return api_response(data=data)
+    return read
+
+
+def detail_reader(view_class):
+    async def read(request, user, pk):
+        view = _view(view_class, request, user, 'retrieve', pk=pk)
+        cache_key = f'{view.name_prefix_cache}_detail_cache_{pk}'
+
+        data = await async_cache.get(cache_key)
+        if not data:
+            try:
+                instance = await view.filter_queryset(view.get_queryset()).filter(pk=pk).afirst()
+            except (TypeError, ValueError, ValidationError):
+                instance = None
+            serializer_class = view.get_serializer_class()
+            if instance is None:
+                # Чтение через архив: запись могла быть перенесена в историю
+                instance = await view.history_queryset.filter(pk=pk).afirst() if pk.isdigit() else None
+                serializer_class = view.history_serializer_class
+            if instance is None:
+                raise NotFound()
+            view.check_object_permissions(view.request, instance)
+
+            data = serializer_class(instance, context=view.get_serializer_context()).data
+            await async_cache.set(cache_key, data, timeout=view.cache_timeout)
+
+        return api_response(data=data)
+    return read
+
+
+consultation_list = async_read_view(list_reader(ConsultationList),
+                                    ConsultationList.as_view({'get': 'list', 'post': 'create'}))
+consultation_detail = async_read_view(detail_reader(ConsultationList),
+                                      ConsultationList.as_view({'get': 'retrieve', 'patch': 'partial_update'}))
+booked_list = async_read_view(list_reader(BookedList),
+                              BookedList.as_view({'get': 'list', 'post': 'create'}))
+booked_detail = async_read_view(detail_reader(BookedList),
+                                BookedList.as_view({'get': 'retrieve', 'patch': 'partial_update'}))
@@ -0,0 +1,162 @@
+"""
+Поиск свободного времени специалистов.
+
+Свободные интервалы рабочего дня специалиста считаются вычитанием занятых
+интервалов (неархивные консультации и виртуальные вхождения шаблонов) из
+рабочих часов: занятые интервалы сортируются и сливаются за один проход.
+Занятость всех специалистов, которых нет в кэше, читается одним запросом по
+диапазону окна. Результат кэшируется по паре (специалист, день) и сбрасывается
+после фиксации сохранения консультаций, шаблонов и рабочих часов специалиста.
+"""
+from datetime import datetime as dt, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+
+from specialist.models import Specialist
+from . import recurrence
+from .models import Consultation
+
+
+def cache_key(user_id, day):
+    return f'Availability_{user_id}_{day:%Y-%m-%d}'
+
+
+def invalidate(user_id, *starts):
+    """
+    Сбросить кэш дней, которые задевают консультации, начинающиеся в starts.
+    Кэш сбрасывается после фиксации транзакции: иначе параллельное чтение
+    успеет закэшировать состояние до изменения.
+    """
+    days = {value.date() for start in starts if start is not None
+            for value in (start, start + Consultation.MAX_DURATION)}
+    keys = [cache_key(user_id, day) for day in days]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_user(user_id):
+    """
+    Сбросить кэш всех дней специалиста после фиксации транзакции.
+    """
+    transaction.on_commit(lambda: cache.delete_pattern(f'Availability_{user_id}_*'))
+
+
+def merge(intervals):
+    """
+    Слить пересекающиеся и соприкасающиеся интервалы.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def subtract(start, end, busy):
+    """
+    Свободные части [start, end) за вычетом слитых занятых интервалов.
+    """
+    free = []
+    for busy_start, busy_end in merge(busy):
+        if busy_end <= start:
+            continue
+        if busy_start >= end:
+            break
+        if busy_start > start:
+            free.append((start, busy_start))
+        start = max(start, busy_end)
+    if start < end:
+        free.append((start, end))
+    return free
+
+
+def working_hours(specialist, day):
+    if day.weekday() not in specialist.work_weekdays:
+        return None
+    return (dt.combine(day, specialist.work_start, tzinfo=dt_timezone.utc),
+            dt.combine(day, specialist.work_end, tzinfo=dt_timezone.utc))
+
+
+def _busy(user_ids, start, end):
+    """
+    Занятые интервалы специалистов в окне: одна выборка консультаций по диапазону
+    и развертка шаблонов.
+    """
+    busy = {user_id: [] for user_id in user_ids}
+    consultations = Consultation.objects.filter(
+        user_id__in=user_ids,
+        archive=False,
+        datetime__overlap=DateTimeTZRange(start, end),
+        starts_at__gt=start - Consultation.MAX_DURATION,
+        starts_at__lt=end,
+    ).values_list('user_id', 'datetime')
+    for user_id, value in consultations:
+        busy[user_id].append((value.lower, value.upper))
+
+    recurrences = recurrence.active_recurrences(start - Consultation.MAX_DURATION, end, user_id__in=user_ids)
+    for item, value in recurrence.virtual_occurrences(recurrences, start - Consultation.MAX_DURATION, end):
+        busy[item.user_id].append((value, value + recurrence.duration(item)))
+    return busy
+
+
+def day_free(specialists, days):
+    """
+    Свободные интервалы рабочих дней специалистов.
+
+    :return: словарь (id пользователя, день) - список интервалов
+    """
+    keys = {cache_key(specialist.user_id, day): (specialist, day) for specialist in specialists for day in days}
+    cached = cache.get_many(list(keys))
+    result = {(keys[key][0].user_id, keys[key][1]): value for key, value in cached.items()}
+
+    missing = [keys[key] for key in keys if key not in cached]
+    if missing:
+        start = dt.combine(min(day for _, day in missing), time(), tzinfo=dt_timezone.utc)
+        end = dt.combine(max(day for _, day in missing) + timedelta(days=1), time(), tzinfo=dt_timezone.utc)
+        busy = _busy({specialist.user_id for specialist, _ in missing}, start, end)
+
+        computed = {}
+        for specialist, day in missing:
+            hours = working_hours(specialist, day)
+            free = subtract(*hours, busy[specialist.user_id]) if hours else []
+            result[specialist.user_id, day] = free
+            computed[cache_key(specialist.user_id, day)] = free
+        cache.set_many(computed, timeout=settings.AVAILABILITY_CACHE_TIMEOUT)
+    return result
+
+
+def search(start, end, hours, specialist_ids=None):
+    """
+    Специалисты, у которых в окне [start, end) есть свободный интервал не короче hours часов.
+    """
+    specialists = Specialist.objects.filter(is_active=True).select_related('user').order_by('id')
+    if specialist_ids:
+        specialists = specialists.filter(id__in=specialist_ids)
+    specialists = list(specialists)
+
+    days = []
+    day = start.date()
+    while day <= (end - timedelta(microseconds=1)).date():
+        days.append(day)
+        day += timedelta(days=1)
+
+    free = day_free(specialists, days)
+    length = timedelta(hours=hours)
+
+    result = []
+    for specialist in specialists:
+        intervals = []
+        for day in days:
+            for free_start, free_end in free[specialist.user_id, day]:
+                free_start, free_end = max(free_start, start), min(free_end, end)
+                if free_end - free_start >= length:
+                    intervals.append({'start': free_start.strftime('%Y-%m-%d %H:%M'),
+                                      'end': free_end.strftime('%Y-%m-%d %H:%M')})
+        if intervals:
+            result.append({'specialist': specialist.id, 'user': specialist.user_id,
+                           'username': specialist.user.username, 'free': intervals})
+    return result
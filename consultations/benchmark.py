@@ -0,0 +1,62 @@
+"""
+Замер пропускной способности чтения при конкурентных запросах под ASGI.
+
+Запросы выполняются так же, как их выполняет ASGIHandler: синхронное
+представление - через sync_to_async в общем потоке, асинхронное - прямо
+в цикле событий. Сравниваются запросы в секунду при заданном числе
+одновременных запросов.
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory
+
+from accounts.async_views import consultations_account, booked_account
+from accounts.views import ConsultationsAccount, BookedAccountView
+from .async_views import consultation_list, booked_list
+from .views import ConsultationList, BookedList
+
+VIEWS = {
+    'consultation': ('/consultation/', ConsultationList.as_view({'get': 'list'}), consultation_list),
+    'booked': ('/booked/', BookedList.as_view({'get': 'list'}), booked_list),
+    'consultations-account': ('/accounts/consultations/', ConsultationsAccount.as_view(), consultations_account),
+    'booked-account': ('/accounts/bookeds/', BookedAccountView.as_view(), booked_account),
+}
+
+
+async def _run(view, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(request):
+        async with semaphore:
+            response = await view(request)
+            if hasattr(response, 'render'):
+                await sync_to_async(response.render)()
+            return response.status_code
+
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*[call(request) for request in requests])
+    return len(requests) / (time.perf_counter() - started), statuses
+
+
+def run_benchmark(name, token, count=200, concurrency=20, cold=False):
+    """
+    :param cold: добавлять к каждому запросу уникальный параметр, чтобы не попадать в кэш
+    :return: словарь {режим: запросов в секунду}
+    """
+    path, sync_view, async_view = VIEWS[name]
+    factory = RequestFactory()
+
+    def requests():
+        return [factory.get(path, {'_': number} if cold else {}, HTTP_AUTHORIZATION=f'Bearer {token}')
+                for number in range(count)]
+
+    results = {}
+    for mode, view in (('sync', sync_to_async(sync_view)), ('async', async_view)):
+        rate, statuses = asyncio.run(_run(view, requests(), concurrency))
+        errors = [status for status in statuses if status != 200]
+        if errors:
+            raise RuntimeError(f'{mode}: получены ответы {sorted(set(errors))}')
+        results[mode] = rate
+    return results
@@ -0,0 +1,214 @@
+"""
+Массовые действия специалиста с бронями.
+
+Брони пачки читаются одним запросом вместе с консультациями и блокируются;
+права автора консультации проверяются по этой же выборке. Переходы статусов
+выполняются UPDATE по множествам id в одной транзакции. Обработчики
+сохранения при этом не вызываются, поэтому кэш сбрасывается одним
+delete_many, события шины и пользователям уходят одним конвейером, а письма
+ставятся в outbox пачкой на каждый тип.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from events import bus, live, outbox
+from notifications import payloads
+from .models import Booked, Consultation
+from .tasks import task_send_email_booked_accept, task_send_email_booked_cancellation
+
+OPERATIONS = ('accept', 'cancel', 'reject')
+
+# Статусы, из которых допустима операция
+ALLOWED_STATUSES = {
+    'accept': ('In processing',),
+    'cancel': ('In processing', 'Booked'),
+    'reject': ('In processing',),
+}
+
+DISPLACED_TEXT = 'Консультация была забронирована другим пользователем.'
+
+
+class BulkValidationError(Exception):
+    """
+    Запрос не прошел проверку.
+
+    :param errors: ошибки по операциям или по ключу 'detail'
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def parse(data):
+    """
+    Операции запроса {'accept': [id, ...], 'cancel': [...], 'reject': [...]}.
+
+    :return: словарь id брони - операция
+    :raises BulkValidationError: некорректные id, повторы или превышение BOOKED_BULK_MAX_ITEMS
+    """
+    operations, errors = {}, {}
+    for operation in OPERATIONS:
+        ids = data.get(operation) or []
+        if not isinstance(ids, list):
+            errors[operation] = ['Ожидается список id.']
+            continue
+        for value in ids:
+            try:
+                booked_id = int(value)
+            except (TypeError, ValueError):
+                errors.setdefault(operation, []).append(f'Некорректный id: {value}.')
+                continue
+            if operations.setdefault(booked_id, operation) != operation:
+                errors.setdefault(operation, []).append(f'Для брони {booked_id} указано несколько операций.')
+
+    if not errors and not operations:
+        errors['detail'] = ['Укажите id броней хотя бы для одной операции.']
+    if len(operations) > settings.BOOKED_BULK_MAX_ITEMS:
+        errors['detail'] = [f'Не больше {settings.BOOKED_BULK_MAX_ITEMS} броней за раз.']
+    if errors:
+        raise BulkValidationError(errors)
+    return operations
+
+
+def _result(status, detail=None):
+    return {'status': status, 'detail': detail} if detail else {'status': status}
+
+
+def plan(user, operations, bookeds):
+    """
+    Разделить брони на подтверждаемые и отклоняемые.
+
+    :param bookeds: словарь id - бронь с загруженной консультацией
+    :return: результаты отклоненных операций, подтверждаемые брони, отклоняемые брони
+    """
+    results, accepted, cancelled = {}, [], []
+    accepted_consultations = set()
+    for booked_id, operation in operations.items():
+        booked = bookeds.get(booked_id)
+        if booked is None:
+            results[booked_id] = _result('not_found', 'Бронь не найдена.')
+        elif booked.consultation.user_id != user.id:
+            results[booked_id] = _result('forbidden', 'Вы не автор консультации.')
+        elif booked.archive or booked.status not in ALLOWED_STATUSES[operation]:
+            results[booked_id] = _result('invalid_status', f'Недопустимо для статуса {booked.status}.')
+        elif operation == 'accept':
+            consultation = booked.consultation
+            if consultation.archive or consultation.booking or consultation.id in accepted_consultations:
+                results[booked_id] = _result('conflict', 'Консультация уже забронирована.')
+            else:
+                accepted_consultations.add(consultation.id)
+                accepted.append(booked)
+        else:
+            cancelled.append(booked)
+    return results, accepted, cancelled
+
+
+def _ids(objects):
+    return [obj.id for obj in objects]
+
+
+def _consultations(bookeds):
+    consultations = {booked.consultation.id: booked.consultation for booked in bookeds}
+    return list(consultations.values())
+
+
+def _set_booking(consultations, booking):
+    if consultations:
+        Consultation.objects.filter(pk__in=_ids(consultations),
+                                    starts_at__in={obj.starts_at for obj in consultations}).update(booking=booking)
+
+
+def _update(bookeds, **values):
+    if bookeds:
+        Booked.objects.filter(pk__in=_ids(bookeds),
+                              consultation_starts_at__in={obj.consultation_starts_at for obj in bookeds}) \
+            .update(**values)
+
+
+@transaction.atomic
+def apply(user, operations, rejection_text=None):
+    """
+    Выполнить операции специалиста user над бронями.
+
+    :return: результаты в порядке операций: id брони, статус и причина, если операция не выполнена
+    :raises BulkValidationError: если для отмены или отклонения не указана причина
+    """
+    if not rejection_text and any(operation != 'accept' for operation in operations.values()):
+        raise BulkValidationError({'rejection_text': ['Причина отказа обязательна для заполнения.']})
+
+    bookeds = Booked.objects.select_related('user', 'consultation') \
+        .select_for_update(of=('self', 'consultation')).filter(pk__in=list(operations))
+    results, accepted, cancelled = plan(user, operations, {booked.id: booked for booked in bookeds})
+
+    # Отмена подтвержденной брони освобождает консультацию
+    freed = _consultations([booked for booked in cancelled if booked.status == 'Booked'])
+    _update(cancelled, status='Cancelled', rejection_text=rejection_text, archive=True)
+    _set_booking(freed, False)
+
+    # Остальные заявки на подтверждаемые консультации отклоняются, как при подтверждении по одной
+    booked_consultations = _consultations(accepted)
+    displaced = []
+    if accepted:
+        _update(accepted, status='Booked')
+        _set_booking(booked_consultations, True)
+        displaced = list(
+            Booked.objects.select_related('user', 'consultation')
+            .select_for_update(of=('self',))
+            .filter(consultation_id__in=_ids(booked_consultations),
+                    consultation_starts_at__in={obj.starts_at for obj in booked_consultations},
+                    status='In processing')
+            .exclude(pk__in=_ids(accepted))
+        )
+        _update(displaced, status='Cancelled', rejection_text=DISPLACED_TEXT, archive=True)
+
+    for booked in accepted:
+        results[booked.id] = _result('Booked')
+    for booked in cancelled:
+        results[booked.id] = _result('Cancelled')
+
+    changes = [(booked, 'Booked', None) for booked in accepted] \
+        + [(booked, 'Cancelled', rejection_text) for booked in cancelled] \
+        + [(booked, 'Cancelled', DISPLACED_TEXT) for booked in displaced]
+    if changes:
+        _notify(user, changes, freed + booked_consultations)
+    return [{'id': booked_id, **results[booked_id]} for booked_id in operations]
+
+
+def _notify(user, changes, consultations):
+    """
+    Сбросить кэш, опубликовать события и поставить письма для измененных броней одной пачкой.
+
+    :param changes: тройки (бронь до изменения, новый статус, причина отказа)
+    """
+    keys = {f'{prefix}_detail_cache_{user.id}'
+            for prefix in ('ConsultationList', 'ConsultationsAccount', 'BookedAccountView')}
+    events, messages, accept_calls, cancellation_calls = [], [], [], []
+    for booked, new_status, text in changes:
+        keys.update(f'{prefix}_detail_cache_{booked.user_id}'
+                    for prefix in ('BookedList', 'BookedAccountView', 'ConsultationsAccount'))
+        events.append(('booked.saved', {'id': booked.id, 'user_id': booked.user_id,
+                                        'consultation_id': booked.consultation_id, 'specialist_id': user.id,
+                                        'status': new_status, 'previous_status': booked.status,
+                                        'created': False}))
+        messages.append((booked.user_id, 'booked.status', {'id': booked.id, 'consultation_id': booked.consultation_id,
+                                                           'status': new_status,
+                                                           'previous_status': booked.status}))
+        if new_status == 'Booked':
+            payload = payloads.build_payload(booked.user, **payloads.consultation_context(booked.consultation))
+            accept_calls.append(((booked.id, payload), {}))
+        else:
+            cancellation_calls.append(((booked.id, payloads.build_payload(booked.user, rejection_text=text)), {}))
+
+    events.extend(('consultation.saved', {'id': consultation.id, 'user_id': consultation.user_id,
+                                          'archive': consultation.archive, 'created': False})
+                  for consultation in consultations)
+
+    cache.delete_many(sorted(keys))
+    bus.publish_many(events)
+    live.publish_many(messages)
+    if accept_calls:
+        outbox.enqueue_many(task_send_email_booked_accept, accept_calls)
+    if cancellation_calls:
+        outbox.enqueue_many(task_send_email_booked_cancellation, cancellation_calls)
@@ -0,0 +1,101 @@
+"""
+Календарь консультаций по дням месяца.
+
+Дни месяца строятся generate_series в часовом поясе TIME_ZONE и соединяются с
+консультациями по пересечению диапазонов (GiST-индекс по datetime); консультация
+относится к дню своего начала. Количество свободных, забронированных и архивных
+консультаций и минимальная цена свободных считаются одним сгруппированным
+запросом по горячей таблице и истории.
+
+Результат кэшируется на пару (месяц, специалист) и сбрасывается потребителем
+шины событий при сохранении и импорте консультаций.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .partitions import add_months
+
+CACHE_PREFIX = 'ConsultationCalendar'
+
+_SQL = """
+WITH days AS (
+    SELECT day::date AS day,
+           day AT TIME ZONE %(tz)s AS day_start,
+           (day + interval '1 day') AT TIME ZONE %(tz)s AS day_end
+    FROM generate_series(%(start)s::timestamp, %(end)s::timestamp - interval '1 day', interval '1 day') AS day
+),
+consultations AS (
+    SELECT datetime, starts_at, booking, archive, price
+    FROM consultations_consultation
+    WHERE starts_at >= %(start)s::timestamp AT TIME ZONE %(tz)s
+      AND starts_at < %(end)s::timestamp AT TIME ZONE %(tz)s {user_filter}
+    UNION ALL
+    SELECT datetime, starts_at, booking, TRUE, price
+    FROM consultations_consultationhistory
+    WHERE starts_at >= %(start)s::timestamp AT TIME ZONE %(tz)s
+      AND starts_at < %(end)s::timestamp AT TIME ZONE %(tz)s {user_filter}
+)
+SELECT days.day,
+       count(c.starts_at) FILTER (WHERE NOT c.archive AND NOT c.booking),
+       count(c.starts_at) FILTER (WHERE NOT c.archive AND c.booking),
+       count(c.starts_at) FILTER (WHERE c.archive),
+       min(c.price) FILTER (WHERE NOT c.archive AND NOT c.booking)
+FROM days
+LEFT JOIN consultations AS c
+    ON c.datetime && tstzrange(days.day_start, days.day_end)
+   AND c.starts_at >= days.day_start AND c.starts_at < days.day_end
+GROUP BY days.day
+ORDER BY days.day
+"""
+
+
+def cache_key(month, user_id=None):
+    return f'{CACHE_PREFIX}_{month:%Y-%m}_{user_id or "all"}'
+
+
+def month_days(month, user_id=None):
+    """
+    Счетчики консультаций по дням месяца month (первое число), при user_id - одного специалиста.
+    """
+    params = {
+        'tz': timezone.get_default_timezone_name(),
+        'start': month,
+        'end': add_months(month, 1),
+    }
+    user_filter = ''
+    if user_id is not None:
+        user_filter = 'AND user_id = %(user_id)s'
+        params['user_id'] = user_id
+
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL.format(user_filter=user_filter), params)
+        rows = cursor.fetchall()
+
+    return [
+        {'date': day.isoformat(), 'open': open_count, 'booked': booked_count, 'archived': archived_count,
+         'min_price': min_price}
+        for day, open_count, booked_count, archived_count, min_price in rows
+    ]
+
+
+def get(month, user_id=None):
+    key = cache_key(month, user_id)
+    days = cache.get(key)
+    if days is None:
+        days = month_days(month, user_id)
+        cache.set(key, days, timeout=settings.CONSULTATION_CALENDAR_CACHE_TIMEOUT)
+    return days
+
+
+def parse_month(value):
+    """
+    Первое число месяца из строки вида 2025-10.
+
+    :raises ValueError: если формат неверный
+    """
+    year, month = value.split('-')
+    return date(int(year), int(month), 1)
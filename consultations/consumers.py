@@ -0,0 +1,27 @@
+"""
+Потребители шины событий приложения consultations.
+"""
+from django.core.cache import cache
+
+from events.bus import consumer
+
+# Шаблоны ключей кэша списков, которые устаревают при событии
+LIST_CACHE_PATTERNS = {
+    'booked.saved': ('BookedList_list_cache_*',),
+    'consultation.saved': ('ConsultationList_list_cache_*', 'ConsultationCalendar_*'),
+    'consultation.imported': ('ConsultationList_list_cache_*', 'ConsultationCalendar_*'),
+    'history.moved': ('ConsultationList_list_cache_*', 'BookedList_list_cache_*'),
+}
+
+
+@consumer('cache-invalidation')
+def invalidate_list_caches(events):
+    """
+    Сбросить кэш списков один раз на пачку событий, а не на каждое сохранение.
+    """
+    patterns = set()
+    for event in events:
+        patterns.update(LIST_CACHE_PATTERNS.get(event['type'], ()))
+
+    for pattern in sorted(patterns):
+        cache.delete_pattern(pattern)
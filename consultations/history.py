@@ -0,0 +1,72 @@
+"""
+Перенос архивных консультаций в таблицы истории.
+
+Архивные консультации и их брони почти не читаются, но занимают место в
+горячих таблицах и их индексах. Спустя CONSULTATION_HISTORY_AFTER после начала
+консультации они пачками по CONSULTATION_HISTORY_BATCH_SIZE переносятся в
+ConsultationHistory и BookedHistory с сохранением id. Детальные представления
+читают через историю: запись, которой нет в горячей таблице, ищется в архиве.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from events import bus
+from .models import Booked, BookedHistory, Consultation, ConsultationHistory, ConsultationReminder
+
+CONSULTATION_FIELDS = ('id', 'user_id', 'time_selection', 'datetime', 'booking', 'price', 'description', 'starts_at')
+BOOKED_FIELDS = ('id', 'user_id', 'consultation_id', 'status', 'rejection_text', 'description')
+
+
+def _copy(model, obj, fields):
+    return model(**{field: getattr(obj, field) for field in fields})
+
+
+@transaction.atomic
+def move_batch(before, batch_size):
+    """
+    Перенести пачку архивных консультаций, начавшихся раньше before, вместе с бронями.
+
+    :return: количество перенесенных консультаций
+    """
+    consultations = list(
+        Consultation.objects
+        .filter(archive=True, starts_at__lt=before)
+        .order_by('starts_at')
+        .select_for_update(skip_locked=True)[:batch_size]
+    )
+    if not consultations:
+        return 0
+
+    ids = [consultation.id for consultation in consultations]
+    # Брони лежат в тех же секциях, что и консультации
+    bookeds = Booked.objects.filter(consultation_id__in=ids, consultation_starts_at__lt=before)
+
+    ConsultationHistory.objects.bulk_create([_copy(ConsultationHistory, obj, CONSULTATION_FIELDS)
+                                             for obj in consultations])
+    BookedHistory.objects.bulk_create([_copy(BookedHistory, obj, BOOKED_FIELDS) for obj in bookeds])
+
+    ConsultationReminder.objects.filter(booked__consultation_id__in=ids).delete()
+    bookeds.delete()
+    Consultation.objects.filter(id__in=ids, starts_at__lt=before).delete()
+
+    bus.publish('history.moved', consultation_ids=ids)
+    return len(ids)
+
+
+def move_to_history(before=None, batch_size=None):
+    """
+    Перенести все архивные консультации старше CONSULTATION_HISTORY_AFTER.
+    Каждая пачка переносится в своей транзакции.
+
+    :return: количество перенесенных консультаций
+    """
+    before = before or timezone.now() - settings.CONSULTATION_HISTORY_AFTER
+    batch_size = batch_size or settings.CONSULTATION_HISTORY_BATCH_SIZE
+
+    total = 0
+    while True:
+        moved = move_batch(before, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
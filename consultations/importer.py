@@ -0,0 +1,165 @@
+"""
+Массовый импорт расписания консультаций.
+
+Пачка из CSV или JSON проверяется в памяти: формат полей, время в будущем и
+пересечения внутри пачки (сортировка по началу и один проход). Пересечения
+с уже существующими консультациями специалиста проверяются одним запросом по
+всем диапазонам пачки, с вхождениями его шаблонов - по развертке окна пачки.
+Строки загружаются через COPY с заранее выделенными id, а планирование
+событий ставится в outbox одной задачей на всю пачку.
+"""
+import csv
+import io
+import json
+from datetime import datetime as dt, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from events import bus, outbox
+from . import availability, occupancy, overlaps, recurrence
+from .models import Consultation
+from .tasks import schedule_consultations
+
+TIME_SELECTIONS = dict(Consultation.POSITIONS_TIME_SELECTION)
+
+_COPY_SQL = """
+COPY consultations_consultation (id, user_id, time_selection, datetime, booking, price, description, archive, starts_at)
+FROM STDIN
+"""
+
+
+class ImportValidationError(Exception):
+    """
+    Пачка не прошла проверку.
+
+    :param errors: ошибки по номерам строк (с нуля) или по ключу 'file'
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def parse(content, content_format):
+    """
+    Прочитать строки пачки из CSV (с заголовком) или JSON-списка объектов.
+    """
+    if content_format == 'csv':
+        return list(csv.DictReader(io.StringIO(content)))
+    try:
+        rows = json.loads(content)
+    except ValueError:
+        raise ImportValidationError({'file': ['Некорректный JSON.']})
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ImportValidationError({'file': ['Ожидается список объектов.']})
+    return rows
+
+
+def _clean_row(row, now):
+    errors = {}
+    slot = {'description': str(row.get('description') or '')}
+
+    try:
+        start = dt.strptime(str(row.get('datetime')), '%Y-%m-%d %H:%M').replace(tzinfo=dt_timezone.utc)
+    except ValueError:
+        errors['datetime'] = ['Ошибка с датой и временем.']
+    else:
+        if start < now:
+            errors['datetime'] = ['Нельзя создавать запись на прошедшую дату.']
+        slot['start'] = start
+
+    time_selection = str(row.get('time_selection') or '1')
+    if time_selection not in TIME_SELECTIONS:
+        errors['time_selection'] = [f'Допустимые значения: {", ".join(TIME_SELECTIONS)}.']
+    slot['time_selection'] = time_selection
+
+    try:
+        slot['price'] = float(row.get('price') or 0)
+    except (TypeError, ValueError):
+        errors['price'] = ['Некорректная цена.']
+    else:
+        if slot['price'] < 0:
+            errors['price'] = ['Цена не может быть отрицательной.']
+
+    if not errors:
+        slot['end'] = slot['start'] + timedelta(hours=int(time_selection))
+    return slot, errors
+
+
+def validate(user, rows, now=None):
+    """
+    Проверить пачку и вернуть слоты с началом и концом в UTC.
+
+    :raises ImportValidationError: ошибки по номерам строк
+    """
+    if not rows:
+        raise ImportValidationError({'file': ['Пачка пуста.']})
+    if len(rows) > settings.CONSULTATION_IMPORT_MAX_ROWS:
+        raise ImportValidationError({'file': [f'Не больше {settings.CONSULTATION_IMPORT_MAX_ROWS} строк за раз.']})
+
+    now = now or dt.now(dt_timezone.utc)
+    slots, errors = [], {}
+    for number, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[number] = {'row': ['Ожидается объект.']}
+            continue
+        slot, row_errors = _clean_row(row, now)
+        slots.append(slot)
+        if row_errors:
+            errors[number] = row_errors
+    if errors:
+        raise ImportValidationError(errors)
+
+    # Пересечения внутри пачки: после сортировки по началу достаточно сравнить с предыдущим концом
+    order = sorted(range(len(slots)), key=lambda number: slots[number]['start'])
+    for previous, number in zip(order, order[1:]):
+        if slots[number]['start'] < slots[previous]['end']:
+            errors[number] = {'datetime': [f'Запись пересекается со строкой {previous}.']}
+
+    for number in overlaps.existing_overlaps(user, slots):
+        errors.setdefault(number, {'datetime': ['Запись пересекается с существующей записью.']})
+    for number in recurrence.overlapping_slots(user, slots):
+        errors.setdefault(number, {'datetime': ['Запись пересекается с повторяющейся консультацией.']})
+
+    if errors:
+        raise ImportValidationError(dict(sorted(errors.items())))
+    return slots
+
+
+def _range(slot):
+    return f'[{slot["start"].isoformat()},{slot["end"].isoformat()})'
+
+
+@transaction.atomic
+def load(user, slots):
+    """
+    Загрузить проверенные слоты через COPY.
+
+    :return: id созданных консультаций
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence('consultations_consultation', 'id')) FROM generate_series(1, %s)",
+            [len(slots)],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+
+        with cursor.copy(_COPY_SQL) as copy:
+            for consultation_id, slot in zip(ids, slots):
+                copy.write_row((consultation_id, user.id, slot['time_selection'], _range(slot), False,
+                                slot['price'], slot['description'], False, slot['start']))
+
+    # COPY не вызывает сигналы сохранения, поэтому кэш и события обновляются здесь
+    cache.delete(f'ConsultationList_detail_cache_{user.id}')
+    cache.delete(f'ConsultationsAccount_detail_cache_{user.id}')
+    availability.invalidate(user.id, *[slot['start'] for slot in slots])
+    occupancy.change_on_commit(user.id, added=[(slot['start'], slot['end']) for slot in slots])
+    bus.publish('consultation.imported', user_id=user.id, ids=ids)
+    outbox.enqueue(schedule_consultations, ids)
+    return ids
+
+
+def import_consultations(user, rows):
+    return load(user, validate(user, rows))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from consultations.benchmark import VIEWS, run_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Сравнить синхронное и асинхронное чтение при конкурентных запросах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Пользователь, от имени которого выполняются запросы.')
+        parser.add_argument('--view', choices=list(VIEWS), default='consultation')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--cold', action='store_true', help='Не попадать в кэш.')
+
+    def handle(self, *args, **options):
+        user = User.objects.get(email=options['email'])
+        results = run_benchmark(options['view'], str(AccessToken.for_user(user)), count=options['requests'],
+                                concurrency=options['concurrency'], cold=options['cold'])
+
+        for mode, rate in results.items():
+            self.stdout.write(f'{mode}: {rate:.0f} запросов/с')
+        self.stdout.write(f"Ускорение: x{results['async'] / results['sync']:.1f}")
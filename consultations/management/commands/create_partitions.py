@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from consultations.partitions import add_months, create_partitions, month_start
+
+
+class Command(BaseCommand):
+    help = 'Создать месячные секции консультаций и броней заранее.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.CONSULTATION_PARTITIONS_AHEAD,
+                            help='На сколько месяцев вперед создавать секции.')
+
+    def handle(self, *args, **options):
+        start = month_start(timezone.now())
+        created = create_partitions(start, add_months(start, options['months']))
+
+        for name in created:
+            self.stdout.write(f'Создана секция {name}')
+        self.stdout.write(f'Создано секций: {len(created)}')
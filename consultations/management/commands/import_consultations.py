@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from consultations import importer
+
+
+class Command(BaseCommand):
+    help = 'Импортировать консультации специалиста из CSV или JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Специалист, которому принадлежат консультации.')
+        parser.add_argument('path', help='Файл .csv с заголовком или .json со списком объектов.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['email']} не найден.")
+        path = options['path']
+        content_format = 'csv' if path.lower().endswith('.csv') else 'json'
+
+        with open(path, encoding='utf-8-sig') as file:
+            content = file.read()
+
+        try:
+            ids = importer.import_consultations(user, importer.parse(content, content_format))
+        except importer.ImportValidationError as exc:
+            raise CommandError(f'Ошибки в пачке: {exc.errors}')
+
+        self.stdout.write(f'Импортировано консультаций: {len(ids)}')
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from consultations.history import move_to_history
+
+
+class Command(BaseCommand):
+    help = 'Перенести архивные консультации и их брони в таблицы истории.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CONSULTATION_HISTORY_AFTER.days,
+                            help='Переносить консультации, начавшиеся раньше, чем столько дней назад.')
+        parser.add_argument('--batch-size', type=int, default=settings.CONSULTATION_HISTORY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        moved = move_to_history(before, options['batch_size'])
+        self.stdout.write(f'Перенесено консультаций: {moved}')
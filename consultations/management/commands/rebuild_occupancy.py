@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from consultations import occupancy
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать почасовую занятость специалистов в Redis из БД.'
+
+    def handle(self, *args, **options):
+        count = occupancy.rebuild()
+        self.stdout.write(f'Учтено консультаций: {count}')
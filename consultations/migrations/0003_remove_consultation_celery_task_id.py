@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-19 10:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0002_consultation_celery_task_id'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='consultation',
+            name='celery_task_id',
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-19 13:51
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0003_remove_consultation_celery_task_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['datetime'], name='consultation_datetime_gist'),
+        ),
+        migrations.CreateModel(
+            name='ConsultationReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('booked', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='consultations.booked')),
+            ],
+        ),
+    ]
@@ -0,0 +1,155 @@
+from datetime import datetime as dt, timedelta, timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+# На сколько месяцев вперед создаются секции при переходе на секционирование
+MONTHS_AHEAD = 3
+
+# Копия на момент миграции: consultations.partitions может меняться дальше
+PARTITIONED_TABLES = {
+    'consultations_consultation': 'starts_at',
+    'consultations_booked': 'consultation_starts_at',
+}
+
+
+def _months(start, end):
+    current = dt(start.year, start.month, 1, tzinfo=dt_timezone.utc)
+    end = dt(end.year, end.month, 1, tzinfo=dt_timezone.utc)
+    while current <= end:
+        following = current.replace(year=current.year + current.month // 12, month=current.month % 12 + 1)
+        yield current, following
+        current = following
+
+
+def create_partitions(cursor, start, end):
+    """
+    Создает месячные секции обеих таблиц с месяца start по месяц end и секции по умолчанию.
+    """
+    for table, key in PARTITIONED_TABLES.items():
+        for month, following in _months(start, end):
+            cursor.execute(
+                f'CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+                [month, following],
+            )
+        cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+
+def partition_tables(apps, schema_editor):
+    """
+    Пересоздает таблицы консультаций и броней как секционированные по месяцам.
+
+    Django не умеет создавать секционированные таблицы, поэтому схема переносится
+    вручную: старая таблица переименовывается, новая создается по ее образцу с
+    PARTITION BY RANGE, данные копируются, индексы и внешние ключи воссоздаются.
+    Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+    поэтому он становится составным (id, ключ), а для ORM id остается первичным ключом.
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT min(starts_at), max(starts_at) FROM consultations_consultation')
+        first, last = cursor.fetchone()
+        now = timezone.now()
+        first = min(first or now, now)
+        last = max(last or now, now + timedelta(days=31 * MONTHS_AHEAD))
+
+        indexes, foreign_keys = {}, {}
+        for table, key in PARTITIONED_TABLES.items():
+            old = f'{table}_old'
+
+            cursor.execute(
+                'SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s',
+                [table, f'{table}_pkey'],
+            )
+            indexes[table] = cursor.fetchall()
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f'",
+                [table],
+            )
+            foreign_keys[table] = cursor.fetchall()
+
+            for name, _ in indexes[table]:
+                cursor.execute(f'DROP INDEX {name}')
+            for name, _ in foreign_keys[table]:
+                cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+            cursor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+            cursor.execute(f'ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey')
+
+            # IDENTITY не переносится в секционированную таблицу, id получает обычную последовательность ниже
+            cursor.execute(
+                f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                f'PARTITION BY RANGE ({key})'
+            )
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, {key})')
+
+        create_partitions(cursor, first, last)
+
+        for table in PARTITIONED_TABLES:
+            old = f'{table}_old'
+            cursor.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+            cursor.execute(f'DROP TABLE {old}')
+
+            cursor.execute(f'CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id')
+            cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+            cursor.execute(f"SELECT setval('{table}_id_seq', coalesce(max(id), 0) + 1, false) FROM {table}")
+
+            for _, definition in indexes[table]:
+                cursor.execute(definition)
+            for name, definition in foreign_keys[table]:
+                cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0004_consultation_reminder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultation',
+            name='starts_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='booked',
+            name='consultation_starts_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            'UPDATE consultations_consultation SET starts_at = lower(datetime)',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'UPDATE consultations_booked AS booked SET consultation_starts_at = consultation.starts_at '
+            'FROM consultations_consultation AS consultation WHERE consultation.id = booked.consultation_id',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='consultation',
+            name='starts_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='booked',
+            name='consultation_starts_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        # Внешний ключ может ссылаться только на уникальный набор столбцов, а id
+        # секционированной таблицы уникален лишь вместе с ключом секционирования
+        migrations.AlterField(
+            model_name='booked',
+            name='consultation',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE,
+                                    to='consultations.consultation'),
+        ),
+        migrations.AlterField(
+            model_name='consultationreminder',
+            name='booked',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE,
+                                       to='consultations.booked'),
+        ),
+        migrations.RunPython(partition_tables, elidable=False),
+    ]
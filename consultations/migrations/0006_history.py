@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:12
+
+import django.contrib.postgres.fields.ranges
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0005_partition_by_month'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsultationHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('time_selection', models.CharField(choices=[('1', '1 час'), ('2', '2 часа'), ('3', '3 часа')], max_length=1)),
+                ('datetime', django.contrib.postgres.fields.ranges.DateTimeRangeField()),
+                ('booking', models.BooleanField(default=False)),
+                ('price', models.FloatField(default=0.0)),
+                ('description', models.TextField(blank=True, default='')),
+                ('starts_at', models.DateTimeField()),
+                ('moved_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookedHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('In processing', 'В обработке'), ('Cancelled', 'Отменено'), ('Booked', 'Забронировано'), ('Successfully', 'Успешно')], max_length=13)),
+                ('rejection_text', models.TextField(default='', null=True)),
+                ('description', models.TextField(blank=True, default='', null=True)),
+                ('moved_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('consultation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookeds', to='consultations.consultationhistory')),
+            ],
+        ),
+    ]
@@ -1,16 +1,41 @@
-from celery import current_app
+from datetime import timedelta, timezone as dt_timezone
+
 from django.db import models
-from django.contrib.postgres.fields import DateTimeRangeField
+from django.contrib.postgres.fields import ArrayField, DateTimeRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.utils import timezone
 
 from accounts.models import User
+from . import scheduler
+
+
+POSITIONS_TIME_SELECTION = [
+    ('1', '1 час'),
+    ('2', '2 часа'),
+    ('3', '3 часа')
+]
+
+
+class ConsultationRecurrence(models.Model):
+    """
+    Шаблон повторяющихся консультаций: по дням недели weekdays (0 - понедельник)
+    в часы hours (UTC) с starts_on по ends_on. Вхождения не хранятся, а
+    вычисляются для запрошенного окна; строка Consultation создается только
+    при бронировании вхождения.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurrences')
+    weekdays = ArrayField(models.PositiveSmallIntegerField())
+    hours = ArrayField(models.PositiveSmallIntegerField())
+    time_selection = models.CharField(max_length=1, choices=POSITIONS_TIME_SELECTION, default='1')
+    price = models.FloatField(default=0.0)
+    description = models.TextField(blank=True, default="")
+    starts_on = models.DateField()
+    ends_on = models.DateField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
 
 
 class Consultation(models.Model):
-    POSITIONS_TIME_SELECTION = [
-        ('1', '1 час'),
-        ('2', '2 часа'),
-        ('3', '3 часа')
-    ]
+    POSITIONS_TIME_SELECTION = POSITIONS_TIME_SELECTION
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     time_selection = models.CharField(max_length=1, choices=POSITIONS_TIME_SELECTION, default='1')
@@ -21,23 +46,73 @@ class Consultation(models.Model):
 
     archive = models.BooleanField(default=False)
 
-    celery_task_id = models.CharField(max_length=255, blank=True, null=True)
+    # Шаблон, вхождение которого материализовано в эту консультацию
+    recurrence = models.ForeignKey(ConsultationRecurrence, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='consultations')
+
+    # Начало консультации - ключ секционирования таблицы по месяцам, заполняется в save()
+    starts_at = models.DateTimeField(editable=False)
+
+    # Самая длинная консультация: ограничивает поиск пересечений по starts_at
+    MAX_DURATION = timedelta(hours=3)
+
+    class Meta:
+        indexes = [
+            GistIndex(fields=['datetime'], name='consultation_datetime_gist'),
+        ]
+        constraints = [
+            # Вхождение шаблона материализуется один раз; ключ секционирования входит в ограничение
+            models.UniqueConstraint(fields=['recurrence', 'starts_at'], name='consultation_recurrence_occurrence'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded()
+        return instance
+
+    def _remember_loaded(self):
+        # Сохраненное в БД состояние: по нему сигналы находят перенесенные и архивированные консультации
+        self._loaded_starts_at = self.__dict__.get('starts_at')
+        self._loaded_datetime = self.__dict__.get('datetime')
+        self._loaded_archive = self.__dict__.get('archive')
+
+    def save(self, *args, **kwargs):
+        starts_at = self.datetime.lower
+        if timezone.is_naive(starts_at):
+            # Наивное время из сериализатора сохраняется в БД как UTC
+            starts_at = timezone.make_aware(starts_at, dt_timezone.utc)
+        self.starts_at = starts_at
+
+        super().save(*args, **kwargs)
+
+        loaded_starts_at = getattr(self, '_loaded_starts_at', None)
+        if loaded_starts_at is not None and loaded_starts_at != self.starts_at:
+            # Брони переносятся в секцию новой даты вместе с консультацией
+            Booked.objects.filter(consultation=self, consultation_starts_at=loaded_starts_at) \
+                .update(consultation_starts_at=self.starts_at)
+        self._remember_loaded()
+
+    def bookeds(self):
+        """
+        Брони консультации с отбором по ключу секционирования.
+        """
+        return Booked.objects.filter(consultation=self, consultation_starts_at=self.starts_at)
 
     def update_booking(self, booked):
         self.booking = booked
         self.save()
         if booked:
-            booking_list = Booked.objects.filter(consultation=self, status='In processing')
+            booking_list = self.bookeds().filter(status='In processing').select_related('user')
             for booking in booking_list:
                 booking.cancelled('Консультация была забронирована другим пользователем.')
 
     def cancelled(self, rejection_text):
-        for booked in Booked.objects.filter(consultation=self, archive=False):
+        for booked in self.bookeds().filter(archive=False).select_related('user'):
             if booked.status != 'Cancelled':
                 booked.cancelled(rejection_text)
 
-        if self.celery_task_id:
-            current_app.control.revoke(self.celery_task_id, terminate=True)
+        scheduler.cancel_consultation(self.id)
 
         self.set_archive()
 
@@ -55,13 +130,22 @@ class Booked(models.Model):
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    consultation = models.ForeignKey(Consultation, on_delete=models.CASCADE)
+    # Секционированная таблица не может быть целью внешнего ключа, связь проверяет ORM
+    consultation = models.ForeignKey(Consultation, on_delete=models.CASCADE, db_constraint=False)
     status = models.CharField(max_length=13, choices=POSITIONS_STATUS, default='In processing')
     rejection_text = models.TextField(null=True, default="")
     description = models.TextField(blank=True, null=True, default="")
 
     archive = models.BooleanField(default=False)
 
+    # Копия Consultation.starts_at: бронь лежит в секции того же месяца, что и консультация
+    consultation_starts_at = models.DateTimeField(editable=False)
+
+    def save(self, *args, **kwargs):
+        if self.consultation_starts_at is None:
+            self.consultation_starts_at = self.consultation.starts_at
+        super().save(*args, **kwargs)
+
     def cancelled(self, text):
         if self.status == 'Booked':
             self.consultation.update_booking(False)
@@ -81,3 +165,46 @@ class Booked(models.Model):
         self.status = 'Successfully'
         self.archive = True
         self.save()
+
+
+class ConsultationReminder(models.Model):
+    """
+    Отметка об отправленном напоминании о консультации. Гарантирует, что напоминание
+    по одной брони отправляется только один раз.
+    """
+    booked = models.OneToOneField(Booked, on_delete=models.CASCADE, db_constraint=False)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+
+class ConsultationHistory(models.Model):
+    """
+    Архивная консультация, перенесенная из горячей таблицы спустя CONSULTATION_HISTORY_AFTER
+    после начала. Сохраняет id исходной записи.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    time_selection = models.CharField(max_length=1, choices=Consultation.POSITIONS_TIME_SELECTION)
+    datetime = DateTimeRangeField()
+    booking = models.BooleanField(default=False)
+    price = models.FloatField(default=0.0)
+    description = models.TextField(blank=True, default="")
+    starts_at = models.DateTimeField()
+    moved_at = models.DateTimeField(auto_now_add=True)
+
+    # Записи истории всегда архивные
+    archive = True
+
+
+class BookedHistory(models.Model):
+    """
+    Бронь архивной консультации, перенесенная вместе с ней.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    consultation = models.ForeignKey(ConsultationHistory, on_delete=models.CASCADE, related_name='bookeds')
+    status = models.CharField(max_length=13, choices=Booked.POSITIONS_STATUS)
+    rejection_text = models.TextField(null=True, default="")
+    description = models.TextField(blank=True, null=True, default="")
+    moved_at = models.DateTimeField(auto_now_add=True)
+
+    archive = True
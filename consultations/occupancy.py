@@ -0,0 +1,211 @@
+"""
+Почасовая занятость специалистов в Redis.
+
+Для каждой пары (специалист, день) хранится строка из 24 четырехбитных
+счетчиков BITFIELD u4: сколько неархивных консультаций задевает каждый час
+(UTC). Счетчики, а не биты, нужны потому, что консультации с началом не в
+ровный час могут делить один час. Счетчики обновляются после фиксации
+сохранения консультации и при массовом импорте, а команда rebuild_occupancy
+и периодическая задача пересобирают их из БД.
+
+Счетчики лежат в кэше Redis: ключи могут быть вытеснены или отстать от БД,
+поэтому отсутствие пересечений всегда проверяется по БД. Пока после
+пересборки есть ключ READY_KEY, ненулевой счетчик часа, целиком покрытого
+интервалом, означает пересечение, и запись отклоняется без запроса к БД.
+
+Каждое изменение счетчиков увеличивает CHANGES_KEY: по нему пересборка
+узнает, что счетчики менялись, пока она читала БД.
+"""
+import logging
+from datetime import datetime as dt, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .models import Consultation
+
+logger = logging.getLogger(__name__)
+
+KEY = 'occupancy:{}:{:%Y-%m-%d}'
+READY_KEY = 'occupancy:ready'
+CHANGES_KEY = 'occupancy:changes'
+# Префикс ключей, в которые пересборка пишет новые счетчики перед переименованием
+REBUILD_PREFIX = 'rebuild:'
+# Сколько раз пересборка повторяется, если счетчики менялись во время нее
+REBUILD_ATTEMPTS = 3
+# Сколько дней после окончания дня хранится его счетчик
+KEEP_DAYS = 1
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def hours(start, end):
+    """
+    Часы, которые задевает интервал [start, end): пары (день, час).
+    """
+    current = start.replace(minute=0, second=0, microsecond=0)
+    while current < end:
+        yield current.date(), current.hour
+        current += timedelta(hours=1)
+
+
+def _by_key(user_id, ranges):
+    result = {}
+    for start, end in ranges:
+        for day, hour in hours(start, end):
+            result.setdefault((KEY.format(user_id, day), day), []).append(hour)
+    return result
+
+
+def _expire_at(day):
+    return dt.combine(day + timedelta(days=1 + KEEP_DAYS), time(), tzinfo=dt_timezone.utc)
+
+
+def change(user_id, removed=(), added=()):
+    """
+    Уменьшить счетчики часов интервалов removed и увеличить счетчики added.
+    """
+    # Счетчики и CHANGES_KEY меняются атомарно: пересборка не пропустит изменение
+    pipe = _redis().pipeline()
+    for ranges, delta in ((removed, -1), (added, 1)):
+        for (key, day), key_hours in _by_key(user_id, ranges).items():
+            operation = pipe.bitfield(key, default_overflow='SAT')
+            for hour in key_hours:
+                operation.incrby('u4', f'#{hour}', delta)
+            operation.execute()
+            pipe.expireat(key, _expire_at(day))
+    pipe.incr(CHANGES_KEY)
+    pipe.execute()
+
+
+def change_on_commit(user_id, removed=(), added=()):
+    """
+    Обновить счетчики после фиксации транзакции. Ошибка Redis не ломает запрос:
+    расхождение исправит периодическая пересборка.
+    """
+    def apply():
+        try:
+            change(user_id, removed, added)
+        except RedisError:
+            logger.exception('Не удалось обновить занятость специалиста %s', user_id)
+
+    transaction.on_commit(apply)
+
+
+def full_hours(start, end):
+    """
+    Часы, целиком покрытые интервалом [start, end): пары (день, час).
+    """
+    first = start.replace(minute=0, second=0, microsecond=0)
+    if first < start:
+        first += timedelta(hours=1)
+    return hours(first, end.replace(minute=0, second=0, microsecond=0))
+
+
+def is_busy(user_id, start, end):
+    """
+    Занят ли специалист в [start, end) по счетчикам. Консультация, задевшая
+    час, целиком покрытый интервалом, пересекается с ним.
+
+    :return: True, если пересечение точно есть; False, если его нет или счетчикам нельзя доверять
+    """
+    by_key = {}
+    for day, hour in full_hours(start, end):
+        by_key.setdefault(KEY.format(user_id, day), []).append(hour)
+    if not by_key:
+        return False
+
+    try:
+        connection = _redis()
+        pipe = connection.pipeline(transaction=False)
+        pipe.exists(READY_KEY)
+        for key, key_hours in by_key.items():
+            operation = pipe.bitfield(key)
+            for hour in key_hours:
+                operation.get('u4', f'#{hour}')
+            operation.execute()
+        ready, *values = pipe.execute()
+    except RedisError:
+        logger.exception('Не удалось прочитать занятость специалиста %s', user_id)
+        return False
+
+    return bool(ready) and any(counter for counters in values for counter in counters)
+
+
+def _snapshot():
+    """
+    Счетчики будущих консультаций по БД.
+
+    :return: счетчики по парам (ключ, день) и количество учтенных консультаций
+    """
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    counters = {}
+    count = 0
+    consultations = Consultation.objects.filter(archive=False, starts_at__gt=today - Consultation.MAX_DURATION) \
+        .values_list('user_id', 'datetime').iterator(chunk_size=2000)
+    for user_id, value in consultations:
+        count += 1
+        for (key, day), key_hours in _by_key(user_id, [(value.lower, value.upper)]).items():
+            day_counters = counters.setdefault((key, day), [0] * 24)
+            for hour in key_hours:
+                day_counters[hour] += 1
+    return counters, count
+
+
+def _replace(connection, counters):
+    """
+    Записать счетчики под временными ключами, переименовать их на место
+    и удалить счетчики дней, которых нет в новом снимке.
+    """
+    pipe = connection.pipeline(transaction=False)
+    for (key, day), day_counters in counters.items():
+        temporary = REBUILD_PREFIX + key
+        pipe.delete(temporary)
+        operation = pipe.bitfield(temporary, default_overflow='SAT')
+        for hour, counter in enumerate(day_counters):
+            if counter:
+                operation.set('u4', f'#{hour}', min(counter, 15))
+        operation.execute()
+        pipe.expireat(temporary, _expire_at(day))
+    pipe.execute()
+
+    keys = {key for key, _ in counters}
+    stale = [key for key in connection.scan_iter(match='occupancy:*:*', count=1000) if key.decode() not in keys]
+    pipe = connection.pipeline(transaction=False)
+    for key in keys:
+        pipe.rename(REBUILD_PREFIX + key, key)
+    if stale:
+        pipe.delete(*stale)
+    pipe.execute()
+
+
+def rebuild():
+    """
+    Пересобрать счетчики будущих консультаций из БД.
+
+    На время пересборки READY_KEY снимается, и проверки идут по БД. Изменение,
+    примененное между чтением БД и переименованием ключей, затирается новыми
+    счетчиками, поэтому READY_KEY ставится, только если CHANGES_KEY за
+    пересборку не изменился; иначе она повторяется до REBUILD_ATTEMPTS раз.
+
+    :return: количество учтенных консультаций
+    """
+    connection = _redis()
+    connection.delete(READY_KEY)
+
+    for _ in range(REBUILD_ATTEMPTS):
+        version = connection.get(CHANGES_KEY)
+        counters, count = _snapshot()
+        _replace(connection, counters)
+        if connection.get(CHANGES_KEY) == version:
+            connection.set(READY_KEY, 1)
+            return count
+
+    logger.warning('Счетчики занятости менялись во время каждой из %s пересборок, проверки идут по БД',
+                   REBUILD_ATTEMPTS)
+    return count
@@ -0,0 +1,38 @@
+"""
+Проверка пересечений пачки интервалов с консультациями специалиста.
+
+Слоты - словари с началом start и концом end (aware, UTC).
+"""
+from django.db import connection
+
+from .models import Consultation
+
+_OVERLAPS_SQL = """
+SELECT DISTINCT slot.number - 1
+FROM unnest(%s::timestamptz[], %s::timestamptz[]) WITH ORDINALITY AS slot(start, finish, number)
+JOIN consultations_consultation AS consultation
+    ON consultation.datetime && tstzrange(slot.start, slot.finish)
+WHERE consultation.user_id = %s
+    AND NOT consultation.archive
+    AND consultation.starts_at > %s
+    AND consultation.starts_at < %s {recurrence_filter}
+"""
+
+
+def existing_overlaps(user, slots, exclude_recurrence_id=None):
+    """
+    Номера слотов, пересекающихся с неархивными консультациями специалиста, одним запросом.
+
+    :param exclude_recurrence_id: не учитывать консультации, материализованные из этого шаблона
+    """
+    starts = [slot['start'] for slot in slots]
+    ends = [slot['end'] for slot in slots]
+    params = [starts, ends, user.id, min(starts) - Consultation.MAX_DURATION, max(ends)]
+    recurrence_filter = ''
+    if exclude_recurrence_id is not None:
+        recurrence_filter = 'AND consultation.recurrence_id IS DISTINCT FROM %s'
+        params.append(exclude_recurrence_id)
+
+    with connection.cursor() as cursor:
+        cursor.execute(_OVERLAPS_SQL.format(recurrence_filter=recurrence_filter), params)
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,73 @@
+"""
+Помесячное секционирование таблиц консультаций и броней.
+
+consultations_consultation секционирована по диапазону starts_at (начало
+консультации), consultations_booked - по consultation_starts_at, копии того же
+значения, поэтому бронь лежит в секции того же месяца, что и ее консультация.
+Границы секций считаются в UTC. Строки вне созданных секций попадают в секцию
+по умолчанию, поэтому секции на будущие месяцы нужно создавать заранее
+(команда create_partitions и периодическая задача). Если строки месяца уже
+попали в секцию по умолчанию, при создании секции они переносятся в нее.
+"""
+from datetime import datetime as dt, timezone as dt_timezone
+
+from django.db import connection as default_connection, transaction
+
+PARTITIONED_TABLES = {
+    'consultations_consultation': 'starts_at',
+    'consultations_booked': 'consultation_starts_at',
+}
+
+
+def month_start(value):
+    return dt(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def months(start, end):
+    """
+    Начала месяцев от месяца start до месяца end включительно.
+    """
+    current, end = month_start(start), month_start(end)
+    while current <= end:
+        yield current
+        current = add_months(current, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def create_partitions(start, end, connection=None):
+    """
+    Создает недостающие месячные секции обеих таблиц с месяца start по месяц end
+    и секции по умолчанию. Возвращает имена созданных секций.
+    """
+    connection = connection or default_connection
+    created = []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for table, key in PARTITIONED_TABLES.items():
+            for month in months(start, end):
+                name = partition_name(table, month)
+                cursor.execute('SELECT to_regclass(%s)', [name])
+                if cursor.fetchone()[0] is not None:
+                    continue
+
+                bounds = [month, add_months(month, 1)]
+                cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+                cursor.execute('SELECT to_regclass(%s)', [f'{table}_default'])
+                if cursor.fetchone()[0] is not None:
+                    cursor.execute(
+                        f'WITH moved AS (DELETE FROM {table}_default WHERE {key} >= %s AND {key} < %s RETURNING *) '
+                        f'INSERT INTO {name} SELECT * FROM moved',
+                        bounds,
+                    )
+                cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', bounds)
+                created.append(name)
+
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT')
+    return created
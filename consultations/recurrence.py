@@ -0,0 +1,189 @@
+"""
+Ленивое развертывание повторяющихся консультаций.
+
+Вхождения ConsultationRecurrence вычисляются только для запрошенного окна
+времени. Вхождение, уже материализованное в Consultation, из развертки
+исключается, поэтому каждое время занято либо строкой, либо виртуальным
+вхождением. Проверки пересечений учитывают и то, и другое.
+"""
+from bisect import bisect_left
+from datetime import datetime as dt, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Q
+from django.utils import timezone
+
+from events import outbox
+from . import overlaps
+from .models import Consultation, ConsultationRecurrence
+from .tasks import schedule_consultations
+
+# Часов в неделе: шаблоны сравниваются по интервалам внутри недели
+WEEK_HOURS = 7 * 24
+
+
+class OccurrenceError(Exception):
+    pass
+
+
+def duration(recurrence):
+    return timedelta(hours=int(recurrence.time_selection))
+
+
+def occurrences(recurrence, start, end):
+    """
+    Начала вхождений шаблона в окне [start, end) по возрастанию.
+    """
+    first = max(start.date(), recurrence.starts_on)
+    last = end.date() if recurrence.ends_on is None else min(end.date(), recurrence.ends_on)
+    weekdays, hours = set(recurrence.weekdays), sorted(recurrence.hours)
+
+    day = first
+    while day <= last:
+        if day.weekday() in weekdays:
+            for hour in hours:
+                value = dt.combine(day, time(hour), tzinfo=dt_timezone.utc)
+                if start <= value < end:
+                    yield value
+        day += timedelta(days=1)
+
+
+def active_recurrences(start, end, **filters):
+    """
+    Активные шаблоны, действующие в окне [start, end).
+    """
+    return ConsultationRecurrence.objects.filter(
+        Q(ends_on__isnull=True) | Q(ends_on__gte=start.date()),
+        is_active=True,
+        starts_on__lte=end.date(),
+        **filters,
+    )
+
+
+def virtual_occurrences(recurrences, start, end):
+    """
+    Нематериализованные вхождения шаблонов в окне [start, end): пары (шаблон, начало), отсортированные по началу.
+    """
+    recurrences = list(recurrences)
+    materialized = set(
+        Consultation.objects
+        .filter(recurrence__in=recurrences, starts_at__gte=start, starts_at__lt=end)
+        .values_list('recurrence_id', 'starts_at')
+    )
+
+    result = [
+        (recurrence, value)
+        for recurrence in recurrences
+        for value in occurrences(recurrence, start, end)
+        if (recurrence.id, value) not in materialized
+    ]
+    result.sort(key=lambda item: item[1])
+    return result
+
+
+def overlapping_occurrences(user, start, end):
+    """
+    Виртуальные вхождения шаблонов специалиста, пересекающиеся с интервалом [start, end).
+    """
+    recurrences = active_recurrences(start - Consultation.MAX_DURATION, end, user=user)
+    return [
+        (recurrence, value)
+        for recurrence, value in virtual_occurrences(recurrences, start - Consultation.MAX_DURATION, end)
+        if value + duration(recurrence) > start
+    ]
+
+
+def overlapping_slots(user, slots):
+    """
+    Номера слотов, пересекающихся с виртуальными вхождениями шаблонов специалиста.
+    Шаблоны разворачиваются один раз на окно всей пачки.
+    """
+    virtual = overlapping_occurrences(user, min(slot['start'] for slot in slots), max(slot['end'] for slot in slots))
+    intervals = sorted((value, value + duration(recurrence)) for recurrence, value in virtual)
+    starts = [start for start, _ in intervals]
+
+    result = []
+    for number, slot in enumerate(slots):
+        # Кандидаты начинаются не раньше чем за MAX_DURATION до слота и до его конца
+        first = bisect_left(starts, slot['start'] - Consultation.MAX_DURATION)
+        last = bisect_left(starts, slot['end'])
+        if any(end > slot['start'] for _, end in intervals[first:last]):
+            result.append(number)
+    return result
+
+
+def _weekly_intervals(recurrence):
+    length = int(recurrence.time_selection)
+    return [(weekday * 24 + hour, weekday * 24 + hour + length)
+            for weekday in recurrence.weekdays for hour in recurrence.hours]
+
+
+def patterns_overlap(first, second):
+    """
+    Пересекаются ли недельные расписания двух шаблонов с пересекающимися периодами действия.
+    """
+    if first.ends_on and first.ends_on < second.starts_on or second.ends_on and second.ends_on < first.starts_on:
+        return False
+
+    for start, end in _weekly_intervals(first):
+        for other_start, other_end in _weekly_intervals(second):
+            # Интервалы в конце недели продолжаются в начале следующей
+            for shift in (-WEEK_HOURS, 0, WEEK_HOURS):
+                if start < other_end + shift and other_start + shift < end:
+                    return True
+    return False
+
+
+def validate_recurrence(recurrence):
+    """
+    Проверить, что шаблон не пересекается с другими шаблонами специалиста и с
+    его консультациями в пределах CONSULTATION_RECURRENCE_HORIZON.
+
+    :return: словарь ошибок
+    """
+    others = ConsultationRecurrence.objects.filter(user=recurrence.user, is_active=True)
+    if recurrence.pk:
+        others = others.exclude(pk=recurrence.pk)
+    for other in others:
+        if patterns_overlap(recurrence, other):
+            return {'weekdays': [f'Расписание пересекается с шаблоном {other.id}.']}
+
+    now = timezone.now()
+    start = max(now, dt.combine(recurrence.starts_on, time(), tzinfo=dt_timezone.utc))
+    slots = [{'start': value, 'end': value + duration(recurrence)}
+             for value in occurrences(recurrence, start, now + settings.CONSULTATION_RECURRENCE_HORIZON)]
+    # Консультации, уже материализованные из этого шаблона, с ним не конфликтуют
+    if slots and overlaps.existing_overlaps(recurrence.user, slots, exclude_recurrence_id=recurrence.pk):
+        return {'weekdays': ['Расписание пересекается с существующей записью.']}
+    return {}
+
+
+@transaction.atomic
+def materialize(recurrence_id, start):
+    """
+    Создать консультацию для вхождения шаблона или вернуть уже созданную.
+    События консультации планируются через outbox после фиксации транзакции.
+
+    :raises OccurrenceError: если в это время нет вхождения или оно отменено
+    """
+    # Блокировка шаблона не дает двум бронированиям создать одно вхождение дважды
+    recurrence = ConsultationRecurrence.objects.select_for_update().filter(pk=recurrence_id, is_active=True).first()
+    if recurrence is None:
+        raise OccurrenceError('Шаблон не найден.')
+    if start < timezone.now() or start not in occurrences(recurrence, start, start + timedelta(seconds=1)):
+        raise OccurrenceError('В это время нет вхождения шаблона.')
+
+    consultation = Consultation.objects.filter(recurrence=recurrence, starts_at=start).first()
+    if consultation is not None:
+        if consultation.archive:
+            raise OccurrenceError('Вхождение шаблона отменено.')
+        return consultation
+
+    consultation = Consultation(user=recurrence.user, recurrence=recurrence, time_selection=recurrence.time_selection,
+                                datetime=DateTimeTZRange(start, start + duration(recurrence)),
+                                price=recurrence.price, description=recurrence.description)
+    consultation.save()
+    outbox.enqueue(schedule_consultations, [consultation.id])
+    return consultation
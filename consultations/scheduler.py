@@ -0,0 +1,155 @@
+"""
+Планировщик отложенных событий жизненного цикла консультаций.
+
+Время срабатывания хранится в сортированном множестве Redis (ZSET):
+элемент — пара (тип события, id консультации), score — unix-время срабатывания.
+Перепланирование и отмена выполняются за O(log n), а периодическая задача
+забирает наступившие события пачками и передает их в Celery.
+
+Забранные события не удаляются, а переносятся в множество INFLIGHT_KEY со
+score - сроком аренды. После успешной публикации в брокер они подтверждаются
+(ack), при ошибке возвращаются в расписание (release). События, не
+подтвержденные до конца аренды (опросчик упал), возвращаются при следующем опросе.
+"""
+import time
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+SCHEDULE_KEY = 'consultations:schedule'
+INFLIGHT_KEY = 'consultations:schedule:inflight'
+
+EVENT_ARCHIVE = 'archive'
+EVENT_EXPIRE = 'expire'
+EVENTS = (EVENT_ARCHIVE, EVENT_EXPIRE)
+
+# Атомарно переносит наступившие события в обработку, чтобы два опросчика не получили одно и то же.
+# Событие с истекшей арендой возвращается в расписание, если его там не запланировали заново.
+_POP_DUE_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, item in ipairs(stale) do
+    redis.call('ZADD', KEYS[1], 'NX', ARGV[1], item)
+end
+if #stale > 0 then
+    redis.call('ZREM', KEYS[2], unpack(stale))
+end
+
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, item in ipairs(items) do
+    redis.call('ZADD', KEYS[2], ARGV[3], item)
+end
+if #items > 0 then
+    redis.call('ZREM', KEYS[1], unpack(items))
+end
+return items
+"""
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _member(event, consultation_id):
+    return f'{event}:{consultation_id}'
+
+
+def _timestamp(value):
+    # Наивное время из сериализатора сохраняется в БД как UTC
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.timestamp()
+
+
+def schedule(event, consultation_id, when):
+    """
+    Запланировать событие на время when. Повторный вызов переносит уже запланированное событие.
+    """
+    _redis().zadd(SCHEDULE_KEY, {_member(event, consultation_id): _timestamp(when)})
+
+
+def cancel(event, consultation_id):
+    """
+    Отменить запланированное событие.
+    """
+    member = _member(event, consultation_id)
+    pipe = _redis().pipeline()
+    pipe.zrem(SCHEDULE_KEY, member)
+    pipe.zrem(INFLIGHT_KEY, member)
+    pipe.execute()
+
+
+def schedule_consultation(consultation):
+    """
+    Запланировать все события консультации по ее времени начала.
+    """
+    schedule_consultations([consultation])
+
+
+def schedule_consultations(consultations):
+    """
+    Запланировать события пачки консультаций одной командой.
+    """
+    mapping = {}
+    for consultation in consultations:
+        start = consultation.datetime.lower
+        mapping[_member(EVENT_ARCHIVE, consultation.id)] = _timestamp(start)
+        mapping[_member(EVENT_EXPIRE, consultation.id)] = _timestamp(start - settings.CONSULTATION_BOOKING_EXPIRE)
+    if mapping:
+        _redis().zadd(SCHEDULE_KEY, mapping)
+
+
+def cancel_consultation(consultation_id):
+    """
+    Отменить все события консультации.
+    """
+    members = [_member(event, consultation_id) for event in EVENTS]
+    pipe = _redis().pipeline()
+    pipe.zrem(SCHEDULE_KEY, *members)
+    pipe.zrem(INFLIGHT_KEY, *members)
+    pipe.execute()
+
+
+def pop_due(limit=None, now=None):
+    """
+    Забрать до limit наступивших событий в обработку. Каждое событие нужно
+    затем подтвердить через ack или вернуть через release.
+
+    :return: список пар (тип события, id консультации)
+    """
+    limit = limit or settings.SCHEDULER_BATCH_SIZE
+    now = now or time.time()
+
+    items = _redis().eval(_POP_DUE_SCRIPT, 2, SCHEDULE_KEY, INFLIGHT_KEY, now, limit,
+                          now + settings.SCHEDULER_INFLIGHT_TIMEOUT)
+
+    result = []
+    for item in items:
+        event, consultation_id = item.decode().split(':', 1)
+        result.append((event, int(consultation_id)))
+    return result
+
+
+def ack(items):
+    """
+    Подтвердить, что события (тип, id консультации) переданы в Celery.
+    """
+    if items:
+        _redis().zrem(INFLIGHT_KEY, *[_member(event, consultation_id) for event, consultation_id in items])
+
+
+def release(items, now=None):
+    """
+    Вернуть неопубликованные события в расписание на текущее время. Событие,
+    заново запланированное за время обработки, сохраняет новое время.
+    """
+    if not items:
+        return
+    members = [_member(event, consultation_id) for event, consultation_id in items]
+    now = now or time.time()
+
+    pipe = _redis().pipeline()
+    pipe.zadd(SCHEDULE_KEY, {member: now for member in members}, nx=True)
+    pipe.zrem(INFLIGHT_KEY, *members)
+    pipe.execute()
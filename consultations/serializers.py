@@ -1,10 +1,12 @@
-from psycopg2.extras import DateTimeTZRange
-from datetime import timedelta, datetime as dt
+from datetime import timedelta, datetime as dt, timezone as dt_timezone
+
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
 
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from .models import Consultation, Booked
+from . import occupancy, recurrence
+from .models import Consultation, Booked, ConsultationHistory, BookedHistory, ConsultationRecurrence
 
 
 class BaseResponseSerializer(serializers.Serializer):
@@ -63,9 +65,20 @@ class ConsultationSerializer(serializers.ModelSerializer):
 
             calendar_item_id = self.instance.id if self.instance else None
 
+            start_utc = start_time.replace(tzinfo=dt_timezone.utc)
+            end_utc = end_time.replace(tzinfo=dt_timezone.utc)
+
+            # Занятые по счетчикам часы отклоняются без запроса к БД. При изменении счетчики
+            # учитывают и саму запись, поэтому проверка идет только по БД
+            if not calendar_item_id and occupancy.is_busy(user.id, start_utc, end_utc):
+                raise ValidationError({'datetime': 'Запись пересекается с существующей записью.'})
+
+            # Границы по starts_at ограничивают поиск секциями нужных месяцев
             overlapping_items = Consultation.objects.filter(
                 user=user,
                 datetime__overlap=datetime_range,
+                starts_at__gt=start_utc - Consultation.MAX_DURATION,
+                starts_at__lt=end_utc,
                 archive=False,
             )
             if calendar_item_id:
@@ -74,6 +87,9 @@ class ConsultationSerializer(serializers.ModelSerializer):
             if overlapping_items.exists():
                 raise ValidationError({'datetime': 'Запись пересекается с существующей записью.'})
 
+            if recurrence.overlapping_occurrences(user, start_utc, end_utc):
+                raise ValidationError({'datetime': 'Запись пересекается с повторяющейся консультацией.'})
+
             data['datetime'] = datetime_range
 
         return data
@@ -87,7 +103,8 @@ class ConsultationSerializer(serializers.ModelSerializer):
 class BookedSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booked
-        fields = '__all__'
+        # Ключ секционирования - внутренняя копия начала консультации
+        exclude = ['consultation_starts_at']
         read_only_fields = ["user", "archive", 'status']
 
     def validate(self, data):
@@ -115,3 +132,84 @@ class BookedSerializer(serializers.ModelSerializer):
     def validate_rejection_text(self, rejection_text):
         if not rejection_text:
             raise ValidationError({'rejection_text': 'Причина отказа обязательна для заполнения.'})
+
+
+class ConsultationHistorySerializer(ConsultationSerializer):
+    archive = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = ConsultationHistory
+        fields = ['id', 'user', 'time_selection', 'datetime', 'booking', 'price', 'description', 'archive']
+        read_only_fields = fields
+
+
+class BookedHistorySerializer(serializers.ModelSerializer):
+    archive = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = BookedHistory
+        fields = ['id', 'user', 'consultation', 'status', 'rejection_text', 'description', 'archive']
+        read_only_fields = fields
+
+
+class ConsultationRecurrenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ConsultationRecurrence
+        fields = ['id', 'user', 'weekdays', 'hours', 'time_selection', 'price', 'description',
+                  'starts_on', 'ends_on', 'is_active']
+        read_only_fields = ['id', 'user']
+
+    def validate_weekdays(self, value):
+        if not value or any(day > 6 for day in value):
+            raise ValidationError('Дни недели задаются числами от 0 (понедельник) до 6.')
+        return sorted(set(value))
+
+    def validate_hours(self, value):
+        if not value or any(hour > 23 for hour in value):
+            raise ValidationError('Часы задаются числами от 0 до 23.')
+        return sorted(set(value))
+
+    def validate_price(self, value):
+        if value < 0:
+            raise ValidationError('Цена не может быть отрицательной.')
+        return value
+
+    def validate(self, data):
+        instance = ConsultationRecurrence(**{
+            **({field: getattr(self.instance, field) for field in self.Meta.fields} if self.instance else {}),
+            **data,
+            'user': self.context['request'].user,
+        })
+
+        if instance.ends_on and instance.ends_on < instance.starts_on:
+            raise ValidationError({'ends_on': 'Дата окончания раньше даты начала.'})
+
+        # Часы одного шаблона не должны перекрывать друг друга
+        hours = sorted(instance.hours)
+        if any(later - earlier < int(instance.time_selection) for earlier, later in zip(hours, hours[1:])):
+            raise ValidationError({'hours': 'Вхождения шаблона пересекаются между собой.'})
+
+        if instance.is_active:
+            errors = recurrence.validate_recurrence(instance)
+            if errors:
+                raise ValidationError(errors)
+        return data
+
+
+class OccurrenceSerializer(serializers.Serializer):
+    """
+    Виртуальное вхождение шаблона в формате консультации.
+    """
+    recurrence = serializers.IntegerField(source='recurrence.id')
+    user = serializers.IntegerField(source='recurrence.user_id')
+    time_selection = serializers.CharField(source='recurrence.time_selection')
+    datetime = serializers.SerializerMethodField()
+    price = serializers.FloatField(source='recurrence.price')
+    description = serializers.CharField(source='recurrence.description')
+
+    def get_datetime(self, obj):
+        start = obj['start']
+        return {
+            'start': start.strftime('%Y-%m-%d %H:%M'),
+            'end': (start + recurrence.duration(obj['recurrence'])).strftime('%Y-%m-%d %H:%M'),
+        }
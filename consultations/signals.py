@@ -3,9 +3,12 @@ from django.dispatch import receiver
 
 from django.core.cache import cache
 
-from consultations.models import Booked, Consultation
+from consultations import availability, occupancy
+from consultations.models import Booked, Consultation, ConsultationRecurrence
 from consultations.tasks import task_send_email_booked_create, task_send_email_booked_cancellation, \
     task_send_email_booked_accept
+from events import bus, live, outbox
+from notifications import payloads
 
 
 @receiver(pre_save, sender=Booked)
@@ -17,14 +20,30 @@ def booked_pre_save(sender, instance, **kwargs):
 
 @receiver(post_save, sender=Booked)
 def booked_post_save(sender, instance, created, **kwargs):
-    cache.delete_pattern('BookedList_list_cache_*')
+    # Списки сбрасывает потребитель шины событий, здесь только кэш пользователя
     cache.delete(f'BookedList_detail_cache_{instance.user_id}')
     cache.delete(f'BookedAccountView_detail_cache_{instance.user_id}')
     cache.delete(f'ConsultationsAccount_detail_cache_{instance.user_id}')
 
+    previous_status = getattr(instance, '_old_values', {}).get('status')
+    bus.publish('booked.saved', id=instance.id, user_id=instance.user_id, consultation_id=instance.consultation_id,
+                specialist_id=instance.consultation.user_id, status=instance.status,
+                previous_status=previous_status, created=created)
+
+    if created or instance.status != previous_status:
+        live.publish_to_user(instance.user_id, 'booked.status', id=instance.id,
+                             consultation_id=instance.consultation_id, status=instance.status,
+                             previous_status=previous_status)
+        if created:
+            # Специалист видит новую заявку на свою консультацию без опроса
+            live.publish_to_user(instance.consultation.user_id, 'booked.created', id=instance.id,
+                                 consultation_id=instance.consultation_id, status=instance.status)
+
     if created:
         # Если объект был создан, а не обновлён
-        task_send_email_booked_create.delay(instance.consultation.id)
+        consultation = instance.consultation
+        payload = payloads.build_payload(consultation.user, **payloads.consultation_context(consultation))
+        outbox.enqueue(task_send_email_booked_create, consultation.id, payload)
     else:
         # Если объект был обновлён, проверяем, какие поля изменились
         changed_fields = {}
@@ -38,14 +57,32 @@ def booked_post_save(sender, instance, created, **kwargs):
         if changed_fields:
             if 'status' in changed_fields:
                 if changed_fields['status'][1] == 'Booked':
-                    task_send_email_booked_accept.delay(instance.id)
+                    payload = payloads.build_payload(instance.user,
+                                                     **payloads.consultation_context(instance.consultation))
+                    outbox.enqueue(task_send_email_booked_accept, instance.id, payload)
                 elif changed_fields['status'][1] == 'Cancelled':
-                    task_send_email_booked_cancellation.delay(instance.id)
+                    payload = payloads.build_payload(instance.user, rejection_text=instance.rejection_text)
+                    outbox.enqueue(task_send_email_booked_cancellation, instance.id, payload)
 
 
 @receiver(post_save, sender=Consultation)
 def consultation_post_save(sender, instance, created, **kwargs):
-    cache.delete_pattern('ConsultationList_list_cache_*')
     cache.delete(f'ConsultationList_detail_cache_{instance.user_id}')
     cache.delete(f'ConsultationsAccount_detail_cache_{instance.user_id}')
     cache.delete(f'BookedAccountView_detail_cache_{instance.user_id}')
+
+    bus.publish('consultation.saved', id=instance.id, user_id=instance.user_id, archive=instance.archive,
+                created=created)
+    # Старое время начала - на случай переноса консультации
+    availability.invalidate(instance.user_id, instance.starts_at, getattr(instance, '_loaded_starts_at', None))
+
+    old_range = getattr(instance, '_loaded_datetime', None)
+    removed = [(old_range.lower, old_range.upper)] if old_range and not instance._loaded_archive else []
+    added = [] if instance.archive else [(instance.datetime.lower, instance.datetime.upper)]
+    if removed != added:
+        occupancy.change_on_commit(instance.user_id, removed, added)
+
+
+@receiver(post_save, sender=ConsultationRecurrence)
+def recurrence_post_save(sender, instance, created, **kwargs):
+    availability.invalidate_user(instance.user_id)
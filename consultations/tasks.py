@@ -1,99 +1,217 @@
+import logging
+from datetime import date, datetime as dt, timezone as dt_timezone
+
 from celery import shared_task
-from django.core.mail import EmailMultiAlternatives
-from rest_framework.reverse import reverse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 
-from .models import User, Booked, Consultation
+from notifications import payloads
+from notifications.dispatcher import NotificationDispatcher, _redis
+from notifications.registry import registry
+from notifications.tasks import requeue_failed
+from . import history, occupancy, partitions, scheduler, utilization
+from .models import User, Booked, Consultation, ConsultationReminder
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def archive_consultation(consultation_id):
-    try:
-        consultation = Consultation.objects.get(pk=consultation_id)
-        consultation.set_archive()
+    archive_consultations([consultation_id])
 
-        booked = Booked.objects.get(consultation=consultation, archive=False, status='Booked')
-        booked.successfully()
 
+@shared_task
+@transaction.atomic
+def archive_consultations(consultation_ids):
+    for consultation in Consultation.objects.filter(pk__in=consultation_ids, archive=False):
+        consultation.set_archive()
         print(f"archive consultation {consultation.id}")
-        print(f"archive consultation {booked.id}")
-    except Consultation.DoesNotExist:
-        ...
+
+        for booked in consultation.bookeds().filter(archive=False, status='Booked'):
+            booked.successfully()
+            print(f"archive booked {booked.id}")
+
+
+@shared_task
+@transaction.atomic
+def expire_bookings(consultation_ids):
+    """
+    Отменяет заявки, которые так и не были рассмотрены до начала консультации.
+    """
+    bookeds = Booked.objects.filter(consultation__in=consultation_ids, archive=False, status='In processing')
+    for booked in bookeds:
+        booked.cancelled('Заявка не была рассмотрена до начала консультации.')
+
+
+@shared_task
+def schedule_consultations(consultation_ids):
+    """
+    Планирует события пачки консультаций после фиксации изменившей их транзакции
+    (создание и изменение через API, массовый импорт, вхождения шаблонов).
+    Консультации, отмененные до выполнения задачи, пропускаются.
+    """
+    consultations = Consultation.objects.filter(pk__in=consultation_ids, archive=False).only('id', 'datetime')
+    scheduler.schedule_consultations(consultations)
+
+
+EVENT_HANDLERS = {
+    scheduler.EVENT_ARCHIVE: archive_consultations,
+    scheduler.EVENT_EXPIRE: expire_bookings,
+}
+
+
+@shared_task
+def task_dispatch_scheduled_events():
+    """
+    Забирает наступившие события из планировщика и отправляет их в Celery пачками по типу события.
+    """
+    while True:
+        items = scheduler.pop_due()
+        if not items:
+            break
+
+        grouped = {}
+        for event, consultation_id in items:
+            grouped.setdefault(event, []).append(consultation_id)
+
+        pending = list(items)
+        try:
+            for event, consultation_ids in grouped.items():
+                EVENT_HANDLERS[event].delay(consultation_ids)
+                published = [(event, consultation_id) for consultation_id in consultation_ids]
+                scheduler.ack(published)
+                pending = [item for item in pending if item[0] != event]
+        except Exception:
+            # Брокер недоступен: неопубликованные события вернутся при следующем опросе
+            scheduler.release(pending)
+            raise
+
+        if len(items) < settings.SCHEDULER_BATCH_SIZE:
+            break
+
+
+@shared_task
+def task_send_email_booked_create(consultation, payload=None):
+    if not payloads.is_valid(payload):
+        consultation = Consultation.objects.select_related('user').get(pk=consultation)
+        payload = payloads.build_payload(consultation.user, **payloads.consultation_context(consultation))
+
+    payloads.send('booked_create', payload)
+
+
+@shared_task
+def task_send_email_booked_accept(booked, payload=None):
+    if not payloads.is_valid(payload):
+        booked = Booked.objects.select_related('user', 'consultation').get(pk=booked)
+        payload = payloads.build_payload(booked.user, **payloads.consultation_context(booked.consultation))
+
+    payloads.send('booked_accept', payload)
+
+
+@shared_task
+def task_send_email_booked_cancellation(booked, payload=None):
+    if not payloads.is_valid(payload):
+        booked = Booked.objects.select_related('user').get(pk=booked)
+        payload = payloads.build_payload(booked.user, rejection_text=booked.rejection_text)
+
+    payloads.send('booked_cancellation', payload)
+
+
+def reminder_window(now):
+    """
+    Окно поиска консультаций для напоминаний: от текущего момента до конца
+    временной корзины, в которую попадает now + CONSULTATION_REMINDER_LEAD.
+    """
+    bucket = settings.CONSULTATION_REMINDER_BUCKET.total_seconds()
+    lead_end = (now + settings.CONSULTATION_REMINDER_LEAD).timestamp()
+    window_end = (lead_end // bucket + 1) * bucket
+    return now, dt.fromtimestamp(window_end, tz=dt_timezone.utc)
+
+
+@shared_task
+def task_send_reminders():
+    """
+    Отправляет напоминания специалисту и клиенту по подтвержденным броням,
+    консультации которых начнутся в ближайшие CONSULTATION_REMINDER_LEAD.
+
+    Брони выбираются одним запросом по ключу секционирования consultation_starts_at,
+    поэтому читаются только секции месяцев окна. Уже отправленные напоминания
+    отсекаются по ConsultationReminder. Отметки фиксируются до отправки, а письма,
+    которые не удалось отправить, ставятся в очередь уведомлений на повтор, поэтому
+    ошибка SMTP посреди пачки не приводит к повторной отправке уже ушедших писем.
+    """
+    window_start, window_end = reminder_window(timezone.now())
+
+    with transaction.atomic():
+        bookeds = list(
+            Booked.objects
+            .filter(status='Booked',
+                    archive=False,
+                    consultation_starts_at__gte=window_start,
+                    consultation_starts_at__lt=window_end)
+            .exclude(Exists(ConsultationReminder.objects.filter(booked=OuterRef('pk'))))
+            .select_related('user', 'consultation__user')
+            .select_for_update(of=('self',), skip_locked=True)
+        )
+        if not bookeds:
+            return 0
+
+        ConsultationReminder.objects.bulk_create([ConsultationReminder(booked=booked) for booked in bookeds])
+
+    recipients = []
+    for booked in bookeds:
+        context = payloads.consultation_context(booked.consultation)
+        for user in (booked.user, booked.consultation.user):
+            recipients.append((user.email, {'username': user.username, **context}))
+    messages = registry.build_messages('consultation_reminder', recipients)
+
+    # Одно SMTP-соединение на всю пачку
+    try:
+        with NotificationDispatcher(raise_errors=False) as dispatcher:
+            for message in messages:
+                dispatcher.add(message)
+            dispatcher.flush()
+            failed = dispatcher.pop_failed()
+    except Exception as exc:
+        # Соединение не открылось: ни одно письмо не ушло
+        logger.exception('Не удалось отправить напоминания')
+        failed = [(message, exc) for message in messages]
+    requeue_failed(_redis(), failed)
+
+    return len(bookeds)
+
+
+@shared_task
+def task_create_partitions():
+    """
+    Создает секции консультаций и броней на CONSULTATION_PARTITIONS_AHEAD месяцев вперед.
+    """
+    now = timezone.now()
+    end = partitions.add_months(partitions.month_start(now), settings.CONSULTATION_PARTITIONS_AHEAD)
+    return partitions.create_partitions(now, end)
 
 
 @shared_task
-def task_send_email_booked_create(consultation):
-    consultation = Consultation.objects.get(pk=consultation)
-
-    datetime_start = consultation.datetime.lower.strftime('%Y-%m-%d %H:%M')
-    datetime_end = consultation.datetime.upper.strftime('%Y-%m-%d %H:%M')
-
-    subject = 'Новая заявка на вашу консультацию!!'
-    text = (
-        f'Здравствуйте, {consultation.user.username}.\n\n'
-        'С радостью сообщаем вам о новой заявке на вашу консультацию, '
-        f'которая пройдет в период с {datetime_start} по {datetime_end}.\n\n'
-        'С уважением, команда проекта.'
-    )
-    html = (
-        f'Здравствуйте, <b>{consultation.user.username}</b>.<br/><br/>'
-        'С радостью сообщаем вам о новой заявке на вашу консультацию, '
-        f'которая пройдет в период с {datetime_start} по {datetime_end}.<br/><br/>'
-        'С уважением, команда проекта.'
-    )
-    msg = EmailMultiAlternatives(
-        subject=subject, body=text, from_email=None, to=[consultation.user.email]
-    )
-    msg.attach_alternative(html, "text/html")
-    msg.send()
+def task_move_to_history():
+    """
+    Переносит архивные консультации старше CONSULTATION_HISTORY_AFTER в таблицы истории.
+    """
+    return history.move_to_history()
 
 
 @shared_task
-def task_send_email_booked_accept(booked):
-    booked = Booked.objects.get(pk=booked)
-
-    datetime_start = booked.consultation.datetime.lower.strftime('%Y-%m-%d %H:%M')
-    datetime_end = booked.consultation.datetime.upper.strftime('%Y-%m-%d %H:%M')
-
-    subject = 'Бронь подтвердили!!'
-    text = (
-        f'Здравствуйте, {booked.user.username}.\n\n'
-        'С радостью сообщаем вам, что ваша бронь успешно подтверждена.\n\n'
-        f'Консультация пройдет в период с {datetime_start} по {datetime_end}.\n\n'
-        'С уважением, команда проекта.'
-    )
-    html = (
-        f'Здравствуйте, <b>{booked.user.username}</b>.<br/><br/>'
-        'С радостью сообщаем вам, что ваша бронь успешно подтверждена.<br/><br/>'
-        f'Консультация пройдет в период с {datetime_start} по {datetime_end}.<br/><br/>'
-        'С уважением, команда проекта.'
-    )
-    msg = EmailMultiAlternatives(
-        subject=subject, body=text, from_email=None, to=[booked.user.email]
-    )
-    msg.attach_alternative(html, "text/html")
-    msg.send()
+def task_rebuild_occupancy():
+    """
+    Пересобирает счетчики занятости из БД: исправляет вытесненные и отставшие ключи.
+    """
+    return occupancy.rebuild()
 
 
 @shared_task
-def task_send_email_booked_cancellation(booked):
-    booked = Booked.objects.get(pk=booked)
-
-    subject = 'Бронь отклонена.'
-    text = (
-        f'Здравствуйте, {booked.user.username}.\n\n'
-        'С сожалением вынуждены сообщить, что ваша бронь отклонена.\n\n'
-        f'Причина отмены: {booked.rejection_text}.\n\n'
-        'С уважением, команда проекта.'
-    )
-    html = (
-        f'Здравствуйте, <b>{booked.user.username}</b>.<br/><br/>'
-        'С сожалением вынуждены сообщить, что ваша бронь отклонена.<br/><br/>' 
-        f'Причина отмены: {booked.rejection_text}.<br/><br/>'
-        'С уважением, команда проекта.'
-    )
-    msg = EmailMultiAlternatives(
-        subject=subject, body=text, from_email=None, to=[booked.user.email]
-    )
-    msg.attach_alternative(html, "text/html")
-    msg.send()
\ No newline at end of file
+def task_build_utilization(start_day, end_day):
+    """
+    Считает и кэширует отчет о загрузке за период, слишком большой для запроса.
+    """
+    utilization.build_cached(date.fromisoformat(start_day), date.fromisoformat(end_day))
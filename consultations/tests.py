@@ -1,5 +1,30 @@
+import json
+from datetime import date, datetime as dt, timedelta, timezone as dt_timezone
+from unittest.mock import call, patch
+
+from django.conf import settings
+from django.core import mail
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+from django_redis import get_redis_connection
+
+from accounts.models import User
 from accounts.tests import BaseUserTestCase
-from consultations.models import Consultation, Booked
+from consultation_planning_service.celery import app
+from consultations import availability, bulk, calendars, history, importer, occupancy, partitions, recurrence, \
+    scheduler, utilization
+from consultations.models import Consultation, Booked, BookedHistory, ConsultationHistory, ConsultationRecurrence, \
+    ConsultationReminder
+from consultations.serializers import BookedSerializer, ConsultationHistorySerializer
+from consultations.tasks import archive_consultations, expire_bookings, schedule_consultations, \
+    task_dispatch_scheduled_events, task_send_email_booked_cancellation, task_send_reminders
+from consultations.views import ConsultationList
+from events.models import OutboxEvent
+from notifications import payloads
+from specialist.models import Specialist
 
 
 class ConsultationTestCase(BaseUserTestCase):
@@ -19,6 +44,22 @@ class ConsultationTestCase(BaseUserTestCase):
             response = self.client.get('/consultation/', HTTP_AUTHORIZATION=self.get_jwt(test_user))
             self.assertResponse(response, 200, 'success')
 
+    def test_consultation_list_shared_cache(self):
+        jwt_specialist = self.get_jwt(self.specialist)
+        self.client.post('/consultation/', data=self.data_consultation, HTTP_AUTHORIZATION=jwt_specialist)
+        cache.delete_pattern('ConsultationList_list_cache_*')
+
+        response = self.client.get('/consultation/', {'price_min': 100}, HTTP_AUTHORIZATION=jwt_specialist)
+        self.assertResponse(response, 200, 'success')
+        self.assertEqual(response.data['data']['count'], 1)
+
+        # Асинхронное представление пишет в кэш в формате django_redis
+        cache_key = ConsultationList()._get_cache_key('ConsultationList_list_cache', response.wsgi_request)
+        self.assertEqual(cache.get(cache_key), response.data['data'])
+
+        response = self.client.get('/consultation/', {'price_min': 'abc'}, HTTP_AUTHORIZATION=jwt_specialist)
+        self.assertResponse(response, 400, 'error')
+
     def test_consultation_create(self):
         specialist2 = self.register_specialist(email='testspecialist2@gmail.com', username='test_specialist2')
         for test_specialist in [self.specialist, specialist2]:
@@ -166,6 +207,45 @@ class ConsultationTestCase(BaseUserTestCase):
         consultation = Consultation.objects.get(id=id_consultation)
         self.assertEqual(consultation.archive, True)
 
+    def run_scheduling(self):
+        """
+        Выполнить задачи планирования, записанные в outbox, как это сделал бы ретранслятор.
+        """
+        events = OutboxEvent.objects.filter(task=schedule_consultations.name)
+        for event in events:
+            schedule_consultations(*event.args, **event.kwargs)
+        events.delete()
+
+    def test_consultation_schedule(self):
+        jwt_specialist = self.get_jwt(self.specialist)
+        redis = get_redis_connection('default')
+
+        response = self.client.post('/consultation/',
+                                    data=self.data_consultation,
+                                    HTTP_AUTHORIZATION=jwt_specialist)
+        self.assertResponse(response, 201, 'success')
+        id_consultation = response.data['data']['id']
+
+        # До фиксации транзакции в Redis ничего не пишется
+        archive_member = f'{scheduler.EVENT_ARCHIVE}:{id_consultation}'
+        self.assertIsNone(redis.zscore(scheduler.SCHEDULE_KEY, archive_member))
+        self.run_scheduling()
+        score = redis.zscore(scheduler.SCHEDULE_KEY, archive_member)
+        self.assertIsNotNone(score)
+
+        response = self.client.patch(f'/consultation/{id_consultation}/',
+                                     data={'datetime': '2025-10-08 18:00'},
+                                     content_type='application/json',
+                                     HTTP_AUTHORIZATION=jwt_specialist)
+        self.assertResponse(response, 200, 'success')
+        self.run_scheduling()
+        self.assertEqual(redis.zscore(scheduler.SCHEDULE_KEY, archive_member) - score, 2 * 60 * 60)
+
+        self.client.post('/consultation/cancellation/',
+                         data={'id': id_consultation, 'rejection_text': 'test rejection text'},
+                         HTTP_AUTHORIZATION=jwt_specialist)
+        self.assertIsNone(redis.zscore(scheduler.SCHEDULE_KEY, archive_member))
+
     def test_consultation_invalid_cancellation(self):
         jwt_specialist = self.get_jwt(self.specialist)
         specialist_2 = self.register_specialist(email='testspecialist2@gmail.com', username='test_specialist2')
@@ -264,6 +344,14 @@ class BookedTestCase(BaseUserTestCase):
             response = self.client.get('/booked/', HTTP_AUTHORIZATION=self.get_jwt(user))
             self.assertResponse(response, 200, 'success')
 
+    def test_booked_export_only_own(self):
+        id_booked_2 = self.create_booked(jwt_user=self.jwt_user_2)
+        for jwt, expected in ((self.jwt_user, {self.id_booked}), (self.jwt_specialist, {self.id_booked, id_booked_2})):
+            response = self.client.get('/booked/export/', HTTP_AUTHORIZATION=jwt)
+            self.assertEqual(response.status_code, 200)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+            self.assertEqual({json.loads(line)['id'] for line in lines}, expected)
+
     def test_booked_create(self):
         id_booked = self.create_booked(jwt_user=self.jwt_user_2)
         booked = Booked.objects.get(id=id_booked)
@@ -398,6 +486,59 @@ class BookedTestCase(BaseUserTestCase):
                                  data={'id': id_booked_2,
                                        'rejection_text': 'test rejection text'})
 
+    def test_booked_reminders(self):
+        start = (dt.now() + timedelta(hours=2)).strftime('%Y-%m-%d %H:%M')
+        self.id_consultation = self.create_consultation({'datetime': start, 'time_selection': "1"})
+        id_booked = self.create_booked(jwt_user=self.jwt_user)
+        self.accept_booked(jwt_user=self.jwt_specialist, data={'id': id_booked})
+
+        mail.outbox = []
+        self.assertEqual(task_send_reminders(), 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         sorted([self.user.email, self.specialist.email]))
+
+        mail.outbox = []
+        self.assertEqual(task_send_reminders(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_booked_reminders_partial_failure(self):
+        start = (dt.now() + timedelta(hours=2)).strftime('%Y-%m-%d %H:%M')
+        self.id_consultation = self.create_consultation({'datetime': start, 'time_selection': "1"})
+        id_booked = self.create_booked(jwt_user=self.jwt_user)
+        self.accept_booked(jwt_user=self.jwt_specialist, data={'id': id_booked})
+
+        send_messages = LocmemEmailBackend.send_messages
+        calls = []
+
+        def fail_first(backend, messages):
+            calls.append(messages)
+            if len(calls) == 1:
+                raise ConnectionError('SMTP disconnected')
+            return send_messages(backend, messages)
+
+        mail.outbox = []
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', fail_first), \
+                patch('consultations.tasks.requeue_failed') as requeue_failed:
+            self.assertEqual(task_send_reminders(), 1)
+
+        # Ушедшее письмо отмечено, неотправленное ставится на повтор, а не вся пачка
+        self.assertEqual(len(mail.outbox), 1)
+        failed = requeue_failed.call_args.args[1]
+        self.assertEqual([message.to for message, _ in failed], [calls[0][0].to])
+        self.assertEqual(task_send_reminders(), 0)
+
+    def test_booked_notification_payload(self):
+        payload = payloads.build_payload(self.user, rejection_text='test rejection text')
+        with self.assertNumQueries(0):
+            task_send_email_booked_cancellation(self.id_booked, payload)
+
+        # Без payload задача загружает бронь и пользователя одним запросом
+        with self.assertNumQueries(1):
+            task_send_email_booked_cancellation(self.id_booked)
+
+        with self.assertNumQueries(1):
+            task_send_email_booked_cancellation(self.id_booked, {**payload, 'v': 0})
+
     def atest_booked_invalid_cancellation(self):
         id_booked_2 = self.create_booked(jwt_user=self.jwt_user_2)
 
@@ -422,3 +563,415 @@ class BookedTestCase(BaseUserTestCase):
                                  data={},
                                  status_code=404,
                                  status_message='error')
+
+
+class DispatchScheduledEventsTestCase(SimpleTestCase):
+    @patch('consultations.tasks.scheduler')
+    def test_release_on_publish_error(self, scheduler_mock):
+        scheduler_mock.pop_due.return_value = [('archive', 1), ('expire', 2), ('archive', 3)]
+        with patch.object(archive_consultations, 'delay') as archive, \
+                patch.object(expire_bookings, 'delay', side_effect=ConnectionError) as expire:
+            with self.assertRaises(ConnectionError):
+                task_dispatch_scheduled_events()
+
+        archive.assert_called_once_with([1, 3])
+        expire.assert_called_once_with([2])
+        scheduler_mock.ack.assert_called_once_with([('archive', 1), ('archive', 3)])
+        scheduler_mock.release.assert_called_once_with([('expire', 2)])
+
+    def test_inflight_lease(self):
+        redis = get_redis_connection('default')
+        redis.delete(scheduler.SCHEDULE_KEY, scheduler.INFLIGHT_KEY)
+        scheduler.schedule('archive', 1, dt(2026, 1, 5, tzinfo=dt_timezone.utc))
+        now = dt(2026, 1, 6, tzinfo=dt_timezone.utc).timestamp()
+
+        self.assertEqual(scheduler.pop_due(now=now), [('archive', 1)])
+        self.assertIsNone(redis.zscore(scheduler.SCHEDULE_KEY, 'archive:1'))
+        self.assertEqual(scheduler.pop_due(now=now), [])
+
+        scheduler.release([('archive', 1)], now=now)
+        self.assertEqual(scheduler.pop_due(now=now), [('archive', 1)])
+
+        # Неподтвержденное событие возвращается после конца аренды
+        self.assertEqual(scheduler.pop_due(now=now + 2 * settings.SCHEDULER_INFLIGHT_TIMEOUT), [('archive', 1)])
+        scheduler.ack([('archive', 1)])
+        self.assertEqual(redis.zcard(scheduler.INFLIGHT_KEY), 0)
+
+
+class TaskRoutingTestCase(SimpleTestCase):
+    def route(self, task):
+        return app.amqp.router.route({}, task, (), {})
+
+    def test_task_routes(self):
+        self.assertEqual(self.route('consultations.tasks.archive_consultations')['queue'].name, 'lifecycle')
+        self.assertEqual(self.route('consultations.tasks.task_send_email_booked_create')['queue'].name, 'notifications')
+        self.assertEqual(self.route('consultations.tasks.task_send_reminders')['queue'].name, 'bulk')
+        self.assertEqual(self.route('consultations.tasks.task_rebuild_occupancy')['queue'].name, 'bulk')
+        self.assertLess(self.route('consultations.tasks.task_dispatch_scheduled_events')['priority'],
+                        self.route('consultations.tasks.archive_consultations')['priority'])
+
+
+class PartitionTestCase(SimpleTestCase):
+    def test_months(self):
+        start = dt(2026, 11, 30, 23, 0, tzinfo=dt_timezone.utc)
+        values = partitions.months(start, partitions.add_months(start, 2))
+        self.assertEqual([month.strftime('%Y-%m') for month in values], ['2026-11', '2026-12', '2027-01'])
+        self.assertEqual(partitions.partition_name('consultations_booked', partitions.month_start(start)),
+                         'consultations_booked_p2026_11')
+
+    def test_starts_at_from_range(self):
+        consultation = Consultation(datetime=DateTimeTZRange(dt(2026, 11, 1, 10), dt(2026, 11, 1, 11)))
+        with patch('django.db.models.Model.save'):
+            consultation.save()
+        self.assertEqual(consultation.starts_at, dt(2026, 11, 1, 10, tzinfo=dt_timezone.utc))
+
+    def test_booked_serializer_hides_partition_key(self):
+        self.assertNotIn('consultation_starts_at', BookedSerializer().fields)
+
+
+class HistoryTestCase(SimpleTestCase):
+    def test_history_serializer_matches_hot(self):
+        consultation = ConsultationHistory(id=7, user_id=1, time_selection='2', price=10.0,
+                                           datetime=DateTimeTZRange(dt(2026, 1, 5, 10), dt(2026, 1, 5, 12)))
+        data = ConsultationHistorySerializer(consultation).data
+        self.assertEqual(data['datetime'], {'start': '2026-01-05 10:00', 'end': '2026-01-05 12:00'})
+        self.assertTrue(data['archive'])
+
+
+class MoveToHistoryTestCase(BaseUserTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.specialist = self.register_specialist()
+        self.user = self.register_user()
+
+    def create_consultation(self, day, archive=True):
+        start = utc(day, 10)
+        return Consultation.objects.create(user=self.specialist, time_selection='1', price=500, archive=archive,
+                                           datetime=DateTimeTZRange(start, start + timedelta(hours=1)))
+
+    def test_move_to_history(self):
+        old = [self.create_consultation(day) for day in (1, 2, 3)]
+        active = self.create_consultation(4, archive=False)
+        recent = self.create_consultation(20)
+        booked = Booked.objects.create(user=self.user, consultation=old[0], status='Successfully', archive=True)
+        ConsultationReminder.objects.create(booked=booked)
+
+        with patch('consultations.history.move_batch', wraps=history.move_batch) as move_batch:
+            self.assertEqual(history.move_to_history(before=utc(10, 0), batch_size=2), 3)
+        # Пачки по 2 и 1 консультации: неполная пачка завершает перенос
+        self.assertEqual(move_batch.call_count, 2)
+
+        ids = [consultation.id for consultation in old]
+        self.assertEqual(sorted(ConsultationHistory.objects.values_list('id', flat=True)), ids)
+        moved = ConsultationHistory.objects.get(id=old[0].id)
+        self.assertEqual(moved.starts_at, old[0].starts_at)
+        self.assertEqual(moved.price, 500)
+        self.assertEqual(BookedHistory.objects.get(id=booked.id).status, 'Successfully')
+
+        self.assertFalse(Consultation.objects.filter(id__in=ids).exists())
+        self.assertFalse(Booked.objects.filter(id=booked.id).exists())
+        self.assertFalse(ConsultationReminder.objects.exists())
+        self.assertEqual(set(Consultation.objects.values_list('id', flat=True)), {active.id, recent.id})
+
+        # Детальное чтение находит перенесенные записи в истории
+        response = self.client.get(f'/consultation/{old[0].id}/', HTTP_AUTHORIZATION=self.get_jwt(self.specialist))
+        self.assertResponse(response, 200, 'success')
+        self.assertEqual(response.data['data']['id'], old[0].id)
+        self.assertTrue(response.data['data']['archive'])
+
+        response = self.client.get(f'/booked/{booked.id}/', HTTP_AUTHORIZATION=self.get_jwt(self.user))
+        self.assertResponse(response, 200, 'success')
+        self.assertEqual(response.data['data']['status'], 'Successfully')
+
+
+@patch('consultations.recurrence.overlapping_slots', return_value=[])
+@patch('consultations.overlaps.existing_overlaps', return_value=[])
+class ImporterTestCase(SimpleTestCase):
+    now = dt(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+    def test_parse_csv(self, existing_overlaps, overlapping_slots):
+        rows = importer.parse('datetime,time_selection,price\n2026-02-01 10:00,2,100\n', 'csv')
+        self.assertEqual(rows, [{'datetime': '2026-02-01 10:00', 'time_selection': '2', 'price': '100'}])
+
+    def test_valid_batch(self, existing_overlaps, overlapping_slots):
+        slots = importer.validate(None, [{'datetime': '2026-02-01 10:00', 'time_selection': '2'},
+                                         {'datetime': '2026-02-01 12:00', 'price': 50}], now=self.now)
+        self.assertEqual(slots[0]['end'], dt(2026, 2, 1, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual(slots[1]['price'], 50.0)
+
+    def test_row_errors(self, existing_overlaps, overlapping_slots):
+        with self.assertRaises(importer.ImportValidationError) as error:
+            importer.validate(None, [{'datetime': '2025-02-01 10:00'}, {'datetime': 'x', 'price': -1}], now=self.now)
+        self.assertEqual(set(error.exception.errors), {0, 1})
+        self.assertEqual(set(error.exception.errors[1]), {'datetime', 'price'})
+        existing_overlaps.assert_not_called()
+
+    def test_internal_and_existing_overlaps(self, existing_overlaps, overlapping_slots):
+        existing_overlaps.return_value = [0]
+        rows = [{'datetime': '2026-02-01 10:00'}, {'datetime': '2026-02-01 08:00', 'time_selection': '3'}]
+        with self.assertRaises(importer.ImportValidationError) as error:
+            importer.validate(None, rows, now=self.now)
+        self.assertEqual(error.exception.errors, {
+            0: {'datetime': ['Запись пересекается со строкой 1.']},
+        })
+
+    def test_non_object_rows(self, existing_overlaps, overlapping_slots):
+        with self.assertRaises(importer.ImportValidationError) as error:
+            importer.validate(None, [1, {'datetime': '2026-02-01 10:00'}, 'x'], now=self.now)
+        self.assertEqual(error.exception.errors, {0: {'row': ['Ожидается объект.']}, 2: {'row': ['Ожидается объект.']}})
+        existing_overlaps.assert_not_called()
+
+    def test_command_unknown_user(self, existing_overlaps, overlapping_slots):
+        with patch.object(User.objects, 'get', side_effect=User.DoesNotExist), \
+                self.assertRaisesMessage(CommandError, 'Пользователь nobody@example.com не найден.'):
+            call_command('import_consultations', 'nobody@example.com', 'consultations.csv')
+
+
+class RecurrenceTestCase(SimpleTestCase):
+    def recurrence(self, **kwargs):
+        return ConsultationRecurrence(**{'id': 1, 'user_id': 1, 'weekdays': [0, 2], 'hours': [10, 14],
+                                         'time_selection': '2', 'starts_on': date(2026, 1, 1), **kwargs})
+
+    def test_occurrences(self):
+        # 2026-01-05 - понедельник
+        start = dt(2026, 1, 5, 12, tzinfo=dt_timezone.utc)
+        values = list(recurrence.occurrences(self.recurrence(ends_on=date(2026, 1, 7)), start,
+                                             start + timedelta(days=7)))
+        self.assertEqual(values, [dt(2026, 1, 5, 14, tzinfo=dt_timezone.utc),
+                                  dt(2026, 1, 7, 10, tzinfo=dt_timezone.utc),
+                                  dt(2026, 1, 7, 14, tzinfo=dt_timezone.utc)])
+
+    def test_patterns_overlap(self):
+        first = self.recurrence()
+        self.assertTrue(recurrence.patterns_overlap(first, self.recurrence(weekdays=[2], hours=[11])))
+        self.assertFalse(recurrence.patterns_overlap(first, self.recurrence(weekdays=[2], hours=[12])))
+        self.assertFalse(recurrence.patterns_overlap(first, self.recurrence(starts_on=date(2025, 1, 1),
+                                                                            ends_on=date(2025, 12, 31))))
+        # Воскресенье 23:00 + 3 часа заходит на понедельник
+        self.assertTrue(recurrence.patterns_overlap(self.recurrence(weekdays=[0], hours=[1]),
+                                                    self.recurrence(weekdays=[6], hours=[23], time_selection='3')))
+
+    def test_overlapping_slots(self):
+        start = dt(2026, 1, 5, 10, tzinfo=dt_timezone.utc)
+        virtual = [(self.recurrence(), start)]
+        slots = [{'start': start + timedelta(hours=1), 'end': start + timedelta(hours=2)},
+                 {'start': start + timedelta(hours=2), 'end': start + timedelta(hours=3)}]
+        with patch('consultations.recurrence.overlapping_occurrences', return_value=virtual):
+            self.assertEqual(recurrence.overlapping_slots(None, slots), [0])
+
+
+class MaterializeTestCase(BaseUserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.specialist = self.register_specialist()
+        today = date.today()
+        self.recurrence = ConsultationRecurrence.objects.create(user=self.specialist, weekdays=[0], hours=[10],
+                                                                starts_on=today)
+        # Ближайший понедельник после сегодняшнего дня
+        monday = today + timedelta(days=7 - today.weekday())
+        self.start = dt(monday.year, monday.month, monday.day, 10, tzinfo=dt_timezone.utc)
+
+    def test_materialize_schedules_through_outbox(self):
+        with patch('consultations.scheduler.schedule_consultations') as schedule:
+            consultation = recurrence.materialize(self.recurrence.id, self.start)
+        schedule.assert_not_called()
+
+        event = OutboxEvent.objects.get(task=schedule_consultations.name)
+        self.assertEqual(event.args, [[consultation.id]])
+        self.assertEqual(recurrence.materialize(self.recurrence.id, self.start), consultation)
+
+    def test_materialize_rejects_archived(self):
+        consultation = recurrence.materialize(self.recurrence.id, self.start)
+        consultation.set_archive()
+        with self.assertRaises(recurrence.OccurrenceError):
+            recurrence.materialize(self.recurrence.id, self.start)
+
+    def test_validate_ignores_own_occurrences(self):
+        recurrence.materialize(self.recurrence.id, self.start)
+        self.recurrence.description = 'new description'
+        self.assertEqual(recurrence.validate_recurrence(self.recurrence), {})
+
+        # Отдельная консультация в то же время по-прежнему конфликтует с шаблоном
+        Consultation.objects.create(user=self.specialist, datetime=DateTimeTZRange(
+            self.start + timedelta(days=7), self.start + timedelta(days=7, hours=1)))
+        self.assertIn('weekdays', recurrence.validate_recurrence(self.recurrence))
+
+
+def utc(day, hour):
+    return dt(2026, 1, day, hour, tzinfo=dt_timezone.utc)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AvailabilityTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.specialist = Specialist(id=3, user=User(id=5, username='specialist'))
+
+    def test_subtract(self):
+        busy = [(utc(5, 12), utc(5, 14)), (utc(5, 8), utc(5, 10)), (utc(5, 13), utc(5, 15))]
+        self.assertEqual(availability.subtract(utc(5, 9), utc(5, 18), busy),
+                         [(utc(5, 10), utc(5, 12)), (utc(5, 15), utc(5, 18))])
+        self.assertEqual(availability.subtract(utc(5, 9), utc(5, 18), [(utc(5, 8), utc(5, 19))]), [])
+
+    def test_day_free_is_cached(self):
+        # 2026-01-05 - понедельник, 2026-01-10 - суббота
+        days = [date(2026, 1, 5), date(2026, 1, 10)]
+        with patch('consultations.availability._busy', return_value={5: [(utc(5, 10), utc(5, 12))]}) as busy:
+            free = availability.day_free([self.specialist], days)
+            self.assertEqual(free[5, days[0]], [(utc(5, 9), utc(5, 10)), (utc(5, 12), utc(5, 18))])
+            self.assertEqual(free[5, days[1]], [])
+
+            self.assertEqual(availability.day_free([self.specialist], days), free)
+            busy.assert_called_once()
+
+        # Кэш сбрасывается только после фиксации транзакции
+        with patch('consultations.availability.transaction.on_commit') as on_commit:
+            availability.invalidate(5, utc(5, 10))
+        self.assertIsNotNone(cache.get(availability.cache_key(5, days[0])))
+        on_commit.call_args.args[0]()
+        self.assertIsNone(cache.get(availability.cache_key(5, days[0])))
+        self.assertIsNotNone(cache.get(availability.cache_key(5, days[1])))
+
+
+class OccupancyTestCase(SimpleTestCase):
+    def test_hours(self):
+        start = dt(2026, 1, 5, 22, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(list(occupancy.hours(start, start + timedelta(hours=2))),
+                         [(date(2026, 1, 5), 22), (date(2026, 1, 5), 23), (date(2026, 1, 6), 0)])
+        self.assertEqual(list(occupancy.hours(utc(5, 10), utc(5, 11))), [(date(2026, 1, 5), 10)])
+
+    def test_full_hours(self):
+        start = dt(2026, 1, 5, 9, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(list(occupancy.full_hours(start, start + timedelta(hours=2))), [(date(2026, 1, 5), 10)])
+        self.assertEqual(list(occupancy.full_hours(utc(5, 10), utc(5, 12))),
+                         [(date(2026, 1, 5), 10), (date(2026, 1, 5), 11)])
+
+    @patch('consultations.occupancy._redis')
+    def test_is_busy(self, redis):
+        pipe = redis.return_value.pipeline.return_value
+        pipe.execute.return_value = [1, [0, 1]]
+        self.assertTrue(occupancy.is_busy(5, utc(5, 10), utc(5, 12)))
+
+        pipe.execute.return_value = [1, [0, 0]]
+        self.assertFalse(occupancy.is_busy(5, utc(5, 10), utc(5, 12)))
+
+        # Без пересборки счетчикам не доверяем
+        pipe.execute.return_value = [0, [0, 1]]
+        self.assertFalse(occupancy.is_busy(5, utc(5, 10), utc(5, 12)))
+
+        # Интервал внутри одного часа: счетчик часа не доказывает пересечение
+        redis.reset_mock()
+        self.assertFalse(occupancy.is_busy(5, dt(2026, 1, 5, 10, 30, tzinfo=dt_timezone.utc), utc(5, 11)))
+        redis.assert_not_called()
+
+    @patch('consultations.occupancy._snapshot')
+    @patch('consultations.occupancy._redis')
+    def test_rebuild_repeats_after_concurrent_change(self, redis, snapshot):
+        connection = redis.return_value
+        connection.scan_iter.return_value = [b'occupancy:5:2026-01-04']
+        snapshot.return_value = ({('occupancy:5:2026-01-05', date(2026, 1, 5)): [0] * 10 + [1] + [0] * 13}, 1)
+        # Во время первой пересборки счетчики изменились
+        connection.get.side_effect = [b'1', b'2', b'2', b'2']
+
+        self.assertEqual(occupancy.rebuild(), 1)
+        self.assertEqual(connection.method_calls[0], call.delete(occupancy.READY_KEY))
+        self.assertEqual(snapshot.call_count, 2)
+        connection.set.assert_called_once_with(occupancy.READY_KEY, 1)
+
+        pipe = connection.pipeline.return_value
+        pipe.rename.assert_called_with('rebuild:occupancy:5:2026-01-05', 'occupancy:5:2026-01-05')
+        pipe.delete.assert_called_with(b'occupancy:5:2026-01-04')
+
+
+class UtilizationTestCase(SimpleTestCase):
+    def test_occupancy_matrix(self):
+        rows = [
+            (7, utc(5, 10), '2', True),
+            (7, utc(5, 11), '1', False),
+            (3, dt(2026, 1, 5, 23, 30, tzinfo=dt_timezone.utc), '3', False),
+        ]
+        specialists, offered, booked = utilization.occupancy_matrix(rows, utc(5, 0), 48)
+        self.assertEqual(specialists.tolist(), [3, 7])
+        self.assertEqual(offered.shape, (2, 48))
+        # Начало не в ровный час округляется вниз
+        self.assertEqual(offered[0].nonzero()[0].tolist(), [23, 24, 25])
+        self.assertEqual(offered[1].nonzero()[0].tolist(), [10, 11])
+        self.assertEqual(booked[1].nonzero()[0].tolist(), [10, 11])
+        self.assertFalse(booked[0].any())
+
+    @patch('consultations.utilization.load')
+    def test_build(self, load):
+        load.return_value = [(7, utc(5, 22), '3', True), (7, utc(6, 10), '1', False)]
+        report = utilization.build(date(2026, 1, 5), date(2026, 1, 7))
+        self.assertEqual(report['days'], ['2026-01-05', '2026-01-06'])
+        self.assertEqual(report['offered_hours'], [[2, 2]])
+        self.assertEqual(report['booked_hours'], [[2, 1]])
+        self.assertEqual(report['by_specialist'],
+                         [{'user': 7, 'offered_hours': 4, 'booked_hours': 3, 'utilization': 0.75}])
+        self.assertEqual(report['matrix']['shape'], [1, 2, 24])
+
+
+class UtilizationLoadTestCase(BaseUserTestCase):
+    def test_load_skips_cancelled(self):
+        specialist = self.register_specialist()
+        user = self.register_user()
+
+        def create(day, **kwargs):
+            return Consultation.objects.create(user=specialist, time_selection='1', price=500,
+                                               datetime=DateTimeTZRange(utc(day, 10), utc(day, 11)), **kwargs)
+
+        create(5)
+        create(6, archive=True)
+        held = create(7, archive=True)
+        Booked.objects.create(user=user, consultation=held, status='Successfully', archive=True)
+
+        rows = utilization.load(utc(1, 0), utc(10, 0))
+        self.assertEqual(sorted((starts_at, booked) for _, starts_at, _, booked in rows),
+                         [(utc(5, 10), False), (utc(7, 10), True)])
+
+
+class CalendarTestCase(SimpleTestCase):
+    def test_parse_month(self):
+        self.assertEqual(calendars.parse_month('2025-10'), date(2025, 10, 1))
+        for value in ('2025', '2025-13', 'october'):
+            with self.assertRaises(ValueError):
+                calendars.parse_month(value)
+
+    def test_get_is_cached(self):
+        month = date(2025, 10, 1)
+        days = [{'date': '2025-10-01', 'open': 1, 'booked': 0, 'archived': 0, 'min_price': 500.0}]
+        cache.delete(calendars.cache_key(month, 5))
+        with patch('consultations.calendars.month_days', return_value=days) as month_days:
+            self.assertEqual(calendars.get(month, 5), days)
+            self.assertEqual(calendars.get(month, 5), days)
+            month_days.assert_called_once_with(month, 5)
+        self.assertEqual(calendars.cache_key(month), 'ConsultationCalendar_2025-10_all')
+
+
+class BulkBookedTestCase(SimpleTestCase):
+    def test_parse(self):
+        self.assertEqual(bulk.parse({'accept': [1, '2'], 'reject': [3]}), {1: 'accept', 2: 'accept', 3: 'reject'})
+        for data in ({}, {'accept': 1}, {'accept': ['x']}, {'accept': [1], 'cancel': [1]}):
+            with self.assertRaises(bulk.BulkValidationError):
+                bulk.parse(data)
+        with override_settings(BOOKED_BULK_MAX_ITEMS=2), self.assertRaises(bulk.BulkValidationError):
+            bulk.parse({'accept': [1, 2, 3]})
+
+    def test_plan(self):
+        specialist = User(id=5)
+        consultation = Consultation(id=10, user=specialist)
+        other = Consultation(id=11, user=User(id=6))
+        bookeds = {
+            1: Booked(id=1, user=User(id=7), consultation=consultation, status='In processing'),
+            2: Booked(id=2, user=User(id=8), consultation=consultation, status='In processing'),
+            3: Booked(id=3, user=User(id=7), consultation=other, status='In processing'),
+            4: Booked(id=4, user=User(id=7), consultation=consultation, status='Cancelled', archive=True),
+        }
+        operations = {1: 'accept', 2: 'accept', 3: 'reject', 4: 'cancel', 9: 'cancel'}
+
+        results, accepted, cancelled = bulk.plan(specialist, operations, bookeds)
+        self.assertEqual(accepted, [bookeds[1]])
+        self.assertEqual(cancelled, [])
+        self.assertEqual({booked_id: result['status'] for booked_id, result in results.items()},
+                         {2: 'conflict', 3: 'forbidden', 4: 'invalid_status', 9: 'not_found'})
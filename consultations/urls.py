@@ -1,12 +1,31 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from .views import ConsultationList, BookedList
+from .async_views import consultation_list, consultation_detail, booked_list, booked_detail
+from .views import ConsultationList, BookedList, ConsultationHistoryList, BookedHistoryList, RecurrenceList, \
+    AvailabilityView, UtilizationReportView
 
 router = routers.DefaultRouter()
 router.register(r'consultation', ConsultationList)
 router.register(r'booked', BookedList)
+router.register(r'recurrence', RecurrenceList)
+router.register(r'history/consultation', ConsultationHistoryList, basename='consultation-history')
+router.register(r'history/booked', BookedHistoryList, basename='booked-history')
 
 urlpatterns = [
+    # Чтение обслуживают асинхронные представления, запись - ViewSet
+    path('consultation/', consultation_list),
+    path('consultation/calendar/', ConsultationList.as_view({'get': 'calendar'})),
+    path('consultation/export/', ConsultationList.as_view({'get': 'export'})),
+    path('consultation/import/', ConsultationList.as_view({'post': 'bulk_import'})),
+    path('consultation/<pk>/', consultation_detail),
+    path('booked/', booked_list),
+    path('booked/bulk/', BookedList.as_view({'post': 'bulk_update'})),
+    path('booked/export/', BookedList.as_view({'get': 'export'})),
+    path('booked/<pk>/', booked_detail),
+
+    path('availability/', AvailabilityView.as_view()),
+    path('reports/utilization/', UtilizationReportView.as_view()),
+
     path('', include(router.urls)),
 ]
@@ -0,0 +1,145 @@
+"""
+Отчет о загрузке специалистов.
+
+Консультации периода (из горячей таблицы и истории) читаются одним запросом и
+превращаются в массивы NumPy. Матрица занятости специалист x час периода
+строится разностным массивом: +1 в час начала, -1 в час окончания и
+накопленная сумма по часам, без циклов Python по консультациям. Из матриц
+предложенных и забронированных часов считаются агрегаты по специалистам и дням.
+
+Результат кэшируется на период; большие периоды считаются задачей Celery.
+"""
+import base64
+from datetime import datetime as dt, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Booked, BookedHistory, Consultation, ConsultationHistory
+
+# Брони, которые занимают консультацию
+BOOKED_STATUSES = ('Booked', 'Successfully')
+
+
+def cache_key(start, end):
+    return f'Utilization_{start:%Y-%m-%d}_{end:%Y-%m-%d}'
+
+
+def pending_key(start, end):
+    return f'{cache_key(start, end)}_pending'
+
+
+def load(start, end):
+    """
+    Специалист, начало и продолжительность в часах и признак брони для
+    консультаций, начинающихся в [start, end), одним запросом.
+
+    Предложенными считаются неархивные консультации, как в проверках пересечений
+    и поиске свободного времени, и забронированные: состоявшаяся консультация
+    архивируется, но ее часы были предложены и заняты.
+    """
+    hot = Consultation.objects.filter(starts_at__gte=start, starts_at__lt=end).annotate(
+        booked=Exists(Booked.objects.filter(consultation=OuterRef('pk'), consultation_starts_at=OuterRef('starts_at'),
+                                            status__in=BOOKED_STATUSES)),
+    ).filter(Q(archive=False) | Q(booked=True)).values_list('user_id', 'starts_at', 'time_selection', 'booked')
+    # В истории только архивные консультации
+    moved = ConsultationHistory.objects.filter(starts_at__gte=start, starts_at__lt=end).annotate(
+        booked=Exists(BookedHistory.objects.filter(consultation=OuterRef('pk'), status__in=BOOKED_STATUSES)),
+    ).filter(booked=True).values_list('user_id', 'starts_at', 'time_selection', 'booked')
+    return list(hot.union(moved, all=True))
+
+
+def occupancy_matrix(rows, start, hours):
+    """
+    Матрицы предложенных и забронированных часов формы (специалисты, hours).
+
+    :return: id специалистов, предложенные часы, забронированные часы (bool)
+    """
+    user_ids, starts, selections, booked = zip(*rows)
+    specialists, index = np.unique(np.array(user_ids, dtype=np.int64), return_inverse=True)
+
+    begin = (np.fromiter((value.timestamp() for value in starts), dtype=np.float64, count=len(starts))
+             - start.timestamp()) // 3600
+    begin = begin.astype(np.int64)
+    finish = np.clip(begin + np.array(selections, dtype=np.int64), 0, hours)
+    begin = np.clip(begin, 0, hours)
+    booked = np.array(booked, dtype=bool)
+
+    def matrix(mask):
+        diff = np.zeros((len(specialists), hours + 1), dtype=np.int32)
+        np.add.at(diff, (index[mask], begin[mask]), 1)
+        np.add.at(diff, (index[mask], finish[mask]), -1)
+        return np.cumsum(diff[:, :hours], axis=1) > 0
+
+    return specialists, matrix(np.ones_like(booked)), matrix(booked)
+
+
+def _ratio(booked, offered):
+    return np.divide(booked, offered, out=np.zeros(np.shape(booked), dtype=np.float64), where=offered > 0)
+
+
+def build(start_day, end_day):
+    """
+    Отчет за дни [start_day, end_day).
+    """
+    start = dt.combine(start_day, time(), tzinfo=dt_timezone.utc)
+    end = dt.combine(end_day, time(), tzinfo=dt_timezone.utc)
+    days = (end_day - start_day).days
+
+    report = {
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'days': [(start_day + timedelta(days=number)).isoformat() for number in range(days)],
+        'specialists': [],
+        'offered_hours': [],
+        'booked_hours': [],
+        'utilization': [],
+        'by_specialist': [],
+        'totals': {'offered_hours': 0, 'booked_hours': 0, 'utilization': 0.0},
+        'matrix': None,
+    }
+
+    rows = load(start, end)
+    if not rows:
+        return report
+
+    specialists, offered, booked = occupancy_matrix(rows, start, days * 24)
+    # Часы по дням: (специалисты, дни, 24) -> (специалисты, дни)
+    offered_days = offered.reshape(len(specialists), days, 24).sum(axis=2)
+    booked_days = booked.reshape(len(specialists), days, 24).sum(axis=2)
+    offered_total, booked_total = offered_days.sum(axis=1), booked_days.sum(axis=1)
+    utilization = _ratio(booked_total, offered_total)
+
+    report.update({
+        'specialists': specialists.tolist(),
+        'offered_hours': offered_days.tolist(),
+        'booked_hours': booked_days.tolist(),
+        'utilization': np.round(_ratio(booked_days, offered_days), 3).tolist(),
+        'by_specialist': [
+            {'user': int(user_id), 'offered_hours': int(offered_hours), 'booked_hours': int(booked_hours),
+             'utilization': round(float(ratio), 3)}
+            for user_id, offered_hours, booked_hours, ratio in zip(specialists, offered_total, booked_total,
+                                                                   utilization)
+        ],
+        'totals': {
+            'offered_hours': int(offered_total.sum()),
+            'booked_hours': int(booked_total.sum()),
+            'utilization': round(float(_ratio(booked_total.sum(), offered_total.sum())), 3),
+        },
+        # Забронированные часы одним битом на час: специалисты x дни x 24
+        'matrix': {
+            'shape': [len(specialists), days, 24],
+            'encoding': 'packbits',
+            'data': base64.b64encode(np.packbits(booked).tobytes()).decode(),
+        },
+    })
+    return report
+
+
+def build_cached(start_day, end_day):
+    report = build(start_day, end_day)
+    cache.set(cache_key(start_day, end_day), report, timeout=settings.UTILIZATION_CACHE_TIMEOUT)
+    cache.delete(pending_key(start_day, end_day))
+    return report
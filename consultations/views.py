@@ -1,5 +1,9 @@
-from datetime import datetime as dt
+from datetime import date, datetime as dt, timezone as dt_timezone
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -7,13 +11,16 @@ from rest_framework import filters, status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.viewsets import ModelViewSet
-
-from celery import current_app
+from rest_framework.views import APIView
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from consultation_planning_service.export import StreamingExportMixin
 from consultation_planning_service.utils import StandardResponseMixin, api_response, CacheResponseMixin
+from events import outbox
+from specialist.permissions import IsAdmin
+from . import availability, bulk, calendars, importer, recurrence, utilization
 from .filters import ConsultationFilter, BookedFilter
-from .models import Consultation, Booked
+from .models import Consultation, Booked, ConsultationHistory, BookedHistory, ConsultationRecurrence
 from .permissions import (
     IsOwnerOrReadOnly,
     IsInSpecialistGroupOrReadOnly,
@@ -21,18 +28,36 @@ from .permissions import (
     IsConsultationAuthor,
     IsConsultationAuthorOrBookingAuthor
 )
-from .serializers import ConsultationSerializer, BookedSerializer
-from .tasks import archive_consultation
+from .serializers import ConsultationSerializer, BookedSerializer, ConsultationHistorySerializer, \
+    BookedHistorySerializer, ConsultationRecurrenceSerializer, OccurrenceSerializer
+from .tasks import schedule_consultations, task_build_utilization
 
 
 # Create your views here.
-class ConsultationList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
+class ConsultationList(StreamingExportMixin, CacheResponseMixin, StandardResponseMixin, ModelViewSet):
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly, IsInSpecialistGroupOrReadOnly]
     queryset = Consultation.objects.all()
     serializer_class = ConsultationSerializer
 
+    # Перенесенные в историю записи отдаются детальным чтением по тому же id
+    history_queryset = ConsultationHistory.objects.all()
+    history_serializer_class = ConsultationHistorySerializer
+
     name_prefix_cache = 'ConsultationList'
 
+    export_filename = 'consultations'
+    export_columns = {
+        'id': None,
+        'user_id': None,
+        'time_selection': None,
+        'start': F('datetime__startswith'),
+        'end': F('datetime__endswith'),
+        'booking': None,
+        'price': None,
+        'description': None,
+        'archive': None,
+    }
+
     # Поддержка фильтрации и сортировки
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     filterset_class = ConsultationFilter
@@ -46,28 +71,14 @@ class ConsultationList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
 
     http_method_names = ['get', 'post', 'patch']
 
+    # События консультации планируются через outbox после фиксации транзакции запроса
     def perform_create(self, serializer):
         consultation = serializer.save(user=self.request.user)
-
-        end_time = consultation.datetime.lower.replace(tzinfo=None)
-        delay = (end_time - dt.now()).total_seconds()
-        task = archive_consultation.apply_async((consultation.id,), countdown=delay)
-
-        consultation.celery_task_id = task.id
-        consultation.save()
+        outbox.enqueue(schedule_consultations, [consultation.id])
 
     def perform_update(self, serializer):
         consultation = serializer.save()
-
-        if consultation.celery_task_id:
-            current_app.control.revoke(consultation.celery_task_id, terminate=True)
-
-        end_time = consultation.datetime.lower.replace(tzinfo=None)
-        delay = (end_time - dt.now()).total_seconds()
-        task = archive_consultation.apply_async((consultation.id,), countdown=delay)
-
-        consultation.celery_task_id = task.id
-        consultation.save()
+        outbox.enqueue(schedule_consultations, [consultation.id])
 
     @swagger_auto_schema(
         operation_description="Получить список консультаций с поддержкой фильтрации, сортировки и поиска.",
@@ -126,6 +137,58 @@ class ConsultationList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
         """
         return super().partial_update(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        operation_description="Количество свободных, забронированных и архивных консультаций и минимальная цена "
+                              "свободных по дням месяца (дни в часовом поясе TIME_ZONE).",
+        manual_parameters=[
+            openapi.Parameter('month', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Месяц в формате: 2025-10'),
+            openapi.Parameter('user', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='id пользователя-специалиста'),
+        ]
+    )
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        try:
+            month = calendars.parse_month(request.query_params.get('month', ''))
+            user_id = request.query_params.get('user')
+            user_id = int(user_id) if user_id else None
+        except ValueError:
+            return api_response(errors={'month': ['Укажите month в формате: 2025-10 и числовой user.']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        return api_response(data={'month': f'{month:%Y-%m}', 'user': user_id,
+                                  'days': calendars.get(month, user_id)})
+
+    @swagger_auto_schema(
+        operation_description="Массовый импорт консультаций из CSV или JSON (только специалист). "
+                              "Колонки: datetime, time_selection, price, description.",
+        manual_parameters=[
+            openapi.Parameter('file', openapi.IN_FORM, type=openapi.TYPE_FILE,
+                              description='Файл .csv с заголовком или .json со списком объектов'),
+        ],
+    )
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        upload = request.FILES.get('file')
+        try:
+            if upload is not None:
+                content_format = 'csv' if upload.name.lower().endswith('.csv') else 'json'
+                rows = importer.parse(upload.read().decode('utf-8-sig'), content_format)
+            else:
+                rows = request.data.get('consultations') if isinstance(request.data, dict) else None
+                if not isinstance(rows, list):
+                    raise importer.ImportValidationError({'file': ['Передайте файл или список consultations.']})
+
+            ids = importer.import_consultations(request.user, rows)
+        except importer.ImportValidationError as exc:
+            return api_response(errors=exc.errors,
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        return api_response(data={'created': len(ids), 'ids': ids}, http_status=status.HTTP_201_CREATED)
+
     @swagger_auto_schema(
         operation_description="Отменить консультацию (только автор консультации)",
         request_body=openapi.Schema(
@@ -161,13 +224,29 @@ class ConsultationList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
                                   'rejection_text': rejection_text})
 
 
-class BookedList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
+class BookedList(StreamingExportMixin, CacheResponseMixin, StandardResponseMixin, ModelViewSet):
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
     queryset = Booked.objects.all()
     serializer_class = BookedSerializer
 
+    history_queryset = BookedHistory.objects.all()
+    history_serializer_class = BookedHistorySerializer
+
     name_prefix_cache = 'BookedList'
 
+    export_filename = 'bookeds'
+    export_columns = {
+        'id': None,
+        'user_id': None,
+        'consultation_id': None,
+        'consultation_start': F('consultation__datetime__startswith'),
+        'consultation_end': F('consultation__datetime__endswith'),
+        'status': None,
+        'rejection_text': None,
+        'description': None,
+        'archive': None,
+    }
+
     # Добавляем поддержку фильтров и сортировки
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     filterset_class = BookedFilter
@@ -184,6 +263,11 @@ class BookedList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def get_export_queryset(self):
+        # Выгружаются только брони пользователя и брони на его консультации
+        user = self.request.user
+        return self.get_queryset().filter(Q(user=user) | Q(consultation__user=user))
+
     @swagger_auto_schema(
         operation_description="Получить список бронирования с поддержкой фильтрации, сортировки и поиска.",
         manual_parameters=[
@@ -260,7 +344,7 @@ class BookedList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
     def accept(self, request):
         data = request.data
 
-        booked = get_object_or_404(Booked, pk=data.get('id'))
+        booked = get_object_or_404(Booked.objects.select_related('user', 'consultation__user'), pk=data.get('id'))
 
         self.check_object_permissions(request, booked)
 
@@ -283,7 +367,7 @@ class BookedList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
     def cancellation(self, request):
         data = request.data
 
-        booked = get_object_or_404(Booked, pk=data.get('id'))
+        booked = get_object_or_404(Booked.objects.select_related('user', 'consultation__user'), pk=data.get('id'))
 
         self.check_object_permissions(request, booked)
 
@@ -296,3 +380,236 @@ class BookedList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
 
         return api_response(data={'detail': 'Бронь отклонена.',
                                   'rejection_text': rejection_text})
+
+    @swagger_auto_schema(
+        operation_description="Подтвердить, отменить или отклонить несколько броней одним запросом (только автор "
+                              "консультаций). Возвращает результат по каждой брони.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'accept': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                                         description='id подтверждаемых броней'),
+                'cancel': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                                         description='id отменяемых броней (в обработке или подтвержденных)'),
+                'reject': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                                         description='id отклоняемых заявок (в обработке)'),
+                'rejection_text': openapi.Schema(type=openapi.TYPE_STRING,
+                                                 description='Причина отмены, обязательна для cancel и reject'),
+            }
+        ),
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_update(self, request):
+        try:
+            operations = bulk.parse(request.data)
+            results = bulk.apply(request.user, operations, request.data.get('rejection_text'))
+        except bulk.BulkValidationError as exc:
+            return api_response(errors=exc.errors,
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        return api_response(data={'results': results})
+
+
+class ConsultationHistoryList(StandardResponseMixin, ReadOnlyModelViewSet):
+    """
+    Консультации пользователя, перенесенные в историю.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ConsultationHistorySerializer
+
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['starts_at', 'price']
+    ordering = ['-starts_at']
+
+    def get_queryset(self):
+        return ConsultationHistory.objects.filter(user=self.request.user)
+
+
+class BookedHistoryList(StandardResponseMixin, ReadOnlyModelViewSet):
+    """
+    Перенесенные в историю брони пользователя и брони на его консультации.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = BookedHistorySerializer
+
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['consultation__starts_at', 'status']
+    ordering = ['-consultation__starts_at']
+
+    def get_queryset(self):
+        user = self.request.user
+        return BookedHistory.objects.filter(Q(user=user) | Q(consultation__user=user))
+
+
+class RecurrenceList(StandardResponseMixin, ModelViewSet):
+    """
+    Шаблоны повторяющихся консультаций. Вхождения разворачиваются по запросу
+    для окна времени и материализуются в консультацию при бронировании.
+    """
+    permission_classes = [IsAuthenticated, IsOwnerOrReadOnly, IsInSpecialistGroupOrReadOnly]
+    queryset = ConsultationRecurrence.objects.filter(is_active=True)
+    serializer_class = ConsultationRecurrenceSerializer
+
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['user']
+
+    http_method_names = ['get', 'post', 'patch']
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @swagger_auto_schema(
+        operation_description="Свободные вхождения шаблонов в окне времени (не больше "
+                              "CONSULTATION_OCCURRENCES_MAX_WINDOW).",
+        manual_parameters=[
+            openapi.Parameter('start', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Начало окна в формате: 2025-09-25 18:00'),
+            openapi.Parameter('end', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Конец окна в формате: 2025-09-25 18:00'),
+            openapi.Parameter('user', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='id специалиста'),
+        ]
+    )
+    @action(detail=False, methods=['get'])
+    def occurrences(self, request):
+        try:
+            start, end = (dt.strptime(request.query_params[key], '%Y-%m-%d %H:%M').replace(tzinfo=dt_timezone.utc)
+                          for key in ('start', 'end'))
+        except (KeyError, ValueError):
+            return api_response(errors={'start': ['Укажите start и end в формате: 2025-09-25 18:00']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+        if not start < end <= start + settings.CONSULTATION_OCCURRENCES_MAX_WINDOW:
+            return api_response(errors={'end': ['Недопустимое окно времени.']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        # Прошедшие вхождения недоступны для бронирования
+        start = max(start, timezone.now())
+        filters = {'user': request.query_params['user']} if request.query_params.get('user', '').isdigit() else {}
+        recurrences = recurrence.active_recurrences(start, end, **filters).select_related('user')
+        items = [{'recurrence': item, 'start': value}
+                 for item, value in recurrence.virtual_occurrences(recurrences, start, end)]
+        return api_response(data=OccurrenceSerializer(items, many=True).data)
+
+    @swagger_auto_schema(
+        operation_description="Забронировать вхождение шаблона: создает консультацию и бронь на нее.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['datetime'],
+            properties={
+                'datetime': openapi.Schema(type=openapi.TYPE_STRING,
+                                           description='Время начала вхождения в формате: 2025-09-25 18:00'),
+                'description': openapi.Schema(type=openapi.TYPE_STRING, description='Описание.'),
+            }
+        ),
+    )
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def book(self, request, pk=None):
+        try:
+            start = dt.strptime(request.data.get('datetime', ''), '%Y-%m-%d %H:%M').replace(tzinfo=dt_timezone.utc)
+            consultation = recurrence.materialize(pk, start)
+        except ValueError:
+            return api_response(errors={'datetime': ['Ошибка с датой и временем.']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+        except recurrence.OccurrenceError as exc:
+            return api_response(errors={'datetime': [str(exc)]},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        serializer = BookedSerializer(data={'consultation': consultation.id,
+                                            'description': request.data.get('description', '')},
+                                      context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return api_response(data=serializer.data, http_status=status.HTTP_201_CREATED)
+
+
+class AvailabilityView(APIView):
+    """
+    Свободное время активных специалистов в окне с учетом рабочих часов.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Специалисты, свободные в окне времени не меньше duration часов.",
+        manual_parameters=[
+            openapi.Parameter('start', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Начало окна в формате: 2025-09-25 10:00'),
+            openapi.Parameter('end', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Конец окна в формате: 2025-09-25 18:00'),
+            openapi.Parameter('duration', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Продолжительность в часах — от 1 до 3'),
+            openapi.Parameter('specialist', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='id специалистов через запятую'),
+        ]
+    )
+    def get(self, request):
+        params = request.query_params
+        try:
+            start, end = (dt.strptime(params[key], '%Y-%m-%d %H:%M').replace(tzinfo=dt_timezone.utc)
+                          for key in ('start', 'end'))
+        except (KeyError, ValueError):
+            return api_response(errors={'start': ['Укажите start и end в формате: 2025-09-25 18:00']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+        if not start < end <= start + settings.AVAILABILITY_MAX_WINDOW:
+            return api_response(errors={'end': ['Недопустимое окно времени.']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        duration = params.get('duration', '1')
+        if duration not in dict(Consultation.POSITIONS_TIME_SELECTION):
+            return api_response(errors={'duration': ['Продолжительность — от 1 до 3 часов.']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        specialist_ids = [value for value in params.get('specialist', '').split(',') if value.isdigit()]
+        return api_response(data=availability.search(start, end, int(duration), specialist_ids))
+
+
+class UtilizationReportView(APIView):
+    """
+    Загрузка специалистов по дням: предложенные и забронированные часы (только администраторы).
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    @swagger_auto_schema(
+        operation_description="Отчет о загрузке специалистов за дни [start, end). Периоды длиннее "
+                              "UTILIZATION_SYNC_MAX_DAYS считаются в фоне: пока отчет не готов, возвращается 202.",
+        manual_parameters=[
+            openapi.Parameter('start', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Первый день в формате: 2025-01-01'),
+            openapi.Parameter('end', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='День после последнего в формате: 2025-04-01'),
+            openapi.Parameter('matrix', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                              description='Добавить матрицу забронированных часов (np.packbits, base64)'),
+        ]
+    )
+    def get(self, request):
+        try:
+            start, end = (date.fromisoformat(request.query_params[key]) for key in ('start', 'end'))
+        except (KeyError, ValueError):
+            return api_response(errors={'start': ['Укажите start и end в формате: 2025-01-01']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+        days = (end - start).days
+        if not 0 < days <= settings.UTILIZATION_MAX_DAYS:
+            return api_response(errors={'end': ['Недопустимый период.']},
+                                http_status=status.HTTP_400_BAD_REQUEST,
+                                status='error')
+
+        report = cache.get(utilization.cache_key(start, end))
+        if report is None:
+            if days > settings.UTILIZATION_SYNC_MAX_DAYS:
+                # Одна задача на период, пока предыдущая не закончилась
+                if cache.add(utilization.pending_key(start, end), True, timeout=settings.UTILIZATION_CACHE_TIMEOUT):
+                    outbox.enqueue(task_build_utilization, start.isoformat(), end.isoformat())
+                return api_response(data={'state': 'pending'}, http_status=status.HTTP_202_ACCEPTED)
+            report = utilization.build_cached(start, end)
+
+        if request.query_params.get('matrix') not in ('1', 'true'):
+            report = {**report, 'matrix': None}
+        return api_response(data=report)
@@ -0,0 +1,7 @@
+from django.contrib import admin
+
+from .models import OutboxEvent, WebhookSubscription
+
+# Register your models here.
+admin.site.register(OutboxEvent)
+admin.site.register(WebhookSubscription)
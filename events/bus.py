@@ -0,0 +1,227 @@
+"""
+Шина событий на Redis Streams.
+
+Изменения консультаций и бронирований добавляются в поток после фиксации
+транзакции. Потребители объединены в группы: каждая группа читает поток
+со своей скоростью пачками и подтверждает обработанные события (XACK).
+Неподтвержденные события остаются в списке ожидания группы и повторно
+обрабатываются после ошибки или при следующем запуске потребителя. После ошибки
+неподтвержденные события повторяются по одному, чтобы исправные не ждали
+сбойного. Событие, которое группа получила EVENTS_CONSUMER_MAX_DELIVERIES раз
+(счетчик доставок из XPENDING), подтверждается и переносится в поток
+events:dead.
+
+Обработчики регистрируются декоратором consumer в модулях <app>/consumers.py.
+"""
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import autodiscover_modules
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'events:stream'
+DEAD_LETTER_KEY = 'events:dead'
+
+# Сколько событий после last-delivered-id просматривается для оценки отставания
+LAG_SCAN_LIMIT = 10000
+
+# Обработчики по имени группы
+consumers = {}
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def consumer(group):
+    """
+    Зарегистрировать обработчик группы. Обработчик получает список событий.
+    """
+    def decorator(func):
+        consumers[group] = func
+        return func
+    return decorator
+
+
+def load_consumers():
+    autodiscover_modules('consumers')
+    return consumers
+
+
+def _xadd(event_type, data, client=None):
+    (client or _redis()).xadd(STREAM_KEY, {'type': event_type, 'data': json.dumps(data, default=str),
+                                           'ts': time.time()},
+                              maxlen=settings.EVENTS_STREAM_MAXLEN, approximate=True)
+
+
+def _xadd_many(events):
+    pipe = _redis().pipeline(transaction=False)
+    for event_type, data in events:
+        _xadd(event_type, data, pipe)
+    pipe.execute()
+
+
+def publish(event_type, **data):
+    """
+    Добавить событие в поток после фиксации текущей транзакции.
+    """
+    transaction.on_commit(lambda: _xadd(event_type, data))
+
+
+def publish_many(events):
+    """
+    Добавить пачку событий одним конвейером Redis после фиксации текущей транзакции.
+
+    :param events: список пар (тип, данные)
+    """
+    if events:
+        transaction.on_commit(lambda: _xadd_many(events))
+
+
+def _decode(entry_id, fields):
+    fields = {key.decode(): value.decode() for key, value in fields.items()}
+    return {
+        'id': entry_id.decode(),
+        'type': fields['type'],
+        'data': json.loads(fields['data']),
+        'ts': float(fields['ts']),
+    }
+
+
+def ensure_group(group):
+    """
+    Создать группу потребителей, если ее нет. Группа читает события, добавленные после создания.
+    """
+    try:
+        _redis().xgroup_create(STREAM_KEY, group, id='$', mkstream=True)
+    except ResponseError as error:
+        if 'BUSYGROUP' not in str(error):
+            raise
+
+
+def read(group, consumer_name, count=None, block=None, pending=False):
+    """
+    Прочитать пачку событий группы.
+
+    :param pending: прочитать ранее полученные, но не подтвержденные этим потребителем события
+    """
+    count = count or settings.EVENTS_CONSUMER_BATCH_SIZE
+    response = _redis().xreadgroup(group, consumer_name, {STREAM_KEY: '0' if pending else '>'},
+                                   count=count, block=None if pending else block)
+    if not response:
+        return []
+    return [_decode(entry_id, fields) for entry_id, fields in response[0][1] if fields]
+
+
+def ack(group, events):
+    if events:
+        _redis().xack(STREAM_KEY, group, *[event['id'] for event in events])
+
+
+def dead_letter(group, consumer_name):
+    """
+    Подтвердить и перенести в DEAD_LETTER_KEY события потребителя, полученные
+    EVENTS_CONSUMER_MAX_DELIVERIES раз и так и не обработанные.
+
+    :return: количество перенесенных событий
+    """
+    connection = _redis()
+    pending = connection.xpending_range(STREAM_KEY, group, min='-', max='+',
+                                        count=settings.EVENTS_CONSUMER_BATCH_SIZE, consumername=consumer_name)
+    failed = [entry for entry in pending if entry['times_delivered'] >= settings.EVENTS_CONSUMER_MAX_DELIVERIES]
+    for entry in failed:
+        entry_id = entry['message_id']
+        # Событие могло быть вытеснено из потока по EVENTS_STREAM_MAXLEN
+        entries = connection.xrange(STREAM_KEY, min=entry_id, max=entry_id)
+        fields = (entries[0][1] if entries else None) or {}
+
+        pipe = connection.pipeline()
+        pipe.xadd(DEAD_LETTER_KEY, {**fields, 'id': entry_id, 'group': group,
+                                    'deliveries': entry['times_delivered']},
+                  maxlen=settings.EVENTS_STREAM_MAXLEN, approximate=True)
+        pipe.xack(STREAM_KEY, group, entry_id)
+        pipe.execute()
+        logger.error('Событие %s не обработано группой %s за %s попыток и перенесено в %s',
+                     entry_id.decode() if isinstance(entry_id, bytes) else entry_id, group,
+                     entry['times_delivered'], DEAD_LETTER_KEY)
+    return len(failed)
+
+
+def process(group, consumer_name, handler, count=None, block=None, pending=False):
+    """
+    Обработать одну пачку событий и подтвердить ее.
+    Если обработчик упал, исключение пробрасывается, а события остаются неподтвержденными.
+
+    :return: количество обработанных событий
+    """
+    events = read(group, consumer_name, count=count, block=block, pending=pending)
+    if events:
+        handler(events)
+        ack(group, events)
+    return len(events)
+
+
+def run(group, consumer_name, count=None, block=None, once=False, retry_interval=1.0):
+    """
+    Обрабатывать события группы, начиная с неподтвержденных.
+    """
+    handler = load_consumers()[group]
+    block = block if block is not None else settings.EVENTS_CONSUMER_BLOCK
+    ensure_group(group)
+
+    # Сначала дочитываем то, что этот потребитель получил, но не подтвердил
+    pending = True
+    # После ошибки неподтвержденные события повторяются по одному
+    isolate = False
+    while True:
+        if pending:
+            dead_letter(group, consumer_name)
+        try:
+            processed = process(group, consumer_name, handler, count=1 if isolate else count, block=block,
+                                pending=pending)
+        except Exception:
+            logger.exception('Ошибка обработки событий группой %s', group)
+            if once:
+                raise
+            pending = isolate = True
+            time.sleep(retry_interval)
+            continue
+
+        if pending and not processed:
+            pending = isolate = False
+        elif once and not processed:
+            return
+
+
+def status():
+    """
+    Состояние групп: количество неподтвержденных событий и отставание от конца потока,
+    а также количество необработанных событий в DEAD_LETTER_KEY.
+    """
+    connection = _redis()
+    dead = connection.xlen(DEAD_LETTER_KEY)
+    if not connection.exists(STREAM_KEY):
+        return {'length': 0, 'dead': dead, 'groups': []}
+
+    groups = []
+    for group in connection.xinfo_groups(STREAM_KEY):
+        name = group['name'].decode() if isinstance(group['name'], bytes) else group['name']
+        lag = group.get('lag')
+        if lag is None:
+            # До Redis 7 отставание не отдается в XINFO, считаем его по потоку
+            last_id = group['last-delivered-id']
+            last_id = last_id.decode() if isinstance(last_id, bytes) else last_id
+            lag = len(connection.xrange(STREAM_KEY, min=f'({last_id}', count=LAG_SCAN_LIMIT))
+        groups.append({
+            'name': name,
+            'consumers': group['consumers'],
+            'pending': group['pending'],
+            'lag': lag,
+        })
+    return {'length': connection.xlen(STREAM_KEY), 'dead': dead, 'groups': groups}
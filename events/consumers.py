@@ -0,0 +1,16 @@
+"""
+Потребители шины событий приложения events.
+"""
+from .bus import consumer
+from .webhooks import WebhookDeliveryPool, build_deliveries
+
+
+@consumer('webhooks')
+def deliver_webhooks(events):
+    """
+    Доставить смены статусов броней подписчикам вебхуков.
+    Недоставленные после всех попыток пачки записываются в лог и не задерживают поток.
+    """
+    deliveries = build_deliveries(events)
+    if deliveries:
+        WebhookDeliveryPool().deliver_sync(deliveries)
@@ -0,0 +1,59 @@
+"""
+Доставка изменений статусов пользователю в реальном времени.
+
+Обработчики сохранения публикуют событие в канал Redis pub/sub пользователя
+после фиксации транзакции, SSE-представление пересылает события из канала
+в открытое соединение.
+"""
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+from redis import asyncio as aioredis
+
+USER_CHANNEL = 'events:user:{}'
+
+
+def channel(user_id):
+    return USER_CHANNEL.format(user_id)
+
+
+def _message(event_type, data):
+    return json.dumps({'type': event_type, 'data': data}, default=str)
+
+
+def _publish(user_id, event_type, data):
+    get_redis_connection('default').publish(channel(user_id), _message(event_type, data))
+
+
+def _publish_many(messages):
+    pipe = get_redis_connection('default').pipeline(transaction=False)
+    for user_id, event_type, data in messages:
+        pipe.publish(channel(user_id), _message(event_type, data))
+    pipe.execute()
+
+
+def publish_to_user(user_id, event_type, **data):
+    """
+    Отправить событие пользователю после фиксации текущей транзакции.
+    Если соединение с пользователем не открыто, событие теряется.
+    """
+    transaction.on_commit(lambda: _publish(user_id, event_type, data))
+
+
+def publish_many(messages):
+    """
+    Отправить пачку событий одним конвейером Redis после фиксации текущей транзакции.
+
+    :param messages: список троек (id пользователя, тип, данные)
+    """
+    if messages:
+        transaction.on_commit(lambda: _publish_many(messages))
+
+
+def async_client():
+    """
+    Асинхронный клиент Redis для подписки на каналы в ASGI-представлениях.
+    """
+    return aioredis.from_url(settings.CACHES['default']['LOCATION'])
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from events import bus
+
+
+class Command(BaseCommand):
+    help = 'Показать длину потока событий, отставание групп потребителей и число необработанных событий.'
+
+    def handle(self, *args, **kwargs):
+        status = bus.status()
+        self.stdout.write(f"length: {status['length']}")
+        self.stdout.write(f"dead: {status['dead']}")
+        for group in status['groups']:
+            self.stdout.write(f"{group['name']}: consumers={group['consumers']} "
+                              f"pending={group['pending']} lag={group['lag']}")
@@ -0,0 +1,22 @@
+import socket
+
+from django.core.management.base import BaseCommand
+
+from events import bus
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывать события шины группой потребителей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('group', help='Имя группы потребителей.')
+        parser.add_argument('--consumer', default=None,
+                            help='Имя потребителя в группе, по умолчанию имя хоста.')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--block', type=int, default=None,
+                            help='Сколько миллисекунд ждать новых событий.')
+        parser.add_argument('--once', action='store_true', help='Обработать накопленное и завершиться.')
+
+    def handle(self, *args, **options):
+        bus.run(options['group'], options['consumer'] or socket.gethostname(),
+                count=options['batch_size'], block=options['block'], once=options['once'])
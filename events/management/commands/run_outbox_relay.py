@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events.outbox import relay
+
+
+class Command(BaseCommand):
+    help = 'Публиковать задачи из outbox в брокер Celery.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Пауза между опросами пустой таблицы в секундах.')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--once', action='store_true', help='Опубликовать накопленное и завершиться.')
+
+    def handle(self, *args, **options):
+        while True:
+            published = relay(options['batch_size'])
+            if published:
+                self.stdout.write(f'Опубликовано событий: {published}')
+
+            if options['once']:
+                break
+            if not published:
+                time.sleep(options['interval'])
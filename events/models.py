@@ -0,0 +1,40 @@
+from django.db import models
+
+from accounts.models import User
+
+
+class OutboxEvent(models.Model):
+    """
+    Вызов задачи Celery, записанный в той же транзакции, что и изменение данных.
+    Публикуется в брокер ретранслятором только после фиксации транзакции.
+    """
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class WebhookSubscription(models.Model):
+    """
+    Подписка внешней системы на события бронирований.
+    События доставляются пачками POST-запросом на url с подписью HMAC-SHA256.
+    """
+    EVENT_BOOKED_ACCEPTED = 'booked.accepted'
+    EVENT_BOOKED_CANCELLED = 'booked.cancelled'
+    EVENT_TYPES = [
+        (EVENT_BOOKED_ACCEPTED, 'Бронь подтверждена'),
+        (EVENT_BOOKED_CANCELLED, 'Бронь отклонена'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='webhook_subscriptions')
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=64)
+    # Пустой список - все события
+    event_types = models.JSONField(default=list, blank=True)
+    # Сколько запросов к этому адресу может выполняться одновременно
+    max_concurrency = models.PositiveSmallIntegerField(default=2)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def accepts(self, event_type):
+        return not self.event_types or event_type in self.event_types
@@ -0,0 +1,65 @@
+"""
+Transactional outbox для задач Celery.
+
+В пути запроса вызовы задач только записываются в таблицу OutboxEvent
+в текущей транзакции. Ретранслятор читает зафиксированные записи пачками,
+публикует их в брокер через одно соединение и удаляет. Время записи события
+передается в заголовке enqueued_at, поэтому ожидание задачи в метриках
+считается вместе со временем в outbox.
+"""
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+
+from monitoring.signals import ENQUEUED_AT_HEADER
+from .models import OutboxEvent
+
+
+def enqueue(task, *args, **kwargs):
+    """
+    Записать вызов задачи task(*args, **kwargs) в outbox.
+    """
+    return OutboxEvent.objects.create(task=task.name, args=list(args), kwargs=kwargs)
+
+
+def enqueue_many(task, calls):
+    """
+    Записать пачку вызовов задачи одним INSERT.
+
+    :param calls: список пар (args, kwargs)
+    """
+    return OutboxEvent.objects.bulk_create(
+        [OutboxEvent(task=task.name, args=list(args), kwargs=kwargs) for args, kwargs in calls]
+    )
+
+
+def relay(batch_size=None):
+    """
+    Опубликовать все накопленные события.
+
+    Записи блокируются через SKIP LOCKED, поэтому несколько ретрансляторов
+    могут работать параллельно, не публикуя одно событие дважды.
+
+    :return: количество опубликованных событий
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    published = 0
+
+    while True:
+        with transaction.atomic():
+            events = list(OutboxEvent.objects.order_by('id').select_for_update(skip_locked=True)[:batch_size])
+            if not events:
+                break
+
+            with current_app.producer_or_acquire() as producer:
+                for event in events:
+                    current_app.send_task(event.task, args=event.args, kwargs=event.kwargs, producer=producer,
+                                          headers={ENQUEUED_AT_HEADER: event.created_at.timestamp()})
+
+            OutboxEvent.objects.filter(id__in=[event.id for event in events]).delete()
+
+        published += len(events)
+        if len(events) < batch_size:
+            break
+
+    return published
@@ -0,0 +1,240 @@
+import http.server
+import json
+import threading
+import time
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from celery import current_app
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django_redis import get_redis_connection
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from accounts.tests import BaseUserTestCase
+from consultations.tasks import task_send_email_booked_create
+from events import bus, live, outbox, webhooks
+from events.models import OutboxEvent, WebhookSubscription
+from events.webhooks import SIGNATURE_HEADER
+
+
+class OutboxTestCase(BaseUserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.specialist = self.register_specialist()
+        self.user = self.register_user("testuser@gmail.com", "123", username='testuser')
+        OutboxEvent.objects.all().delete()
+
+    def test_booked_create_writes_outbox(self):
+        response = self.client.post('/consultation/',
+                                    data={'datetime': "2025-10-08 16:00", 'time_selection': "2", 'price': 1000},
+                                    HTTP_AUTHORIZATION=self.get_jwt(self.specialist))
+        self.assertEqual(response.status_code, 201)
+        consultation_id = response.data['data']['id']
+
+        response = self.client.post('/booked/',
+                                    data={'consultation': consultation_id,
+                                          "description": "test description"},
+                                    HTTP_AUTHORIZATION=self.get_jwt(self.user))
+        self.assertEqual(response.status_code, 201)
+
+        # Письмо о заявке отправляется по консультации, а не по брони
+        event = OutboxEvent.objects.get(task=task_send_email_booked_create.name)
+        self.assertEqual(event.args[0], consultation_id)
+
+    def test_relay(self):
+        outbox.enqueue_many(task_send_email_booked_create, [((i, None), {}) for i in range(5)])
+        created = list(OutboxEvent.objects.order_by('id').values_list('created_at', flat=True))
+
+        with mock.patch.object(current_app, 'producer_or_acquire'), \
+                mock.patch.object(current_app, 'send_task') as send_task:
+            self.assertEqual(outbox.relay(batch_size=2), 5)
+
+        self.assertEqual([call.args[0] for call in send_task.call_args_list],
+                         [task_send_email_booked_create.name] * 5)
+        self.assertEqual([call.kwargs['args'][0] for call in send_task.call_args_list], list(range(5)))
+        # Ожидание задачи считается от записи в outbox, а не от публикации
+        self.assertEqual([call.kwargs['headers']['enqueued_at'] for call in send_task.call_args_list],
+                         [value.timestamp() for value in created])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class EventBusTestCase(BaseUserTestCase):
+    def setUp(self):
+        super().setUp()
+        get_redis_connection('default').delete(bus.STREAM_KEY)
+        bus.ensure_group('cache-invalidation')
+        self.specialist = self.register_specialist()
+
+    def create_consultation(self, datetime="2025-10-08 16:00"):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/consultation/',
+                                        data={'datetime': datetime, 'time_selection': "2", 'price': 1000},
+                                        HTTP_AUTHORIZATION=self.get_jwt(self.specialist))
+        self.assertEqual(response.status_code, 201)
+        return response.data['data']['id']
+
+    def test_publish_on_commit(self):
+        consultation_id = self.create_consultation()
+
+        events = bus.read('cache-invalidation', 'test')
+        self.assertEqual(events[-1]['type'], 'consultation.saved')
+        self.assertEqual(events[-1]['data']['id'], consultation_id)
+        self.assertTrue(events[-1]['data']['created'])
+
+    def test_cache_invalidation_consumer(self):
+        cache.set('ConsultationList_list_cache_test', 'data')
+        for datetime in ["2025-10-08 16:00", "2025-10-09 16:00"]:
+            self.create_consultation(datetime)
+
+        bus.run('cache-invalidation', 'test', block=1, once=True)
+
+        self.assertIsNone(cache.get('ConsultationList_list_cache_test'))
+        group = next(group for group in bus.status()['groups'] if group['name'] == 'cache-invalidation')
+        self.assertEqual(group['pending'], 0)
+        self.assertEqual(group['lag'], 0)
+
+    @override_settings(EVENTS_CONSUMER_MAX_DELIVERIES=3)
+    def test_failed_event_moved_to_dead_letter(self):
+        connection = get_redis_connection('default')
+        connection.delete(bus.DEAD_LETTER_KEY)
+        bus.ensure_group('test-dead-letter')
+        bus._xadd('consultation.saved', {'id': 1})
+        bus._xadd('consultation.saved', {'id': 2})
+
+        handled = []
+
+        def handler(events):
+            if any(event['data']['id'] == 2 for event in events):
+                raise ValueError('broken event')
+            handled.extend(event['data']['id'] for event in events)
+
+        with mock.patch.dict(bus.consumers, {'test-dead-letter': handler}), \
+                mock.patch.object(bus, 'load_consumers', return_value=bus.consumers):
+            for _ in range(3):
+                with self.assertRaises(ValueError):
+                    bus.run('test-dead-letter', 'test', count=1, block=1, once=True)
+            bus.run('test-dead-letter', 'test', count=1, block=1, once=True)
+
+        self.assertEqual(handled, [1])
+        dead = connection.xrange(bus.DEAD_LETTER_KEY)
+        self.assertEqual(len(dead), 1)
+        self.assertEqual(json.loads(dead[0][1][b'data']), {'id': 2})
+        self.assertEqual(dead[0][1][b'group'], b'test-dead-letter')
+        self.assertEqual(connection.xpending(bus.STREAM_KEY, 'test-dead-letter')['pending'], 0)
+        connection.xgroup_destroy(bus.STREAM_KEY, 'test-dead-letter')
+
+
+class _WebhookHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            server.requests.append((json.loads(self.rfile.read(int(self.headers['Content-Length']))),
+                                    self.headers[SIGNATURE_HEADER]))
+            failing = server.failures > 0
+            server.failures -= 1
+        time.sleep(server.latency)
+        with server.lock:
+            server.active -= 1
+
+        self.send_response(503 if failing else 200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalWebhookServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, failures=0, latency=0.0):
+        super().__init__(('127.0.0.1', 0), _WebhookHandler)
+        self.failures = failures
+        self.latency = latency
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/hook'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
+
+
+class WebhookDeliveryTestCase(SimpleTestCase):
+    def create_event(self, booked_id, status, user_id=1, specialist_id=2):
+        return {'type': 'booked.saved', 'ts': time.time(),
+                'data': {'id': booked_id, 'user_id': user_id, 'consultation_id': 1, 'specialist_id': specialist_id,
+                         'status': status, 'previous_status': 'In processing', 'created': False}}
+
+    def test_coalesce(self):
+        events = webhooks.webhook_events([self.create_event(1, 'Booked'), self.create_event(1, 'Cancelled'),
+                                          self.create_event(2, 'Booked', user_id=3, specialist_id=4)])
+        self.assertEqual([event['type'] for event in events], ['booked.cancelled', 'booked.accepted'])
+
+        subscription = WebhookSubscription(id=1, user=User(id=1), url='http://localhost', secret='secret')
+        self.assertEqual(webhooks.coalesce(events, [subscription]), [(subscription, events[:1])])
+
+    def test_batched_delivery_with_retry(self):
+        with LocalWebhookServer(failures=2, latency=0.05) as server:
+            subscription = WebhookSubscription(id=1, user=User(id=1), url=server.url, secret='secret',
+                                               max_concurrency=1)
+            events = [{'type': 'booked.accepted', 'id': number} for number in range(5)]
+            pool = webhooks.WebhookDeliveryPool(batch_size=2, backoff=0.01, max_attempts=5)
+            results = pool.deliver_sync([(subscription, events)])
+
+        self.assertTrue(all(result.delivered for result in results))
+        self.assertEqual([result.events for result in results], [2, 2, 1])
+        self.assertEqual(len(server.requests), 5)
+        self.assertEqual(server.max_active, 1)
+
+        body, signature = server.requests[-1]
+        self.assertEqual(signature, webhooks.sign('secret', json.dumps(body).encode()))
+
+    def test_client_error_not_retried(self):
+        with LocalWebhookServer() as server:
+            subscription = WebhookSubscription(id=1, user=User(id=1), url=server.url + '/missing', secret='secret')
+            pool = webhooks.WebhookDeliveryPool(backoff=0.01, max_attempts=3)
+            with mock.patch.object(_WebhookHandler, 'do_POST', lambda handler: handler.send_error(404)):
+                [result] = pool.deliver_sync([(subscription, [{'type': 'booked.accepted', 'id': 1}])])
+
+        self.assertFalse(result.delivered)
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(result.status_code, 404)
+
+
+class EventStreamTestCase(BaseUserTestCase):
+    def test_requires_token(self):
+        response = self.client.get('/events/stream/')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/events/stream/', {'token': 'invalid'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_user_events(self):
+        user = await sync_to_async(self.register_user)()
+        token = str(AccessToken.for_user(user))
+
+        response = await self.async_client.get('/events/stream/', {'token': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+
+        # Подписка выполняется до первой порции ответа, поэтому событие не теряется
+        await sync_to_async(live._publish)(user.id, 'booked.status', {'id': 1, 'status': 'Booked'})
+        self.assertEqual(await anext(stream),
+                         b'event: booked.status\ndata: {"id": 1, "status": "Booked"}\n\n')
+        await stream.aclose()
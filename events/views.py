@@ -0,0 +1,57 @@
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from consultation_planning_service.async_utils import authenticate
+from . import live
+
+
+def _error(message, status):
+    return JsonResponse({'status': 'error', 'data': {}, 'errors': {'detail': [message]}}, status=status)
+
+
+def _format(event_type, data):
+    return f'event: {event_type}\ndata: {data}\n\n'
+
+
+async def _stream(user):
+    client = live.async_client()
+    pubsub = client.pubsub()
+    await pubsub.subscribe(live.channel(user.id))
+    try:
+        yield f'retry: {settings.EVENTS_SSE_RETRY}\n\n'
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                               timeout=settings.EVENTS_SSE_HEARTBEAT)
+            if message is None:
+                # Комментарий не дает прокси закрыть неактивное соединение
+                yield ': heartbeat\n\n'
+                continue
+
+            event = json.loads(message['data'])
+            yield _format(event['type'], json.dumps(event['data']))
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
+
+
+@transaction.non_atomic_requests
+@require_GET
+async def event_stream(request):
+    """
+    Поток Server-Sent Events с изменениями статусов броней и заявок пользователя.
+    Токен передается в заголовке Authorization или параметром ?token=.
+    Работает только под ASGI-сервером.
+    """
+    user = await authenticate(request)
+    if user is None:
+        return _error('Учетные данные не были предоставлены или недействительны.', 401)
+
+    response = StreamingHttpResponse(_stream(user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
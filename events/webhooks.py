@@ -0,0 +1,198 @@
+"""
+Доставка событий бронирований во внешние системы по вебхукам.
+
+События из шины сначала группируются по подпискам: каждая подписка получает
+все свои события одной пачкой (или несколькими, если событий больше
+WEBHOOKS_BATCH_SIZE). Пачки отправляются асинхронным пулом с общим
+ограничением числа одновременных запросов и отдельным ограничением на адрес.
+Неудачные запросы повторяются с экспоненциальной задержкой.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass
+
+import httpx
+from django.conf import settings
+from django.db.models import Q
+
+from .models import WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Webhook-Signature'
+
+# Ответы, после которых повтор имеет смысл
+RETRY_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+BOOKED_EVENT_TYPES = {
+    'Booked': WebhookSubscription.EVENT_BOOKED_ACCEPTED,
+    'Cancelled': WebhookSubscription.EVENT_BOOKED_CANCELLED,
+}
+
+
+@dataclass
+class DeliveryResult:
+    subscription_id: int
+    events: int
+    attempts: int
+    delivered: bool
+    status_code: int = None
+
+
+def sign(secret, body):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def webhook_events(events):
+    """
+    Выбрать из событий шины смены статуса брони, о которых сообщается по вебхукам.
+    Повторные изменения одной брони в пачке схлопываются в последнее.
+    """
+    result = {}
+    for event in events:
+        data = event['data']
+        if event['type'] != 'booked.saved' or data.get('status') == data.get('previous_status'):
+            continue
+
+        webhook_type = BOOKED_EVENT_TYPES.get(data.get('status'))
+        if webhook_type is None:
+            continue
+
+        result[data['id']] = {
+            'type': webhook_type,
+            'id': data['id'],
+            'consultation_id': data['consultation_id'],
+            'user_id': data['user_id'],
+            'specialist_id': data['specialist_id'],
+            'status': data['status'],
+            'ts': event['ts'],
+        }
+    return list(result.values())
+
+
+def coalesce(events, subscriptions):
+    """
+    Сгруппировать события по подпискам.
+
+    Подписка сотрудника получает все события, подписка пользователя -
+    события его броней и броней на его консультации.
+
+    :return: список пар (подписка, события)
+    """
+    deliveries = []
+    for subscription in subscriptions:
+        selected = [
+            event for event in events
+            if subscription.accepts(event['type']) and (
+                subscription.user.is_staff or subscription.user_id in (event['user_id'], event['specialist_id'])
+            )
+        ]
+        if selected:
+            deliveries.append((subscription, selected))
+    return deliveries
+
+
+def build_deliveries(events):
+    """
+    Пачки доставок для событий шины. Подписки загружаются одним запросом.
+    """
+    events = webhook_events(events)
+    if not events:
+        return []
+
+    user_ids = {event['user_id'] for event in events} | {event['specialist_id'] for event in events}
+    subscriptions = (WebhookSubscription.objects
+                     .filter(is_active=True)
+                     .filter(Q(user__is_staff=True) | Q(user_id__in=user_ids))
+                     .select_related('user'))
+    return coalesce(events, subscriptions)
+
+
+class WebhookDeliveryPool:
+    """
+    Асинхронный пул доставки вебхуков.
+
+    :param max_connections: сколько запросов выполняется одновременно всего
+    :param max_attempts: сколько раз пробовать доставить пачку
+    :param backoff: начальная задержка между попытками, удваивается с каждой попыткой
+    """
+
+    def __init__(self, max_connections=None, max_attempts=None, backoff=None, backoff_max=None,
+                 timeout=None, batch_size=None, transport=None):
+        self.max_connections = max_connections or settings.WEBHOOKS_MAX_CONNECTIONS
+        self.max_attempts = max_attempts or settings.WEBHOOKS_MAX_ATTEMPTS
+        self.backoff = backoff if backoff is not None else settings.WEBHOOKS_BACKOFF
+        self.backoff_max = backoff_max or settings.WEBHOOKS_BACKOFF_MAX
+        self.timeout = timeout or settings.WEBHOOKS_TIMEOUT
+        self.batch_size = batch_size or settings.WEBHOOKS_BATCH_SIZE
+        self.transport = transport
+
+        self._semaphore = None
+        self._endpoints = {}
+
+    def _endpoint_semaphore(self, subscription):
+        if subscription.url not in self._endpoints:
+            self._endpoints[subscription.url] = asyncio.Semaphore(max(subscription.max_concurrency, 1))
+        return self._endpoints[subscription.url]
+
+    def _delay(self, attempt):
+        delay = min(self.backoff * 2 ** (attempt - 1), self.backoff_max)
+        return delay * random.uniform(0.5, 1)
+
+    async def _send(self, client, subscription, events):
+        body = json.dumps({'events': events}, default=str).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            SIGNATURE_HEADER: sign(subscription.secret, body),
+        }
+
+        status_code = None
+        for attempt in range(1, self.max_attempts + 1):
+            async with self._semaphore, self._endpoint_semaphore(subscription):
+                try:
+                    response = await client.post(subscription.url, content=body, headers=headers)
+                    status_code = response.status_code
+                except httpx.HTTPError as error:
+                    status_code = None
+                    logger.warning('Вебхук %s недоступен: %s', subscription.url, error)
+
+            if status_code is not None and status_code < 300:
+                return DeliveryResult(subscription.id, len(events), attempt, True, status_code)
+            if status_code is not None and status_code not in RETRY_STATUS_CODES:
+                break
+            if attempt < self.max_attempts:
+                await asyncio.sleep(self._delay(attempt))
+
+        logger.error('Вебхук %s не доставлен, событий: %s', subscription.url, len(events))
+        return DeliveryResult(subscription.id, len(events), attempt, False, status_code)
+
+    async def deliver(self, deliveries):
+        """
+        Отправить пачки событий.
+
+        :param deliveries: список пар (подписка, события)
+        :return: список DeliveryResult
+        """
+        self._semaphore = asyncio.Semaphore(self.max_connections)
+        self._endpoints = {}
+
+        limits = httpx.Limits(max_connections=self.max_connections)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits, transport=self.transport) as client:
+            jobs = [
+                self._send(client, subscription, events[start:start + self.batch_size])
+                for subscription, events in deliveries
+                for start in range(0, len(events), self.batch_size)
+            ]
+            return await asyncio.gather(*jobs)
+
+    def deliver_sync(self, deliveries):
+        started = time.perf_counter()
+        results = asyncio.run(self.deliver(deliveries))
+        logger.info('Доставлено пачек вебхуков: %s из %s за %.3f с',
+                    sum(result.delivered for result in results), len(results), time.perf_counter() - started)
+        return results
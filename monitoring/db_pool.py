@@ -0,0 +1,111 @@
+"""
+Метрики пулов соединений с БД.
+
+Пул у каждого процесса свой, поэтому процессы веб-сервера и воркеры Celery
+периодически сбрасывают накопленные счетчики пула (psycopg_pool pop_stats)
+в общий хэш Redis monitoring:db_pool:<alias>, а текущий размер пула и очередь
+ожидания - в хэш monitoring:db_pool:<alias>:processes по процессам.
+"""
+import json
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.db import connections
+from django_redis import get_redis_connection
+
+POOL_KEY = 'monitoring:db_pool:{}'
+PROCESSES_KEY = 'monitoring:db_pool:{}:processes'
+
+# Накапливаемые счетчики, суммируются по всем процессам
+COUNTERS = (
+    'requests_num', 'requests_queued', 'requests_wait_ms', 'requests_errors', 'usage_ms', 'returns_bad',
+    'connections_num', 'connections_ms', 'connections_errors', 'connections_lost',
+)
+# Текущие значения отдельного процесса
+GAUGES = ('pool_min', 'pool_max', 'pool_size', 'pool_available', 'requests_waiting')
+
+_last_recorded = 0.0
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def _process():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def local_pools():
+    """
+    Пулы, уже открытые в текущем процессе. Обращение к connection.pool создает пул,
+    поэтому берем только созданные.
+    """
+    pools = {}
+    for alias in connections:
+        pool = getattr(connections[alias], '_connection_pools', {}).get(alias)
+        if pool is not None:
+            pools[alias] = pool
+    return pools
+
+
+def record():
+    """
+    Записать накопленные с прошлой записи метрики пулов текущего процесса.
+    """
+    pipe = _redis().pipeline(transaction=False)
+    for alias, pool in local_pools().items():
+        stats = pool.pop_stats()
+        for counter in COUNTERS:
+            if stats.get(counter):
+                pipe.hincrby(POOL_KEY.format(alias), counter, stats[counter])
+
+        gauges = {gauge: stats.get(gauge, 0) for gauge in GAUGES}
+        gauges['recorded_at'] = time.time()
+        pipe.hset(PROCESSES_KEY.format(alias), _process(), json.dumps(gauges))
+    pipe.execute()
+
+
+def maybe_record():
+    """
+    Записать метрики, если с прошлой записи прошло DB_POOL_STATS_INTERVAL секунд.
+    """
+    global _last_recorded
+
+    now = time.monotonic()
+    if now - _last_recorded < settings.DB_POOL_STATS_INTERVAL:
+        return
+    _last_recorded = now
+    record()
+
+
+def get_stats():
+    """
+    Метрики пулов по всем процессам. Процессы, не писавшие метрики дольше
+    трех интервалов, считаются завершенными и пропускаются.
+    """
+    connection = _redis()
+    stale = time.time() - 3 * settings.DB_POOL_STATS_INTERVAL
+
+    result = {}
+    for alias in connections:
+        counters = {key.decode(): int(value) for key, value in connection.hgetall(POOL_KEY.format(alias)).items()}
+        processes = {}
+        for process, raw in connection.hgetall(PROCESSES_KEY.format(alias)).items():
+            gauges = json.loads(raw)
+            if gauges.pop('recorded_at') >= stale:
+                processes[process.decode()] = gauges
+
+        if not counters and not processes:
+            continue
+
+        requests = counters.get('requests_num', 0)
+        counters['avg_wait_ms'] = counters.get('requests_wait_ms', 0) / requests if requests else 0.0
+        result[alias] = {'counters': counters, 'processes': processes}
+    return result
+
+
+def reset():
+    connection = _redis()
+    connection.delete(*[key.format(alias) for alias in connections for key in (POOL_KEY, PROCESSES_KEY)])
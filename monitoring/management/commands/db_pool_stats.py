@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from monitoring import db_pool
+
+
+class Command(BaseCommand):
+    help = 'Показать метрики пулов соединений с БД веб-сервера и воркеров Celery.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Удалить накопленные метрики')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['reset']:
+            db_pool.reset()
+            self.stdout.write('Метрики удалены.')
+            return
+
+        for alias, stats in db_pool.get_stats().items():
+            self.stdout.write(self.style.MIGRATE_HEADING(alias))
+            counters = stats['counters']
+            self.stdout.write(f"  requests={counters.get('requests_num', 0)} "
+                              f"queued={counters.get('requests_queued', 0)} "
+                              f"avg_wait={counters['avg_wait_ms']:.2f}ms "
+                              f"errors={counters.get('requests_errors', 0)}")
+            self.stdout.write(f"  connections={counters.get('connections_num', 0)} "
+                              f"lost={counters.get('connections_lost', 0)} "
+                              f"errors={counters.get('connections_errors', 0)}")
+            for process, gauges in sorted(stats['processes'].items()):
+                self.stdout.write(f"  {process}: size={gauges['pool_size']}/{gauges['pool_max']} "
+                                  f"available={gauges['pool_available']} waiting={gauges['requests_waiting']}")
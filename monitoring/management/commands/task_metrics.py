@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from monitoring import metrics
+
+
+class Command(BaseCommand):
+    help = 'Показать время ожидания в очереди и выполнения задач Celery.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', help='Имя задачи, по умолчанию все задачи')
+        parser.add_argument('--buckets', action='store_true', help='Вывести гистограммы по бакетам')
+        parser.add_argument('--reset', action='store_true', help='Удалить накопленные метрики')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['reset']:
+            metrics.reset()
+            self.stdout.write('Метрики удалены.')
+            return
+
+        if kwargs['task']:
+            data = {kwargs['task']: metrics.get_task_metrics(kwargs['task'])}
+        else:
+            data = metrics.get_metrics()
+
+        for task_name, task_metrics in data.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(task_name))
+            self.stdout.write(' '.join(f'{counter}={task_metrics[counter]}' for counter in metrics.COUNTERS))
+
+            for histogram in metrics.HISTOGRAMS:
+                values = task_metrics[histogram]
+                avg = f"{values['avg']:.3f}" if values['avg'] is not None else '-'
+                self.stdout.write(f"  {histogram}: count={values['count']} avg={avg}s "
+                                  f"p50<={values['p50']} p95<={values['p95']} p99<={values['p99']}")
+                if kwargs['buckets']:
+                    for bound in (*metrics.BUCKETS, metrics.INF):
+                        if values['buckets'].get(bound):
+                            self.stdout.write(f"    <= {bound}: {values['buckets'][bound]}")
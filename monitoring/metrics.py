@@ -0,0 +1,136 @@
+"""
+Метрики задач Celery в Redis.
+
+Для каждой задачи хранится хэш monitoring:task:<имя задачи> с гистограммами
+ожидания в очереди (latency) и времени выполнения (runtime), а также
+счетчиками успешных запусков, повторов и ошибок. Гистограмма хранится
+некумулятивно: каждое наблюдение увеличивает ровно один бакет.
+"""
+import bisect
+
+from django_redis import get_redis_connection
+
+TASKS_KEY = 'monitoring:tasks'
+TASK_KEY = 'monitoring:task:{}'
+
+LATENCY = 'latency'
+RUNTIME = 'runtime'
+HISTOGRAMS = (LATENCY, RUNTIME)
+
+SUCCEEDED = 'succeeded'
+RETRIED = 'retried'
+FAILED = 'failed'
+COUNTERS = (SUCCEEDED, RETRIED, FAILED)
+
+# Верхние границы бакетов в секундах, последний бакет - все, что больше
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+INF = '+Inf'
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def bucket_for(seconds):
+    """
+    Граница бакета, в который попадает наблюдение.
+    """
+    index = bisect.bisect_left(BUCKETS, seconds)
+    return BUCKETS[index] if index < len(BUCKETS) else INF
+
+
+def quantile(buckets, q):
+    """
+    Оценка квантиля q по гистограмме - верхняя граница бакета, в котором он находится.
+
+    :param buckets: словарь {граница бакета: количество наблюдений}
+    """
+    total = sum(buckets.values())
+    if not total:
+        return None
+
+    rank = q * total
+    seen = 0
+    for bound in (*BUCKETS, INF):
+        seen += buckets.get(bound, 0)
+        if seen >= rank:
+            return bound
+    return INF
+
+
+def observe(task_name, histogram, seconds):
+    """
+    Записать наблюдение в гистограмму задачи.
+    """
+    key = TASK_KEY.format(task_name)
+    pipe = _redis().pipeline(transaction=False)
+    pipe.sadd(TASKS_KEY, task_name)
+    pipe.hincrby(key, f'{histogram}:{bucket_for(seconds)}', 1)
+    pipe.hincrby(key, f'{histogram}:count', 1)
+    pipe.hincrbyfloat(key, f'{histogram}:sum', seconds)
+    pipe.execute()
+
+
+def incr(task_name, counter):
+    """
+    Увеличить счетчик задачи.
+    """
+    pipe = _redis().pipeline(transaction=False)
+    pipe.sadd(TASKS_KEY, task_name)
+    pipe.hincrby(TASK_KEY.format(task_name), counter, 1)
+    pipe.execute()
+
+
+def _parse(raw):
+    result = {counter: 0 for counter in COUNTERS}
+    for histogram in HISTOGRAMS:
+        result[histogram] = {'count': 0, 'sum': 0.0, 'buckets': {}}
+
+    for field, value in raw.items():
+        field = field.decode()
+        if field in COUNTERS:
+            result[field] = int(value)
+            continue
+
+        histogram, name = field.split(':', 1)
+        if name == 'sum':
+            result[histogram]['sum'] = float(value)
+        elif name == 'count':
+            result[histogram]['count'] = int(value)
+        else:
+            bound = INF if name == INF else float(name)
+            result[histogram]['buckets'][bound] = int(value)
+
+    for histogram in HISTOGRAMS:
+        data = result[histogram]
+        data['avg'] = data['sum'] / data['count'] if data['count'] else None
+        for q in (0.5, 0.95, 0.99):
+            data[f'p{int(q * 100)}'] = quantile(data['buckets'], q)
+    return result
+
+
+def get_task_metrics(task_name):
+    """
+    Метрики одной задачи: гистограммы с квантилями и счетчики.
+    """
+    return _parse(_redis().hgetall(TASK_KEY.format(task_name)))
+
+
+def get_metrics():
+    """
+    Метрики всех задач, по которым есть наблюдения.
+    """
+    task_names = sorted(name.decode() for name in _redis().smembers(TASKS_KEY))
+    pipe = _redis().pipeline(transaction=False)
+    for task_name in task_names:
+        pipe.hgetall(TASK_KEY.format(task_name))
+    return {task_name: _parse(raw) for task_name, raw in zip(task_names, pipe.execute())}
+
+
+def reset():
+    """
+    Удалить все накопленные метрики.
+    """
+    connection = _redis()
+    task_names = [name.decode() for name in connection.smembers(TASKS_KEY)]
+    connection.delete(TASKS_KEY, *[TASK_KEY.format(task_name) for task_name in task_names])
@@ -0,0 +1,73 @@
+"""
+Сбор метрик задач через сигналы Celery.
+
+При публикации в заголовки сообщения добавляется время постановки в очередь,
+по которому воркер считает ожидание в очереди. Задачи из outbox приходят с
+временем записи события, и ожидание считается от него. Время выполнения считается
+между task_prerun и task_postrun. Ошибки записи метрик не влияют на задачи.
+
+После запросов и задач процесс периодически записывает метрики своего пула соединений с БД.
+"""
+import logging
+import time
+
+from celery.signals import before_task_publish, task_failure, task_postrun, task_prerun, task_retry
+from django.core.signals import request_finished
+from django.dispatch import receiver
+
+from . import db_pool, metrics
+
+logger = logging.getLogger(__name__)
+
+ENQUEUED_AT_HEADER = 'enqueued_at'
+
+# Время начала выполнения по id задачи в текущем процессе воркера
+_started = {}
+
+
+def _record(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Не удалось записать метрики задачи')
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+@task_prerun.connect
+def record_latency(task_id=None, task=None, **kwargs):
+    now = time.time()
+    _started[task_id] = time.perf_counter()
+
+    enqueued_at = getattr(task.request, ENQUEUED_AT_HEADER, None)
+    if enqueued_at is not None:
+        _record(metrics.observe, task.name, metrics.LATENCY, max(now - float(enqueued_at), 0))
+
+
+@task_postrun.connect
+def record_runtime(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is not None:
+        _record(metrics.observe, task.name, metrics.RUNTIME, time.perf_counter() - started)
+    if state == 'SUCCESS':
+        _record(metrics.incr, task.name, metrics.SUCCEEDED)
+
+
+@task_retry.connect
+def record_retry(sender=None, **kwargs):
+    _record(metrics.incr, sender.name, metrics.RETRIED)
+
+
+@task_failure.connect
+def record_failure(sender=None, **kwargs):
+    _record(metrics.incr, sender.name, metrics.FAILED)
+
+
+@task_postrun.connect
+@receiver(request_finished)
+def record_db_pool(**kwargs):
+    _record(db_pool.maybe_record)
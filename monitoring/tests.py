@@ -0,0 +1,120 @@
+import json
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+from psycopg_pool import ConnectionPool
+
+from . import db_pool, metrics
+
+
+class TaskMetricsTestCase(SimpleTestCase):
+    def test_bucket_for(self):
+        self.assertEqual(metrics.bucket_for(0.001), 0.005)
+        self.assertEqual(metrics.bucket_for(0.1), 0.1)
+        self.assertEqual(metrics.bucket_for(0.3), 0.5)
+        self.assertEqual(metrics.bucket_for(1000), metrics.INF)
+
+    def test_quantile(self):
+        buckets = {0.01: 90, 1: 9, metrics.INF: 1}
+        self.assertEqual(metrics.quantile(buckets, 0.5), 0.01)
+        self.assertEqual(metrics.quantile(buckets, 0.95), 1)
+        self.assertEqual(metrics.quantile(buckets, 1), metrics.INF)
+        self.assertIsNone(metrics.quantile({}, 0.5))
+
+    def test_parse(self):
+        raw = {b'latency:0.01': b'3', b'latency:+Inf': b'1', b'latency:count': b'4', b'latency:sum': b'400.02',
+               b'succeeded': b'4', b'failed': b'1'}
+        result = metrics._parse(raw)
+        self.assertEqual(result['succeeded'], 4)
+        self.assertEqual(result['retried'], 0)
+        self.assertEqual(result['latency']['p50'], 0.01)
+        self.assertEqual(result['latency']['p99'], metrics.INF)
+        self.assertAlmostEqual(result['latency']['avg'], 100.005)
+        self.assertEqual(result['runtime']['count'], 0)
+
+
+class DbPoolTestCase(SimpleTestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        patcher = patch.object(db_pool, '_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pool_checks_connections(self):
+        # Пул создается без открытия соединений
+        pool = connections['default'].pool
+        self.assertIs(pool._check, ConnectionPool.check_connection)
+
+    def test_record(self):
+        pool = MagicMock()
+        pool.pop_stats.return_value = {'requests_num': 3, 'requests_wait_ms': 12, 'requests_errors': 0,
+                                       'pool_min': 2, 'pool_max': 10, 'pool_size': 4, 'pool_available': 1}
+        with patch.object(db_pool, 'local_pools', return_value={'default': pool}), \
+                patch.object(db_pool, '_process', return_value='web:1'):
+            db_pool.record()
+
+        pipe = self.redis.pipeline.return_value
+        # Нулевые счетчики не пишутся
+        pipe.hincrby.assert_any_call('monitoring:db_pool:default', 'requests_num', 3)
+        pipe.hincrby.assert_any_call('monitoring:db_pool:default', 'requests_wait_ms', 12)
+        self.assertEqual(pipe.hincrby.call_count, 2)
+
+        key, process, raw = pipe.hset.call_args.args
+        gauges = json.loads(raw)
+        self.assertEqual((key, process), ('monitoring:db_pool:default:processes', 'web:1'))
+        self.assertEqual(gauges['pool_size'], 4)
+        self.assertEqual(gauges['requests_waiting'], 0)
+        pipe.execute.assert_called_once()
+
+    @override_settings(DB_POOL_STATS_INTERVAL=10)
+    def test_maybe_record(self):
+        with patch.object(db_pool, 'record') as record, patch.object(db_pool, '_last_recorded', 0.0), \
+                patch.object(db_pool.time, 'monotonic', side_effect=[100.0, 105.0, 111.0]):
+            db_pool.maybe_record()
+            db_pool.maybe_record()
+            db_pool.maybe_record()
+        self.assertEqual(record.call_count, 2)
+
+    @override_settings(DB_POOL_STATS_INTERVAL=10)
+    def test_get_stats(self):
+        now = 1000.0
+        gauges = {'pool_min': 2, 'pool_max': 10, 'pool_size': 4, 'pool_available': 1, 'requests_waiting': 0}
+        data = {
+            'monitoring:db_pool:default': {b'requests_num': b'4', b'requests_wait_ms': b'10'},
+            'monitoring:db_pool:default:processes': {
+                b'web:1': json.dumps({**gauges, 'recorded_at': now - 5}).encode(),
+                # Процесс не писал метрики дольше трех интервалов
+                b'web:2': json.dumps({**gauges, 'recorded_at': now - 31}).encode(),
+            },
+        }
+        self.redis.hgetall.side_effect = lambda key: data.get(key, {})
+        with patch.object(db_pool.time, 'time', return_value=now):
+            stats = db_pool.get_stats()
+
+        self.assertEqual(list(stats), ['default'])
+        self.assertEqual(stats['default']['counters']['requests_num'], 4)
+        self.assertEqual(stats['default']['counters']['avg_wait_ms'], 2.5)
+        self.assertEqual(stats['default']['processes'], {'web:1': gauges})
+
+    def test_db_pool_stats_command(self):
+        stats = {'default': {
+            'counters': {'requests_num': 4, 'requests_wait_ms': 10, 'avg_wait_ms': 2.5},
+            'processes': {'web:1': {'pool_min': 2, 'pool_max': 10, 'pool_size': 4, 'pool_available': 1,
+                                    'requests_waiting': 0}},
+        }}
+        out = StringIO()
+        with patch.object(db_pool, 'get_stats', return_value=stats):
+            call_command('db_pool_stats', stdout=out)
+        output = out.getvalue()
+        self.assertIn('requests=4 queued=0 avg_wait=2.50ms errors=0', output)
+        self.assertIn('web:1: size=4/10 available=1 waiting=0', output)
+
+    def test_db_pool_stats_reset(self):
+        out = StringIO()
+        with patch.object(db_pool, 'reset') as reset:
+            call_command('db_pool_stats', '--reset', stdout=out)
+        reset.assert_called_once()
+        self.assertIn('Метрики удалены.', out.getvalue())
@@ -0,0 +1,108 @@
+"""
+Замер пропускной способности отправки писем на локальном SMTP-сервере.
+
+Сравнивает отправку каждого письма отдельным соединением (msg.send())
+с пакетной отправкой через NotificationDispatcher.
+"""
+import socketserver
+import threading
+import time
+
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.smtp import EmailBackend
+
+from .dispatcher import NotificationDispatcher
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Минимальная реализация SMTP: принимает и отбрасывает письма.
+    """
+
+    def handle(self):
+        self.server.connections += 1
+        if self.server.connect_latency:
+            # Имитация установки соединения с реальным SMTP-сервером (TCP, TLS, авторизация)
+            time.sleep(self.server.connect_latency)
+        self.wfile.write(b'220 localhost ESMTP\r\n')
+
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line == b'.\r\n':
+                    in_data = False
+                    self.server.received += 1
+                    self.wfile.write(b'250 OK\r\n')
+                continue
+
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.wfile.write(b'250 localhost\r\n')
+            elif command == b'DATA':
+                in_data = True
+                self.wfile.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+            elif command == b'QUIT':
+                self.wfile.write(b'221 Bye\r\n')
+                break
+            else:
+                self.wfile.write(b'250 OK\r\n')
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Локальный SMTP-сервер для тестов и замеров. Считает соединения и принятые письма.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_latency=0.0):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.received = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
+
+    def backend(self):
+        return EmailBackend(host='127.0.0.1', port=self.port, use_tls=False, use_ssl=False)
+
+
+def _message(number):
+    message = EmailMultiAlternatives(subject=f'Benchmark {number}', body='text',
+                                     from_email='benchmark@localhost', to=['user@localhost'])
+    message.attach_alternative('<b>html</b>', 'text/html')
+    return message
+
+
+def run_benchmark(count=500, batch_size=100, connect_latency=0.0):
+    """
+    :return: словарь {режим: писем в секунду}
+    """
+    results = {}
+
+    with LocalSMTPServer(connect_latency) as server:
+        started = time.perf_counter()
+        for number in range(count):
+            server.backend().send_messages([_message(number)])
+        results['single'] = count / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with NotificationDispatcher(batch_size=batch_size, flush_interval=60,
+                                    connection=server.backend(), record_metrics=False) as dispatcher:
+            for number in range(count):
+                dispatcher.add(_message(number))
+        results['batched'] = count / (time.perf_counter() - started)
+
+    return results
@@ -0,0 +1,187 @@
+"""
+Пакетная отправка писем с переиспользованием SMTP-соединения.
+
+Задачи уведомлений не отправляют письма сами, а кладут их в очередь Redis.
+Периодическая задача (или заполнение очереди до NOTIFICATIONS_BATCH_SIZE)
+забирает письма пачками и отправляет их через одно соединение send_messages.
+Неотправленные письма возвращаются в конец очереди со счетчиком попыток, а после
+NOTIFICATIONS_MAX_ATTEMPTS попыток переносятся в DEAD_LETTER_KEY.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django_redis import get_redis_connection
+
+QUEUE_KEY = 'notifications:queue'
+DEAD_LETTER_KEY = 'notifications:dead'
+METRICS_KEY = 'notifications:metrics'
+
+
+def _redis():
+    return get_redis_connection('default')
+
+
+def serialize_message(message):
+    html = next((content for content, mimetype in getattr(message, 'alternatives', [])
+                 if mimetype == 'text/html'), None)
+    return json.dumps({
+        'subject': message.subject,
+        'body': message.body,
+        'html': html,
+        'from_email': message.from_email,
+        'to': message.to,
+        'attempts': getattr(message, 'attempts', 0),
+    })
+
+
+def deserialize_message(raw):
+    data = json.loads(raw)
+    message = EmailMultiAlternatives(subject=data['subject'], body=data['body'],
+                                     from_email=data['from_email'], to=data['to'])
+    if data['html']:
+        message.attach_alternative(data['html'], 'text/html')
+    message.attempts = data.get('attempts', 0)
+    return message
+
+
+def enqueue(message):
+    """
+    Поставить письмо в очередь на пакетную отправку.
+    При заполнении очереди до размера пачки отправка запускается сразу, не дожидаясь расписания.
+    """
+    from .tasks import task_flush_notifications
+
+    length = _redis().rpush(QUEUE_KEY, serialize_message(message))
+    if length % settings.NOTIFICATIONS_BATCH_SIZE == 0:
+        task_flush_notifications.delay()
+
+
+def get_metrics():
+    """
+    Накопленные метрики отправки: количество писем, пачек, ошибок и пропускная способность.
+    """
+    raw = _redis().hgetall(METRICS_KEY)
+    metrics = {key.decode(): float(value) for key, value in raw.items()}
+    sent = int(metrics.get('sent', 0))
+    seconds = metrics.get('seconds', 0.0)
+    return {
+        'sent': sent,
+        'failed': int(metrics.get('failed', 0)),
+        'batches': int(metrics.get('batches', 0)),
+        'seconds': seconds,
+        'messages_per_second': sent / seconds if seconds else 0.0,
+        'queued': _redis().llen(QUEUE_KEY),
+        'dead': _redis().llen(DEAD_LETTER_KEY),
+    }
+
+
+class NotificationDispatcher:
+    """
+    Буфер писем. Накопленные письма отправляются одной пачкой через одно соединение,
+    когда в буфере batch_size писем или с момента первого письма прошло flush_interval секунд.
+
+    Используется как контекстный менеджер: соединение открывается один раз,
+    а при выходе оставшиеся письма отправляются и соединение закрывается.
+
+    Письма пачки отправляются по одному через общее соединение, поэтому известно,
+    какие из них не ушли. При raise_errors первая ошибка прерывает отправку,
+    иначе неотправленные письма с ошибками копятся в failed_messages.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, connection=None, record_metrics=True,
+                 raise_errors=True):
+        self.batch_size = batch_size or settings.NOTIFICATIONS_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.NOTIFICATIONS_FLUSH_INTERVAL
+        self.connection = connection
+        self.record_metrics = record_metrics
+        self.raise_errors = raise_errors
+        self.failed_messages = []
+
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+        self._buffer = []
+        self._first_added_at = None
+        self._opened = False
+
+    def __enter__(self):
+        if self.connection is None:
+            self.connection = get_connection()
+        self._opened = self.connection.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            if self._opened:
+                self.connection.close()
+
+    @property
+    def messages_per_second(self):
+        return self.sent / self.seconds if self.seconds else 0.0
+
+    def add(self, message):
+        if not self._buffer:
+            self._first_added_at = time.monotonic()
+        self._buffer.append(message)
+
+        if (len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._first_added_at >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Отправить накопленные письма одной пачкой.
+
+        :return: количество отправленных писем
+        """
+        if not self._buffer:
+            return 0
+
+        messages, self._buffer = self._buffer, []
+        connection = self.connection or get_connection()
+
+        started = time.perf_counter()
+        sent = 0
+        # Вне контекстного менеджера соединение открывается на одну пачку
+        opened = connection.open()
+        try:
+            for message in messages:
+                try:
+                    sent += connection.send_messages([message]) or 0
+                except Exception as exc:
+                    if self.raise_errors:
+                        raise
+                    self.failed_messages.append((message, exc))
+        finally:
+            if opened:
+                connection.close()
+            self._record(sent, len(messages) - sent, time.perf_counter() - started)
+        return sent
+
+    def pop_failed(self):
+        """
+        Забрать накопленные неотправленные письма: пары (письмо, ошибка).
+        """
+        failed, self.failed_messages = self.failed_messages, []
+        return failed
+
+    def _record(self, sent, failed, seconds):
+        self.sent += sent
+        self.failed += failed
+        self.batches += 1
+        self.seconds += seconds
+
+        if self.record_metrics:
+            pipe = _redis().pipeline()
+            pipe.hincrby(METRICS_KEY, 'sent', sent)
+            pipe.hincrby(METRICS_KEY, 'failed', failed)
+            pipe.hincrby(METRICS_KEY, 'batches', 1)
+            pipe.hincrbyfloat(METRICS_KEY, 'seconds', seconds)
+            pipe.execute()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from notifications.benchmark import run_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Сравнить скорость отправки писем по одному и пачками на локальном SMTP-сервере.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--connect-latency', type=float, default=0.0,
+                            help='Задержка установки соединения в секундах.')
+
+    def handle(self, *args, **options):
+        results = run_benchmark(options['count'], options['batch_size'], options['connect_latency'])
+
+        self.stdout.write(f"По одному письму: {results['single']:.1f} писем/с")
+        self.stdout.write(f"Пачками:          {results['batched']:.1f} писем/с")
+        self.stdout.write(f"Ускорение:        x{results['batched'] / results['single']:.1f}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from notifications.dispatcher import get_metrics
+
+
+class Command(BaseCommand):
+    help = 'Показать метрики пакетной отправки писем.'
+
+    def handle(self, *args, **kwargs):
+        for key, value in get_metrics().items():
+            self.stdout.write(f'{key}: {value}')
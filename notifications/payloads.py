@@ -0,0 +1,36 @@
+"""
+Компактные данные для задач уведомлений.
+
+Payload собирается в момент постановки задачи из объектов, которые уже загружены
+в запросе, и содержит получателя и готовые значения для шаблона письма.
+Задача обращается к БД, только если payload не передан или устарел по версии.
+"""
+from .dispatcher import enqueue
+from .registry import registry
+
+PAYLOAD_VERSION = 1
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def build_payload(user, **context):
+    return {'v': PAYLOAD_VERSION, 'email': user.email, 'username': user.username, **context}
+
+
+def consultation_context(consultation):
+    return {
+        'datetime_start': consultation.datetime.lower.strftime(DATETIME_FORMAT),
+        'datetime_end': consultation.datetime.upper.strftime(DATETIME_FORMAT),
+    }
+
+
+def is_valid(payload):
+    return isinstance(payload, dict) and payload.get('v') == PAYLOAD_VERSION
+
+
+def send(template, payload):
+    """
+    Отрендерить письмо по payload и поставить его в очередь отправки.
+    """
+    context = {key: value for key, value in payload.items() if key not in ('v', 'email')}
+    enqueue(registry.build_message(template, context, to=payload['email']))
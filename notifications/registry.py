@@ -0,0 +1,76 @@
+"""
+Реестр шаблонов писем.
+
+Шаблон письма name состоит из трех файлов в каталоге templates/emails приложения:
+name.subject.txt, name.txt и name.html. Шаблоны компилируются один раз
+на процесс воркера и затем только рендерятся из словаря контекста.
+"""
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import get_template
+
+
+class EmailTemplateRegistry:
+    def __init__(self):
+        self._templates = {}
+
+    def get(self, name):
+        """
+        Скомпилированные шаблоны (тема, текст, html) письма name.
+        """
+        templates = self._templates.get(name)
+        if templates is None:
+            templates = (
+                get_template(f'emails/{name}.subject.txt'),
+                get_template(f'emails/{name}.txt'),
+                get_template(f'emails/{name}.html'),
+            )
+            self._templates[name] = templates
+        return templates
+
+    def render(self, name, context):
+        """
+        :return: кортеж (тема, текст, html)
+        """
+        subject, text, html = self.get(name)
+        return (
+            # Тема письма не может содержать переводов строк
+            ' '.join(subject.render(context).split()),
+            text.render(context).strip(),
+            html.render(context).strip(),
+        )
+
+    def render_many(self, name, contexts):
+        """
+        Отрендерить письмо name для множества получателей.
+        """
+        subject, text, html = self.get(name)
+        return [
+            (' '.join(subject.render(context).split()), text.render(context).strip(), html.render(context).strip())
+            for context in contexts
+        ]
+
+    def build_message(self, name, context, to):
+        subject, text, html = self.render(name, context)
+        return self._message(subject, text, html, to)
+
+    def build_messages(self, name, recipients):
+        """
+        :param recipients: список пар (адрес получателя, контекст)
+        """
+        rendered = self.render_many(name, [context for _, context in recipients])
+        return [self._message(subject, text, html, email)
+                for (email, _), (subject, text, html) in zip(recipients, rendered)]
+
+    def clear(self):
+        self._templates.clear()
+
+    @staticmethod
+    def _message(subject, text, html, to):
+        if isinstance(to, str):
+            to = [to]
+        message = EmailMultiAlternatives(subject=subject, body=text, from_email=None, to=to)
+        message.attach_alternative(html, 'text/html')
+        return message
+
+
+registry = EmailTemplateRegistry()
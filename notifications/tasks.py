@@ -0,0 +1,60 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+
+from .dispatcher import DEAD_LETTER_KEY, QUEUE_KEY, NotificationDispatcher, _redis, deserialize_message, \
+    serialize_message
+
+logger = logging.getLogger(__name__)
+
+
+def requeue_failed(redis, failed):
+    """
+    Вернуть неотправленные письма в конец очереди, а исчерпавшие NOTIFICATIONS_MAX_ATTEMPTS попыток -
+    в DEAD_LETTER_KEY.
+    """
+    if not failed:
+        return
+
+    pipe = redis.pipeline()
+    for message, exc in failed:
+        message.attempts = getattr(message, 'attempts', 0) + 1
+        if message.attempts >= settings.NOTIFICATIONS_MAX_ATTEMPTS:
+            logger.error('Письмо "%s" для %s не отправлено за %s попыток и перенесено в %s: %s',
+                         message.subject, ', '.join(message.to), message.attempts, DEAD_LETTER_KEY, exc)
+            pipe.rpush(DEAD_LETTER_KEY, serialize_message(message))
+        else:
+            pipe.rpush(QUEUE_KEY, serialize_message(message))
+    pipe.execute()
+
+
+@shared_task
+def task_flush_notifications():
+    """
+    Отправляет письма из очереди пачками по NOTIFICATIONS_BATCH_SIZE через одно SMTP-соединение.
+    """
+    redis = _redis()
+    # Только письма, которые были в очереди при запуске: возвращенные ждут следующего запуска
+    remaining = redis.llen(QUEUE_KEY)
+
+    with NotificationDispatcher(raise_errors=False) as dispatcher:
+        while remaining > 0:
+            raw_messages = redis.lpop(QUEUE_KEY, min(settings.NOTIFICATIONS_BATCH_SIZE, remaining))
+            if not raw_messages:
+                break
+            remaining -= len(raw_messages)
+
+            for raw in raw_messages:
+                try:
+                    message = deserialize_message(raw)
+                except (ValueError, KeyError):
+                    logger.error('Некорректное письмо в очереди перенесено в %s', DEAD_LETTER_KEY)
+                    redis.rpush(DEAD_LETTER_KEY, raw)
+                    continue
+                dispatcher.add(message)
+            dispatcher.flush()
+            # Письма, уже отправленные автоматическим flush в add, повторно не ставятся
+            requeue_failed(redis, dispatcher.pop_failed())
+
+    return dispatcher.sent
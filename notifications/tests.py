@@ -0,0 +1,103 @@
+from smtplib import SMTPRecipientsRefused
+from unittest.mock import MagicMock, call, patch
+
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends import locmem
+from django.test import SimpleTestCase, override_settings
+
+from .benchmark import LocalSMTPServer
+from .dispatcher import DEAD_LETTER_KEY, QUEUE_KEY, NotificationDispatcher, deserialize_message, serialize_message
+from .registry import registry
+from .tasks import requeue_failed
+
+
+class NotificationDispatcherTestCase(SimpleTestCase):
+    def create_message(self, number=0):
+        message = EmailMultiAlternatives(subject=f'test {number}', body='text',
+                                         from_email='test@localhost', to=['testuser@gmail.com'])
+        message.attach_alternative('<b>html</b>', 'text/html')
+        return message
+
+    def test_batches_share_one_connection(self):
+        with LocalSMTPServer() as server:
+            with NotificationDispatcher(batch_size=2, flush_interval=60,
+                                        connection=server.backend(), record_metrics=False) as dispatcher:
+                for number in range(5):
+                    dispatcher.add(self.create_message(number))
+
+                self.assertEqual(dispatcher.sent, 4)
+
+        self.assertEqual(dispatcher.sent, 5)
+        self.assertEqual(dispatcher.batches, 3)
+        self.assertEqual(server.received, 5)
+        self.assertEqual(server.connections, 1)
+
+    def test_flush_interval(self):
+        with LocalSMTPServer() as server:
+            dispatcher = NotificationDispatcher(batch_size=100, flush_interval=0.5,
+                                                connection=server.backend(), record_metrics=False)
+            # Второй вызов monotonic - проверка интервала после добавления
+            with patch('notifications.dispatcher.time.monotonic', side_effect=[0.0, 1.0]):
+                dispatcher.add(self.create_message())
+            self.assertEqual(dispatcher.sent, 1)
+
+    def test_failed_messages_are_collected(self):
+        class RefusingBackend(locmem.EmailBackend):
+            def send_messages(self, messages):
+                if any('refused@gmail.com' in message.to for message in messages):
+                    raise SMTPRecipientsRefused({'refused@gmail.com': (550, b'refused')})
+                return super().send_messages(messages)
+
+        refused = self.create_message(1)
+        refused.to = ['refused@gmail.com']
+        with NotificationDispatcher(batch_size=10, flush_interval=60, connection=RefusingBackend(),
+                                    record_metrics=False, raise_errors=False) as dispatcher:
+            for message in (self.create_message(0), refused, self.create_message(2)):
+                dispatcher.add(message)
+
+        self.assertEqual(dispatcher.sent, 2)
+        self.assertEqual([message for message, _ in dispatcher.pop_failed()], [refused])
+        self.assertEqual(dispatcher.failed_messages, [])
+
+    @override_settings(NOTIFICATIONS_MAX_ATTEMPTS=2)
+    def test_requeue_failed(self):
+        redis = MagicMock()
+        pipe = redis.pipeline.return_value
+        retried, dead = self.create_message(0), self.create_message(1)
+        dead.attempts = 1
+
+        requeue_failed(redis, [(retried, Exception()), (dead, Exception())])
+        pipe.rpush.assert_has_calls([call(QUEUE_KEY, serialize_message(retried)),
+                                     call(DEAD_LETTER_KEY, serialize_message(dead))])
+        self.assertEqual(deserialize_message(serialize_message(retried)).attempts, 1)
+
+    def test_serialize_message(self):
+        message = deserialize_message(serialize_message(self.create_message()))
+        self.assertEqual(message.subject, 'test 0')
+        self.assertEqual(message.to, ['testuser@gmail.com'])
+        self.assertEqual(message.alternatives[0][0], '<b>html</b>')
+
+
+class EmailTemplateRegistryTestCase(SimpleTestCase):
+    def test_render(self):
+        subject, text, html = registry.render('booked_cancellation',
+                                              {'username': '<test_user>', 'rejection_text': 'a & b'})
+        self.assertEqual(subject, 'Бронь отклонена.')
+        self.assertIn('Здравствуйте, <test_user>.', text)
+        self.assertIn('Причина отмены: a & b.', text)
+        self.assertIn('&lt;test_user&gt;', html)
+        self.assertTrue(text.endswith('С уважением, команда проекта.'))
+
+    def test_templates_compiled_once(self):
+        registry.clear()
+        templates = registry.get('user_block')
+        self.assertIs(registry.get('user_block'), templates)
+
+    def test_build_messages(self):
+        recipients = [(f'testuser{number}@gmail.com', {'username': f'test_user_{number}'}) for number in range(3)]
+        messages = registry.build_messages('user_unblock', recipients)
+
+        self.assertEqual([message.to for message in messages], [[email] for email, _ in recipients])
+        for number, message in enumerate(messages):
+            self.assertIn(f'test_user_{number}', message.body)
+            self.assertIn(f'<b>test_user_{number}</b>', message.alternatives[0][0])
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-19 14:18
+
+import datetime
+import django.contrib.postgres.fields
+import specialist.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('specialist', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='specialist',
+            name='work_end',
+            field=models.TimeField(default=datetime.time(18, 0)),
+        ),
+        migrations.AddField(
+            model_name='specialist',
+            name='work_start',
+            field=models.TimeField(default=datetime.time(9, 0)),
+        ),
+        migrations.AddField(
+            model_name='specialist',
+            name='work_weekdays',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.PositiveSmallIntegerField(), default=specialist.models.default_work_weekdays, size=None),
+        ),
+    ]
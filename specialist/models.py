@@ -1,14 +1,26 @@
+from datetime import time
+
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 
 from accounts.models import User
 
 
+def default_work_weekdays():
+    return [0, 1, 2, 3, 4]
+
+
 # Create your models here.
 class Specialist(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
 
+    # Рабочие часы (UTC) и дни недели (0 - понедельник) для поиска свободного времени
+    work_start = models.TimeField(default=time(9))
+    work_end = models.TimeField(default=time(18))
+    work_weekdays = ArrayField(models.PositiveSmallIntegerField(), default=default_work_weekdays)
+
     def block(self):
         self.is_active = False
         self.save()
@@ -9,6 +9,18 @@ class SpecialistSerializer(serializers.ModelSerializer):
         fields = "__all__"
         read_only_fields = ["user", 'is_active']
 
+    def validate_work_weekdays(self, value):
+        if any(day > 6 for day in value):
+            raise serializers.ValidationError('Дни недели задаются числами от 0 (понедельник) до 6.')
+        return sorted(set(value))
+
+    def validate(self, data):
+        work_start = data.get('work_start', self.instance.work_start if self.instance else None)
+        work_end = data.get('work_end', self.instance.work_end if self.instance else None)
+        if work_start and work_end and work_end <= work_start:
+            raise serializers.ValidationError({'work_end': 'Конец рабочего дня должен быть позже начала.'})
+        return data
+
 
 class CandidatesSerializer(serializers.ModelSerializer):
     class Meta:
@@ -5,6 +5,8 @@ from django.contrib.auth.models import Group
 from django.core.cache import cache
 
 from accounts.models import User
+from consultations import availability
+from events import live
 from .models import Specialist, Candidates
 
 
@@ -12,6 +14,7 @@ from .models import Specialist, Candidates
 def specialist_created(instance, created, **kwargs):
     cache.delete_pattern('SpecialistList_list_cache_*')
     cache.delete(f'SpecialistList_detail_cache_{instance.user_id}')
+    availability.invalidate_user(instance.user_id)
 
     user = User.objects.get(pk=instance.user.id)
     specialist_group = Group.objects.get(name="specialist")
@@ -27,3 +30,6 @@ def specialist_created(instance, created, **kwargs):
 def Candidates_created(instance, created, **kwargs):
     cache.delete_pattern('CandidatesList_list_cache_*')
     cache.delete(f'CandidatesList_detail_cache_{instance.user_id}')
+
+    live.publish_to_user(instance.user_id, 'candidate.status', id=instance.id, status=instance.status,
+                         rejection_text=instance.rejection_text)
@@ -8,6 +8,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.viewsets import ModelViewSet
 
 from consultation_planning_service.utils import StandardResponseMixin, api_response, CacheResponseMixin
+from events import outbox
+from notifications import payloads
 from specialist.models import Candidates, Specialist
 from specialist.permissions import (
     IsAdmin,
@@ -138,9 +140,9 @@ class SpecialistList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
         Заблокировать специалиста. (только для админов)
         """
         try:
-            specialist = get_object_or_404(Specialist, user_id=request.data.get('id'))
+            specialist = get_object_or_404(Specialist.objects.select_related('user'), user_id=request.data.get('id'))
             specialist.block()
-            task_send_email_specialist_block.delay(specialist.id)
+            outbox.enqueue(task_send_email_specialist_block, specialist.id, payloads.build_payload(specialist.user))
             return api_response(data={'status': 'Специалист заблокирован.'})
         except Specialist.DoesNotExist:
             return api_response(errors={'error': 'Специалист не найден.'},
@@ -164,9 +166,9 @@ class SpecialistList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
         Разблокировать специалиста. (только для админов)
         """
         try:
-            specialist = get_object_or_404(Specialist, user_id=request.data.get('id'))
+            specialist = get_object_or_404(Specialist.objects.select_related('user'), user_id=request.data.get('id'))
             specialist.unblock()
-            task_send_email_specialist_unblock.delay(specialist.id)
+            outbox.enqueue(task_send_email_specialist_unblock, specialist.id, payloads.build_payload(specialist.user))
             return api_response(data={'status': 'Специалист разблокирован.'})
         except Specialist.DoesNotExist:
             return api_response(errors={'error': 'Специалист не найден.'},
@@ -323,14 +325,14 @@ class CandidatesList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
         """
         data = request.data
 
-        candidate = get_object_or_404(Candidates, user__pk=data.get('id'))
+        candidate = get_object_or_404(Candidates.objects.select_related('user'), user__pk=data.get('id'))
         serializer = self.get_serializer(candidate, data=data, partial=True)
 
         serializer.validate_status_transition(candidate)
         candidate.accept()
         Specialist.objects.create(user=candidate.user, description=candidate.description)
 
-        task_send_email_candidates_accept.delay(candidate.id)
+        outbox.enqueue(task_send_email_candidates_accept, candidate.id, payloads.build_payload(candidate.user))
 
         return api_response(
             data={'message': 'Заявка одобрена и пользователь добавлен как специалист.'},
@@ -355,14 +357,15 @@ class CandidatesList(CacheResponseMixin, StandardResponseMixin, ModelViewSet):
         """
         data = request.data
 
-        candidate = get_object_or_404(Candidates, user__pk=data.get('id'))
+        candidate = get_object_or_404(Candidates.objects.select_related('user'), user__pk=data.get('id'))
         serializer = self.get_serializer(candidate, data=data, partial=True)
 
         serializer.validate_status_transition(candidate)
         serializer.validate_rejection_text(data.get('rejection_text'))
         candidate.cancel(data.get('rejection_text'))
 
-        task_send_email_candidates_cancel.delay(candidate.id)
+        payload = payloads.build_payload(candidate.user, rejection_text=candidate.rejection_text)
+        outbox.enqueue(task_send_email_candidates_cancel, candidate.id, payload)
 
         return api_response(
             data={'message': 'Заявка пользователя отклонена.'},